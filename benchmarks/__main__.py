@@ -0,0 +1,265 @@
+# benchmarks/__main__.py
+"""
+End-to-end load test of the API against a local fake Ollama server.
+
+    python -m benchmarks run --scenarios ask,login --concurrency 1,8,32 --requests 200
+    python -m benchmarks compare benchmarks/results/before.json benchmarks/results/after.json
+
+`run` starts a FakeOllama (configurable time to first token and token rate), serves
+benchmarks.app with uvicorn in a subprocess (own working directory, SQLite file and Chroma
+store; fake embedder unless --real-embedder), seeds a corpus and a user, then drives each
+scenario at each concurrency level. Throughput, p50/p95/p99 latency and the server's RSS
+are written as JSON together with the server's /metrics snapshot.
+
+`compare` matches the levels of two result files and exits with status 1 when any of them
+regressed by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.harness import RssSampler, compare, environment, free_port, read_rss_mb, run_level, wait_until_up
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BENCH_MODEL = "bench-model:latest"
+BENCH_USER = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+
+TOPICS = ["royalty fee", "initial investment", "franchise fee", "training program", "territory rights",
+          "marketing fund", "renewal terms", "site selection", "supply chain", "staffing requirements"]
+BRANDS = ["Acme Burgers", "Blue Bean Coffee", "Crispy Chicken Co", "Daily Greens", "Eastside Pizza",
+          "Fresh Fold Laundry", "Golden Gym", "Happy Paws Grooming", "Iron Auto Care", "Jolly Tutors"]
+QUESTIONS = ["What is the {topic} for {brand}?", "How does {brand} handle its {topic}?",
+             "Compare the {topic} of {brand} with the industry average."]
+
+SCENARIOS = ("ask", "update-vectors", "login", "list-vectors")
+
+
+def corpus_document(n: int) -> str:
+    brand, topic = BRANDS[n % len(BRANDS)], TOPICS[(n // len(BRANDS)) % len(TOPICS)]
+    return (f"{brand} franchise disclosure, section {n}: the {topic} is reviewed every year. "
+            f"Franchisees of {brand} receive guidance on {topic} from the regional office (ref {n}).")
+
+
+def ask_query(n: int) -> str:
+    """Distinct questions for the first len(QUESTIONS)*len(TOPICS)*len(BRANDS) requests, then repeats."""
+    question = QUESTIONS[n % len(QUESTIONS)]
+    topic = TOPICS[(n // len(QUESTIONS)) % len(TOPICS)]
+    brand = BRANDS[(n // (len(QUESTIONS) * len(TOPICS))) % len(BRANDS)]
+    return question.format(topic=topic, brand=brand)
+
+
+def ask_succeeded(response: httpx.Response) -> bool:
+    """/agent/ask reports failures as HTTP 200 with a `[{"error": ...}, 500]` body."""
+    if not response.is_success:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    first = body[0] if isinstance(body, list) and body else body
+    return not (isinstance(first, dict) and "error" in first)
+
+
+# Scenarios whose failures do not all show up as a non-2xx status
+SUCCESS_CHECKS = {"ask": ask_succeeded}
+
+
+def scenario_sender(name: str, args, seeded: int):
+    if name == "ask":
+        return lambda client, n: client.post("/agent/ask", data={"query": ask_query(n), "save": "false"})
+    if name == "update-vectors":
+        def update(client, n):
+            first = 1_000_000 + n * args.docs_per_update
+            return client.post("/rag/update-vectors", json=[corpus_document(first + i) for i in range(args.docs_per_update)])
+        return update
+    if name == "login":
+        form = {"username": BENCH_USER["username"], "password": BENCH_USER["password"]}
+        return lambda client, n: client.post("/users/login", data=form)
+    if name == "list-vectors":
+        pages = max(1, seeded // args.page_size)
+        return lambda client, n: client.get("/data/list-vectors", params={"limit": args.page_size, "cursor": (n % pages) * args.page_size})
+    raise ValueError(f"Unknown scenario '{name}'. Choose from {SCENARIOS}.")
+
+
+def start_server(args, ollama_url: str, workdir: str):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")])),
+        "OLLAMA_HOST": ollama_url,
+        "OLLAMA_HOSTS": ollama_url,
+        "MODEL_NAME": BENCH_MODEL,
+        "CHROMA_DB_DIR": os.path.join(workdir, "chroma_db"),
+        "BENCH_FAKE_EMBEDDER": "false" if args.real_embedder else "true",
+    })
+    env.setdefault("MONGO_DETAILS", "mongodb://127.0.0.1:27017")  # the client connects lazily and is unused here
+    # Score every question but let it through: the fake embedder's similarities say nothing about the topic
+    env.setdefault("TOPIC_GATE_MODE", "shadow")
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return process, log, f"http://127.0.0.1:{port}"
+
+
+async def seed(client: httpx.AsyncClient, documents: int, batch: int = 100) -> int:
+    for start in range(0, documents, batch):
+        response = await client.post("/rag/update-vectors", json=[corpus_document(n) for n in range(start, min(documents, start + batch))])
+        response.raise_for_status()
+    response = await client.post("/users/register", json=BENCH_USER)
+    if response.status_code not in (201, 400):  # 400: already registered
+        print(f"⚠️ Registering the benchmark user failed ({response.status_code}); login requests will fail", file=sys.stderr)
+    return documents
+
+
+async def drive(args, base_url: str, pid: int) -> Tuple[List[Dict], Dict]:
+    results = []
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4, max_keepalive_connections=max(args.concurrency) + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        seeded = await seed(client, args.seed_docs)
+        next_request = 0
+        for scenario in args.scenarios:
+            send = scenario_sender(scenario, args, seeded)
+            succeeded = SUCCESS_CHECKS.get(scenario)
+            if args.warmup:
+                await run_level(client, send, min(args.concurrency), args.warmup, first_request=next_request,
+                                succeeded=succeeded)
+                next_request += args.warmup
+            for concurrency in args.concurrency:
+                with RssSampler(pid) as rss:
+                    level = await run_level(client, send, concurrency, args.requests, first_request=next_request,
+                                            succeeded=succeeded)
+                next_request += args.requests
+                level = dict({"scenario": scenario}, **level, rss_mb=rss.summary())
+                results.append(level)
+                print(f"{scenario:>15} c={concurrency:<4} {level['throughput_rps']} req/s  "
+                      f"p50={level['latency_ms']['p50']}ms p95={level['latency_ms']['p95']}ms "
+                      f"p99={level['latency_ms']['p99']}ms  errors={level['errors']}  "
+                      f"rss_peak={level['rss_mb']['peak']}MB", flush=True)
+        metrics = (await client.get("/metrics")).json()
+    return results, metrics
+
+
+def run(args) -> int:
+    reply = " ".join(f"token{i}" for i in range(args.reply_tokens))
+    workdir = tempfile.mkdtemp(prefix="fmegpt-bench-")
+    with FakeOllama(models=[BENCH_MODEL], reply=reply, delay=args.ttft_ms / 1000,
+                    tokens_per_second=args.tokens_per_second) as ollama:
+        process, log, base_url = start_server(args, ollama.url, workdir)
+        try:
+            wait_until_up(base_url + "/", process, timeout=args.startup_timeout)
+            rss_idle = read_rss_mb(process.pid)
+            results, metrics = asyncio.run(drive(args, base_url, process.pid))
+        except Exception:
+            print(f"Benchmark failed; server log: {os.path.join(workdir, 'server.log')}", file=sys.stderr)
+            raise
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        chats = ollama.chats
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "config": {
+            "scenarios": args.scenarios,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "seed_docs": args.seed_docs,
+            "docs_per_update": args.docs_per_update,
+            "page_size": args.page_size,
+            "embedder": "real" if args.real_embedder else "fake",
+            "fake_ollama": {"ttft_ms": args.ttft_ms, "tokens_per_second": args.tokens_per_second,
+                            "reply_tokens": args.reply_tokens, "chats_served": chats},
+        },
+        "server_rss_idle_mb": round(rss_idle, 2) if rss_idle is not None else None,
+        "results": results,
+        "server_metrics": metrics,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+    return 0
+
+
+def compare_files(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.tolerance)
+    for row in rows:
+        changes = "  ".join(f"{metric} {row[metric]['change']:+.1%}" for metric in ("p95", "p99", "throughput_rps") if metric in row)
+        changes = changes or "no successful requests to compare"
+        flag = f"  REGRESSED: {', '.join(row['regressions'])}" if row["regressions"] else ""
+        print(f"{row['scenario']:>15} c={row['concurrency']:<4} {changes}{flag}")
+    regressed = [row for row in rows if row["regressions"]]
+    if not rows:
+        print("⚠️ No common (scenario, concurrency) levels to compare")
+    elif regressed:
+        print(f"❌ {len(regressed)} of {len(rows)} levels regressed by more than {args.tolerance:.0%}")
+    else:
+        print(f"✅ No regressions beyond {args.tolerance:.0%}")
+    return 1 if regressed else 0
+
+
+def _csv(cast):
+    return lambda value: [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the load test and write a JSON report")
+    run_parser.add_argument("--scenarios", type=_csv(str), default=list(SCENARIOS), help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    run_parser.add_argument("--concurrency", type=_csv(int), default=[1, 4, 16], help="Comma-separated concurrency levels")
+    run_parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and concurrency level")
+    run_parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    run_parser.add_argument("--seed-docs", type=int, default=500, help="Documents indexed before the run")
+    run_parser.add_argument("--docs-per-update", type=int, default=10)
+    run_parser.add_argument("--page-size", type=int, default=100, help="list-vectors page size")
+    run_parser.add_argument("--ttft-ms", type=float, default=50.0, help="Fake Ollama delay before the first token")
+    run_parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Fake Ollama generation speed (0 = instant)")
+    run_parser.add_argument("--reply-tokens", type=int, default=64, help="Tokens in every fake Ollama reply")
+    run_parser.add_argument("--real-embedder", action="store_true", help="Use EMBEDDING_MODEL instead of the hash encoder")
+    run_parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    run_parser.add_argument("--startup-timeout", type=float, default=120.0)
+    run_parser.add_argument("--output", help="Report path (default: benchmarks/results/bench-<timestamp>.json)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports; exit 1 on regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change (0.15 = 15%%)")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return compare_files(args)
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}; choose from {SCENARIOS}")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# benchmarks/app.py
+"""
+The API as served during benchmarks: `uvicorn benchmarks.app:app`.
+
+With BENCH_FAKE_EMBEDDER=true the shared embedding model is replaced by `HashEncoder`
+before any service is built, so runs need neither the SentenceTransformer weights nor
+the CPU time they cost; everything else is the production app from main.py.
+"""
+import hashlib
+import os
+import re
+from typing import List, Union
+
+import numpy as np
+
+from src.services.service_registry import EMBEDDING_MODEL, registry
+
+BENCH_FAKE_EMBEDDER = os.getenv("BENCH_FAKE_EMBEDDER", "true").lower() == "true"
+BENCH_EMBEDDING_DIM = int(os.getenv("BENCH_EMBEDDING_DIM", 384))
+
+_WORD = re.compile(r"\w+")
+
+
+class HashEncoder:
+    """
+    Deterministic stand-in for a SentenceTransformer: each word is hashed into one of
+    `dimension` signed buckets and the sum is L2-normalized, so texts sharing words end
+    up close together and the same text always gets the same vector.
+    """
+
+    def __init__(self, dimension: int = BENCH_EMBEDDING_DIM):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
+
+
+if BENCH_FAKE_EMBEDDER:
+    registry.get_or_create(("embedding_model", EMBEDDING_MODEL), HashEncoder)
+
+from main import app  # noqa: E402  (the encoder must be registered before the services are built)
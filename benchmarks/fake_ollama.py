@@ -0,0 +1,92 @@
+# benchmarks/fake_ollama.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+class FakeOllama:
+    """
+    Minimal Ollama HTTP server for tests and benchmarks (/api/chat, /api/tags, /api/ps).
+    `fail` answers chats with HTTP 500, `delay` sleeps before the first token (prompt eval) and
+    `tokens_per_second` paces the reply one word per token (0 answers at once); `chats` counts requests.
+    """
+
+    def __init__(self, models: List[str] = ("test-model:latest",), reply: str = "hello from fake", delay: float = 0.0,
+                 tokens_per_second: float = 0.0, port: int = 0):
+        self.models = list(models)
+        self.reply = reply
+        self.delay = delay
+        self.tokens_per_second = tokens_per_second
+        self.fail = False
+        self.chats = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path in ("/api/tags", "/api/ps"):
+                    self._json(200, {"models": [{"name": m, "model": m} for m in fake.models]})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/chat":
+                    return self._json(404, {"error": "not found"})
+                fake.chats += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                if fake.fail:
+                    return self._json(500, {"error": "model runner crashed"})
+                model = request["model"] if ":" in request["model"] else f"{request['model']}:latest"
+                if model not in fake.models:
+                    return self._json(404, {"error": f"model '{request['model']}' not found"})
+                words = fake.reply.split()
+                token_seconds = 1 / fake.tokens_per_second if fake.tokens_per_second else 0.0
+                done = {"model": request["model"], "created_at": "2024-01-01T00:00:00Z", "done": True,
+                        "done_reason": "stop", "prompt_eval_count": 10,
+                        "prompt_eval_duration": int(max(fake.delay, 0.001) * 1e9), "eval_count": len(words),
+                        "eval_duration": int(len(words) * token_seconds * 1e9)}
+                if not request.get("stream", True):
+                    if token_seconds:
+                        time.sleep(len(words) * token_seconds)
+                    return self._json(200, dict(done, message={"role": "assistant", "content": fake.reply}))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                lines = [dict(done, done=False, message={"role": "assistant", "content": word + " "}) for word in words]
+                lines.append(dict(done, message={"role": "assistant", "content": ""}))
+                for i, line in enumerate(lines):
+                    if token_seconds and i:
+                        time.sleep(token_seconds)
+                    data = (json.dumps(line) + "\n").encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
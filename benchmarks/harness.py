@@ -0,0 +1,199 @@
+# benchmarks/harness.py
+import asyncio
+import math
+import os
+import platform
+import socket
+import subprocess
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# (client, request number) -> response
+RequestFn = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+# response -> whether the request succeeded
+ResponseCheck = Callable[[httpx.Response], bool]
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Exact percentile with linear interpolation between the closest ranks."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * q
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(samples_ms: List[float]) -> Dict:
+    return {
+        "p50": _round(percentile(samples_ms, 0.50)),
+        "p95": _round(percentile(samples_ms, 0.95)),
+        "p99": _round(percentile(samples_ms, 0.99)),
+        "mean": _round(sum(samples_ms) / len(samples_ms)) if samples_ms else None,
+        "max": _round(max(samples_ms)) if samples_ms else None,
+    }
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of `pid` from /proc (Linux); None where that is not available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Samples the server's RSS in a background thread while a load level runs."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        rss = read_rss_mb(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+
+    def summary(self) -> Dict:
+        if not self.samples:
+            return {"start": None, "peak": None, "end": None}
+        return {"start": _round(self.samples[0]), "peak": _round(max(self.samples)), "end": _round(self.samples[-1])}
+
+
+async def run_level(client: httpx.AsyncClient, send: RequestFn, concurrency: int, requests: int,
+                    first_request: int = 0, succeeded: Optional[ResponseCheck] = None) -> Dict:
+    """
+    Sends `requests` requests through `concurrency` workers (closed loop: each worker sends
+    its next request as soon as the previous one is answered) and summarizes the run.
+    Only successful answers count towards throughput and latency; everything else is an error.
+    `succeeded` defaults to "2xx"; endpoints that report errors in a 2xx body pass their own check.
+    """
+    succeeded = succeeded or (lambda response: response.is_success)
+    latencies_ms: List[float] = []
+    status_codes: Dict[str, int] = {}
+    failures: Dict[str, int] = {}
+    counter = iter(range(first_request, first_request + requests))
+
+    async def worker():
+        for number in counter:
+            started = time.perf_counter()
+            try:
+                response = await send(client, number)
+                await response.aread()
+            except httpx.HTTPError as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            code = str(response.status_code)
+            status_codes[code] = status_codes.get(code, 0) + 1
+            if succeeded(response):
+                latencies_ms.append(elapsed_ms)
+            elif response.is_success:
+                failures["error_body"] = failures.get("error_body", 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    duration = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies_ms),
+        "errors": requests - len(latencies_ms),
+        "status_codes": status_codes,
+        "failures": failures,
+        "duration_s": _round(duration),
+        "throughput_rps": _round(len(latencies_ms) / duration) if duration else None,
+        "latency_ms": latency_summary(latencies_ms),
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.15) -> List[Dict]:
+    """
+    Matches the (scenario, concurrency) levels of two result files and flags every level
+    whose p95/p99 latency grew, or whose throughput dropped, by more than `tolerance`.
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        row = {"scenario": result["scenario"], "concurrency": result["concurrency"], "regressions": []}
+        for metric, worse_if_higher in (("p95", True), ("p99", True), ("throughput_rps", False)):
+            old, new = _metric(before, metric), _metric(result, metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            row[metric] = {"baseline": old, "current": new, "change": round(change, 3)}
+            if (change > tolerance) if worse_if_higher else (change < -tolerance):
+                row["regressions"].append(metric)
+        if result["errors"] > before["errors"]:
+            row["regressions"].append("errors")
+        rows.append(row)
+    return rows
+
+
+def _metric(result: Dict, name: str) -> Optional[float]:
+    return result["throughput_rps"] if name == "throughput_rps" else result["latency_ms"][name]
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, process, timeout: float = 120.0):
+    """Polls `url` until the server answers, failing early if its process died."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before it came up")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server at {url} did not come up within {timeout:.0f}s")
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
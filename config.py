@@ -7,7 +7,7 @@ import threading # Added for debugging thread IDs
 from typing import Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -64,9 +64,29 @@ def get_sqlite_db_sync():
 def create_sqlite_tables_sync():
     """Creates all defined SQLite tables synchronously."""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     logger.info("Synchronous SQLite tables creation attempt complete.")
 
 
+def add_missing_columns():
+    """
+    Lightweight migration: `create_all` never alters existing tables, so nullable columns
+    added to a model later are appended here with ALTER TABLE.
+    """
+    existing_tables = inspect(engine).get_table_names()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                logger.info(f"Added column {table.name}.{column.name} ({column_type})")
+
+
 # --- MongoDB Configuration (SYNCHRONOUS) ---
 MONGO_DETAILS = os.getenv("MONGO_DETAILS")
 # Initialize mongo_client and mongo_database as None globally
@@ -1,24 +1,37 @@
 from src.models.RAGModel import RAGModel
+from src.services.ingestion_manifest import IngestionManifest
 import os
 
 rag = RAGModel(model="mistral")
+manifest = IngestionManifest(f"{rag.vector_db_path}.manifest.json")
 
-# Loop through data folder and ingest files
+# Start from the existing index so only changed files are re-embedded
+if os.path.exists(rag.vector_db_path):
+    rag.load_index()
+
+# Drop chunks of files that were removed from the data folder
+for path in manifest.missing_files():
+    rag.remove_chunks(manifest.forget(path))
+    print(f"🗑️ Removed {path}")
+
+# Loop through data folder and ingest new or changed files
 data_folder = "data"
 for file in os.listdir(data_folder):
     path = os.path.join(data_folder, file)
-    if file.endswith(".txt"):
-        rag.from_txt(path)
-    elif file.endswith(".pdf"):
-        rag.from_pdf(path)
-    elif file.endswith(".docx"):
-        rag.from_word(path)
-    elif file.endswith(".xlsx"):
-        rag.from_excel(path)
-    elif file.endswith(".png") or file.endswith(".jpg") or file.endswith(".jpeg"):
-        rag.from_image(path)
-    elif file.endswith(".mp3") or file.endswith(".wav"):
-        rag.from_audio(path)
+    if not os.path.isfile(path) or os.path.splitext(file)[1].lower() not in RAGModel.FILE_READERS:
+        continue
+    if not manifest.needs_ingest(path):
+        print(f"⏭️ Unchanged, skipping {path}")
+        continue
+
+    chunks = rag.read_file(path)
+    chunk_ids, stale_ids = manifest.diff(path, chunks)
+    removed = rag.remove_chunks(stale_ids)
+    added = rag.add_chunks(chunks, chunk_ids)
+    manifest.record(path, chunk_ids)
+    print(f"✅ {path}: {added} chunks embedded, {removed} removed")
 
-# Build vector index
-rag.build_index()
+# Persist the vector index and the manifest
+if rag.index is not None:
+    rag.save_index()
+manifest.save()
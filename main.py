@@ -7,9 +7,11 @@ from config import create_sqlite_tables_sync, connect_to_mongo, close_mongo_conn
 from middleware.log_middleware import LogRequestsMiddleware
 from src.middleware.auth_middleware import AuthMiddleware
 from routers import (
-    rag_routers, auth_routers, agent_routers, data_routers, users_router
+    rag_routers, auth_routers, agent_routers, data_routers, users_router, metrics_router
 )
 from src.services.auth.auth_backend import JWTAuthBackend
+from src.services.concurrency import ServiceOverloaded
+from src.services.service_registry import registry
 from src.utils.Logger import logger
 
 app = FastAPI(title="FranchiseGPT Backend")
@@ -32,6 +34,7 @@ app.include_router(auth_routers)
 app.include_router(agent_routers)
 app.include_router(data_routers)
 app.include_router(users_router)
+app.include_router(metrics_router)
 
 # --- Global Exception Handlers ---
 @app.exception_handler(Exception)
@@ -68,6 +71,18 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         content={"message": exc.detail, "request_id": getattr(request.state, "request_id", "N/A")},
     )
 
+@app.exception_handler(ServiceOverloaded)
+async def overloaded_exception_handler(request: Request, exc: ServiceOverloaded):
+    logger.warning(
+        f"Shedding load: {exc} for request: {request.method} {request.url}",
+        extra={"request_id": getattr(request.state, "request_id", "N/A"), "retry_after": exc.retry_after}
+    )
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc), "request_id": getattr(request.state, "request_id", "N/A")},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.on_event("startup")
 def startup_event():
     logger.info("FastAPI application startup event triggered.")
@@ -78,6 +93,7 @@ def startup_event():
 def shutdown_event():
     logger.info("FastAPI application shutdown event triggered.")
     close_mongo_connection()
+    registry.shutdown() # Release shared embedding models, Chroma clients and services
 
 @app.get("/")
 def root():
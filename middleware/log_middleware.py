@@ -12,6 +12,7 @@ import traceback as tb_module  # Import for getting traceback string
 from src.models.APILog import APILog  # Ensure this import is correct
 from src.utils import Helper
 from src.utils.Logger import logger  # Ensure this import is correct
+from src.utils.Tracing import Trace, start_trace
 from config import SessionLocal  # Import SessionLocal for direct use
 
 
@@ -26,6 +27,8 @@ class LogRequestsMiddleware(BaseHTTPMiddleware):
         log_record_to_update = None  # Initialize to None
         start_time = time.time()
         user_id_for_initial_log = None
+        # Spans and LLM token counts recorded while this request is handled end up in the trace
+        trace = start_trace()
 
         try:
             # Attempt to get user_id even if not authenticated
@@ -81,6 +84,10 @@ class LogRequestsMiddleware(BaseHTTPMiddleware):
                 db.commit()
                 # db.refresh(log_record_to_update) # Not strictly needed after final commit unless you use it later
 
+                # Streamed bodies are still being produced here: the trace is saved once the body is done
+                if hasattr(response, "body_iterator"):
+                    response.body_iterator = _save_trace_after(response.body_iterator, log_record_to_update.id, trace, request)
+
         except Exception as e:
             # Handle exceptions that occur *within* the middleware or downstream
             logger.error(f"Error in LogRequestsMiddleware: {e}", exc_info=True)
@@ -109,4 +116,31 @@ class LogRequestsMiddleware(BaseHTTPMiddleware):
         # Ensure a response is always returned.
         # If an exception was raised, FastAPI's exception handler will return a response.
         # If no exception, 'response' is from call_next.
-        return response
\ No newline at end of file
+        return response
+
+
+async def _save_trace_after(body_iterator, log_id: str, trace: Trace, request: Request):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        _save_trace(log_id, trace, request)
+
+
+def _save_trace(log_id: str, trace: Trace, request: Request):
+    """Stores the total duration and, when any stage was traced, the trace JSON on the request's APILog row."""
+    duration_ms = round((time.perf_counter() - trace.started) * 1000, 2)
+    details = trace.to_dict() if trace.spans or trace.llm_calls else None
+    if details:
+        logger.info(f"{request.method} {request.url.path} took {duration_ms}ms, stages: {json.dumps(details['stages'])}, tokens: {json.dumps(details['tokens'])}")
+    db = SessionLocal()
+    try:
+        log_record = db.get(APILog, log_id)
+        if log_record:
+            log_record.duration_ms = duration_ms
+            log_record.trace = json.dumps(details) if details else None
+            db.commit()
+    except Exception as e:
+        logger.error(f"Failed to save the request trace on APILog {log_id}: {e}")
+    finally:
+        db.close()
@@ -2,4 +2,5 @@ from .rag_routers import router as rag_routers
 from .auth_routers import router as auth_routers
 from .agent_routers import router as agent_routers
 from .data_routers import router as data_routers
-from .users import router as users_router
\ No newline at end of file
+from .users import router as users_router
+from .metrics_routers import router as metrics_router
\ No newline at end of file
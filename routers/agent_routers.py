@@ -1,12 +1,59 @@
+import os
+import time
 from typing import Optional, List, Dict
-from fastapi import APIRouter, Form, File, UploadFile, Request
+from dotenv import load_dotenv
+from fastapi import APIRouter, Form, File, UploadFile, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from src.schemas.BatchQueryRequest import BatchQueryRequest
 from src.schemas.QueryRequest import QueryRequest
 from src.schemas.PromptResponse import PromptResponse
-from src.services.rag_service import RAGService
+from src.services.concurrency import ServiceOverloaded
+from src.services.metadata_index import filter_error
+from src.services.rag_service import get_rag_service
+from src.utils.Logger import logger
 import json
 
+load_dotenv()
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 500))
+
 router = APIRouter(prefix="/agent", tags=["agent"])
-rag_service = RAGService()
+
+
+async def _read_ask_form(request: Request) -> Dict:
+    """Parses the multipart form shared by /ask and /ask/stream into answer_with_user_docs arguments."""
+    form_data = await request.form()
+    chat_history_str = form_data.get("chat_history", "[]")
+
+    try:
+        parsed_history = json.loads(chat_history_str)
+    except json.JSONDecodeError:
+        parsed_history = []
+
+    try:
+        filters = json.loads(form_data.get("filters", "") or "{}")
+    except json.JSONDecodeError:
+        filters = {}
+    _check_filters(filters)
+
+    return {
+        "query": form_data.get("query", ""),
+        "user_docs": form_data.getlist("user_docs"),
+        "save": form_data.get("save", "true").lower() == "true",
+        "chat_history": parsed_history,
+        "filters": filters or None,
+        "conversation_id": form_data.get("conversation_id") or None,
+    }
+
+
+def _check_filters(filters):
+    """Rejects metadata filters the index cannot match (nested objects, lists of objects) with a 400."""
+    error = filter_error(filters or {})
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 @router.post("/ask")
@@ -15,32 +62,88 @@ async def user_query(request: Request):
     User asks a question.
     - Can provide docs (user_docs).
     - Can choose to save them permanently (save=true).
+    - Can scope retrieval by metadata with `filters`, a JSON object such as {"brand": "acme", "region": ["uae", "ksa"]}.
+    - Can pass a `conversation_id` so the summary of older chat_history turns is cached under it.
     """
     try:
-        form_data = await request.form()
-        query = form_data.get("query", "")
-        save = form_data.get("save", "true").lower() == "true"
-        chat_history_str = form_data.get("chat_history", "[]")
-
-        try:
-            parsed_history = json.loads(chat_history_str)
-        except json.JSONDecodeError:
-            parsed_history = []
-
-        user_docs = form_data.getlist("user_docs")
-
-        answer = await rag_service.answer_with_user_docs(
-            query,
-            user_docs=user_docs,
-            save=save,
-            chat_history=parsed_history
-        )
+        params = await _read_ask_form(request)
+        answer = await get_rag_service().answer_with_user_docs(**params)
         return {
-            "query": query,
+            "query": params["query"],
             "answer": answer,
-            "used_user_docs": bool(user_docs),
-            "saved_user_docs": save
+            "used_user_docs": bool(params["user_docs"]),
+            "saved_user_docs": params["save"]
         }
+    except (ServiceOverloaded, HTTPException):
+        raise  # answered as 503 + Retry-After / 400 by the app's exception handlers
     except Exception as e:
         # A more detailed error response can be helpful for debugging
-        return {"error": str(e)}, 500
\ No newline at end of file
+        return {"error": str(e)}, 500
+
+
+@router.post("/ask/stream")
+async def user_query_stream(request: Request):
+    """
+    Same form as /ask, answered as Server-Sent Events:
+    - `token` events carry the answer text as the model generates it ({"text": ...}).
+    - a final `done` event carries the retrieved ids, whether the answer cache was hit and stage timings.
+    - an `error` event replaces `done` if generation fails mid-stream.
+    """
+    params = await _read_ask_form(request)
+    rag_service = get_rag_service()
+    # Shed load before the stream starts, while a 503 can still be sent
+    if rag_service.ollama.pool.is_saturated():
+        raise ServiceOverloaded("The answer service is at capacity, try again later", rag_service.ollama.pool.retry_after())
+
+    async def events():
+        try:
+            async for event in rag_service.stream_answer_with_user_docs(**params):
+                yield _sse(event["event"], event["data"])
+        except ServiceOverloaded as e:
+            yield _sse("error", {"message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Streaming answer failed: {e}", exc_info=True)
+            yield _sse("error", {"message": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/ask/batch")
+async def user_query_batch(body: BatchQueryRequest):
+    """
+    Answers many questions in one request, as NDJSON streamed in completion order:
+    - one line per question: {"index", "query", "status": "ok"|"error", "answer" or "error", "cached", "retrieved_ids", "ms"}
+    - a final {"done": true, ...} line with the counts and elapsed time.
+    Questions are answered without chat history; `filters` scopes retrieval for all of them.
+    """
+    if not body.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(body.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    _check_filters(body.filters)
+    rag_service = get_rag_service()
+    if rag_service.ollama.pool.is_saturated():
+        raise ServiceOverloaded("The answer service is at capacity, try again later", rag_service.ollama.pool.retry_after())
+
+    async def lines():
+        started = time.perf_counter()
+        counts = {"ok": 0, "error": 0}
+        try:
+            async for result in rag_service.answer_batch(body.queries, top_k=body.top_k, filters=body.filters or None):
+                counts[result["status"]] += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Batch request failed: {e}", exc_info=True)
+            yield json.dumps({"status": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+        yield json.dumps({
+            "done": True,
+            "total": len(body.queries),
+            **counts,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
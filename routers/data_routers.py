@@ -1,11 +1,70 @@
-from fastapi import APIRouter
-from src.services.vector_store_service import VectorStoreService
+import json
+import os
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from src.services.vector_store_service import get_vector_store_service
+
+load_dotenv()
+LIST_VECTORS_MAX_PAGE_SIZE = int(os.getenv("LIST_VECTORS_MAX_PAGE_SIZE", 500))
+LIST_VECTORS_EXPORT_PAGE_SIZE = int(os.getenv("LIST_VECTORS_EXPORT_PAGE_SIZE", 1000))
+
+# Public field name -> chroma `include` name (ids are always returned)
+FIELDS = {"ids": None, "documents": "documents", "metadata": "metadatas"}
 
 router= APIRouter(prefix="/data", tags=["data"])
-vector_store = VectorStoreService()
+
+
+def _parse_fields(fields: str):
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"fields must be a comma-separated subset of {sorted(FIELDS)}")
+    return [FIELDS[f] for f in requested if FIELDS[f]]
+
+
+def _rows(page: dict):
+    for i, doc_id in enumerate(page["ids"]):
+        row = {"id": doc_id}
+        if page.get("documents") is not None:
+            row["text"] = page["documents"][i]
+        if page.get("metadatas") is not None:
+            row["metadata"] = page["metadatas"][i]
+        yield row
+
 
 @router.get("/list-vectors")
-def list_vectors():
-    collection = vector_store.collection
-    docs = [{"id": i, "text": t} for i, t in zip(collection.get()["ids"], collection.get()["documents"])]
-    return {"documents": docs}
+def list_vectors(
+    limit: int = Query(100, ge=1),
+    cursor: int = Query(0, ge=0, description="Offset returned as `next_cursor` by the previous page"),
+    fields: str = Query("ids,documents", description="Comma-separated subset of ids, documents, metadata"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Lists the stored chunks one page at a time.
+    - `limit` is capped at LIST_VECTORS_MAX_PAGE_SIZE; follow `next_cursor` until it is null.
+    - `format=ndjson` streams the whole collection (from `cursor`) as one JSON object per line,
+      reading it in bounded pages so memory stays flat regardless of collection size.
+    """
+    include = _parse_fields(fields)
+    vector_store = get_vector_store_service()
+
+    if format == "ndjson":
+        def export():
+            for page in vector_store.iter_collection(LIST_VECTORS_EXPORT_PAGE_SIZE, include, start=cursor):
+                for row in _rows(page):
+                    yield json.dumps(row, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+
+    limit = min(limit, LIST_VECTORS_MAX_PAGE_SIZE)
+    page = vector_store.collection.get(limit=limit, offset=cursor, include=include)
+    next_cursor = cursor + len(page["ids"]) if len(page["ids"]) == limit else None
+    return {
+        "documents": list(_rows(page)),
+        "total": vector_store.collection.count(),
+        "limit": limit,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+    }
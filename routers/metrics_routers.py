@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from src.utils.Metrics import metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("")
+def get_metrics():
+    """
+    Returns the runtime counters and histograms of every registered component
+    (embedding batcher, caches, executors, ...).
+    """
+    return metrics.collect()
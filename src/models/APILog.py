@@ -5,7 +5,7 @@ from config import Base
 
 class APILog(Base):
     __tablename__ = "api_logs"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(String, primary_key=True, index=True)  # Helper.generate_id(), as in the deployed table
     timestamp = Column(DateTime, default=datetime.utcnow)
     method = Column(String)
     path = Column(String)
@@ -13,6 +13,9 @@ class APILog(Base):
     status_code = Column(Integer)
     status_description = Column(String)
     duration = Column(String)
+    duration_ms = Column(Float, nullable=True)
+    # JSON: per-stage timings, LLM token counts and the individual spans of the request
+    trace = Column(Text, nullable=True)
     user_id = Column(String, nullable=True)
     error_message = Column(Text, nullable=True)
     traceback = Column(Text, nullable=True)
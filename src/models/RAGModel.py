@@ -1,7 +1,11 @@
+import hashlib
+import json
 import os
+import re
 import sqlite3
 
 import faiss
+import numpy as np
 import pandas as pd
 import pytesseract
 import requests
@@ -10,84 +14,289 @@ from PIL import Image
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
 from docx import Document
-from sentence_transformers import SentenceTransformer
+from dotenv import load_dotenv
+
+from src.services.ingestion_manifest import make_chunk_ids
+from src.services.service_registry import registry
+
+load_dotenv()
+# Index layout: "flat" (exact), "ivf" (trained inverted lists), "hnsw" (graph), "ivfpq" (IVF + product quantization),
+# or the compressed exhaustive layouts "sq8" (int8 scalar quantization, 4x smaller) and "pq" (product quantization)
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", 256))
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", 48))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", 32))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", 80))
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", 8))
+RAG_EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", 64))
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "sq8", "pq")
+PQ_CENTROIDS = 256  # 8-bit product quantizer codes
+# faiss wants ~39 training vectors per centroid; below that these types are served by a flat index
+TRAINING_VECTORS_PER_CENTROID = 39
+_HEX_ID = re.compile(r"[0-9a-f]{15,}")
 
 
 class RAGModel:
-    def __init__(self, vector_db_path="vector.index", model="mistral"):
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, vector_db_path="vector.index", model="mistral", index_type=RAG_INDEX_TYPE):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+        self.index_type = index_type
         self.vector_db_path = vector_db_path
+        self.chunks_path = f"{vector_db_path}.chunks.json"
         self.text_chunks = []
+        self.chunk_ids = []
+        self._positions = None  # faiss id -> position in text_chunks, rebuilt lazily
         self.index = None
         self.model = model
         self.ollama_url = "http://localhost:11434/api/generate"
 
+    @property
+    def embedder(self):
+        # Loaded on first use, so indexes imported from a snapshot never load the model until a query arrives
+        return registry.get_embedding_model("all-MiniLM-L6-v2")
+
     # ---------- Data ingestion ----------
-    def from_txt(self, filepath):
+    def _append(self, chunks, source):
+        self.text_chunks.extend(chunks)
+        self.chunk_ids.extend(make_chunk_ids(source, chunks))
+        self._positions = None
+
+    def read_txt(self, filepath):
         with open(filepath, "r", encoding="utf-8") as f:
-            self.text_chunks.append(f.read())
+            return [f.read()]
 
-    def from_pdf(self, filepath):
+    def read_pdf(self, filepath):
         reader = PdfReader(filepath)
-        text = "".join([p.extract_text() for p in reader.pages if p.extract_text()])
-        self.text_chunks.append(text)
+        return ["".join([p.extract_text() for p in reader.pages if p.extract_text()])]
 
-    def from_word(self, filepath):
+    def read_word(self, filepath):
         doc = Document(filepath)
-        text = "\n".join([p.text for p in doc.paragraphs])
-        self.text_chunks.append(text)
+        return ["\n".join([p.text for p in doc.paragraphs])]
 
-    def from_excel(self, filepath):
+    def read_excel(self, filepath):
         df = pd.read_excel(filepath)
-        text = df.astype(str).apply(lambda x: " ".join(x), axis=1).tolist()
-        self.text_chunks.extend(text)
+        return df.astype(str).apply(lambda x: " ".join(x), axis=1).tolist()
+
+    def read_image(self, filepath):
+        return [pytesseract.image_to_string(Image.open(filepath))]
+
+    def read_audio(self, filepath):
+        model = whisper.load_model("base")
+        return [model.transcribe(filepath)["text"]]
+
+    FILE_READERS = {
+        ".txt": read_txt,
+        ".pdf": read_pdf,
+        ".docx": read_word,
+        ".xlsx": read_excel,
+        ".png": read_image,
+        ".jpg": read_image,
+        ".jpeg": read_image,
+        ".mp3": read_audio,
+        ".wav": read_audio,
+    }
+
+    def read_file(self, filepath):
+        """Extracts the chunks of a supported file, or returns None for unsupported types."""
+        reader = self.FILE_READERS.get(os.path.splitext(filepath)[1].lower())
+        return reader(self, filepath) if reader else None
+
+    def from_txt(self, filepath):
+        self._append(self.read_txt(filepath), filepath)
+
+    def from_pdf(self, filepath):
+        self._append(self.read_pdf(filepath), filepath)
+
+    def from_word(self, filepath):
+        self._append(self.read_word(filepath), filepath)
+
+    def from_excel(self, filepath):
+        self._append(self.read_excel(filepath), filepath)
 
     def from_db(self, db_path, query):
         conn = sqlite3.connect(db_path)
         df = pd.read_sql(query, conn)
         text = df.astype(str).apply(lambda x: " ".join(x), axis=1).tolist()
-        self.text_chunks.extend(text)
+        self._append(text, f"{db_path}:{query}")
 
     def from_web(self, url):
         html = requests.get(url).text
         soup = BeautifulSoup(html, "html.parser")
-        self.text_chunks.append(soup.get_text())
+        self._append([soup.get_text()], url)
 
     def from_image(self, filepath):
-        text = pytesseract.image_to_string(Image.open(filepath))
-        self.text_chunks.append(text)
+        self._append(self.read_image(filepath), filepath)
 
     def from_audio(self, filepath):
-        model = whisper.load_model("base")
-        result = model.transcribe(filepath)
-        self.text_chunks.append(result["text"])
+        self._append(self.read_audio(filepath), filepath)
 
     # ---------- Embedding & Index ----------
+    @staticmethod
+    def _faiss_ids(chunk_ids):
+        # Chunk IDs are hex content hashes; their first 60 bits make a stable positive int64.
+        # Other IDs (e.g. Chroma UUIDs imported from a snapshot) are hashed first.
+        def faiss_id(chunk_id):
+            if not _HEX_ID.fullmatch(chunk_id):
+                chunk_id = hashlib.sha256(chunk_id.encode("utf-8")).hexdigest()
+            return int(chunk_id[:15], 16)
+
+        return np.array([faiss_id(chunk_id) for chunk_id in chunk_ids], dtype=np.int64)
+
+    def _min_training_vectors(self):
+        """Vectors needed to train `self.index_type` (0 for types that need no training)."""
+        if self.index_type == "sq8":
+            return PQ_CENTROIDS  # value ranges fitted on a handful of vectors clip everything added later
+        centroids = {"ivf": RAG_IVF_NLIST, "pq": PQ_CENTROIDS, "ivfpq": max(RAG_IVF_NLIST, PQ_CENTROIDS)}
+        return TRAINING_VECTORS_PER_CENTROID * centroids.get(self.index_type, 0)
+
+    def _new_index(self, embeddings):
+        """
+        Creates an empty index of `self.index_type`, training it on `embeddings` when the type needs it.
+        With too little training data an exact flat index stands in; `add_embeddings` retrains
+        into the configured type once the corpus is large enough.
+        """
+        n, dim = embeddings.shape
+        if n < self._min_training_vectors():
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+        m = RAG_PQ_M if dim % RAG_PQ_M == 0 else next(d for d in range(min(RAG_PQ_M, dim), 0, -1) if dim % d == 0)
+        nbits = int(np.log2(PQ_CENTROIDS))
+        if self.index_type == "sq8":
+            base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+            base.train(embeddings)
+        elif self.index_type == "pq":
+            base = faiss.IndexPQ(dim, m, nbits)
+            base.train(embeddings)
+        elif self.index_type == "hnsw":
+            base = faiss.IndexHNSWFlat(dim, RAG_HNSW_M)
+            base.hnsw.efConstruction = RAG_HNSW_EF_CONSTRUCTION
+        elif self.index_type in ("ivf", "ivfpq"):
+            quantizer = faiss.IndexFlatL2(dim)
+            if self.index_type == "ivf":
+                base = faiss.IndexIVFFlat(quantizer, dim, RAG_IVF_NLIST)
+            else:
+                base = faiss.IndexIVFPQ(quantizer, dim, RAG_IVF_NLIST, m, nbits)
+            base.train(embeddings)
+        else:
+            base = faiss.IndexFlatL2(dim)
+        return faiss.IndexIDMap2(base)
+
+    def _is_untrained_fallback(self):
+        return self._min_training_vectors() > 0 and isinstance(faiss.downcast_index(self.index.index), faiss.IndexFlat)
+
+    def _retrain(self):
+        """Rebuilds a flat stand-in index as the configured type, trained on the vectors it holds."""
+        base = faiss.downcast_index(self.index.index)
+        embeddings = base.reconstruct_n(0, base.ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+        self.index = self._new_index(embeddings)
+        self.index.add_with_ids(embeddings, ids)
+
+    def _search_params(self, nprobe=None, ef_search=None, top_k=3):
+        base = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap2) else self.index
+        if isinstance(base, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=min(nprobe or RAG_NPROBE, base.nlist))
+        if isinstance(base, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=max(ef_search or RAG_EF_SEARCH, top_k))
+        return None
+
     def build_index(self):
         if not self.text_chunks:
             raise ValueError("No data ingested. Add data first.")
         embeddings = self.embedder.encode(self.text_chunks, convert_to_numpy=True)
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
+        self.index = self._new_index(embeddings)
+        self.index.add_with_ids(embeddings, self._faiss_ids(self.chunk_ids))
+        self.save_index()
+
+    def add_chunks(self, chunks, chunk_ids):
+        """
+        Adds chunks to the index without rebuilding it.
+        Chunks whose ID is already indexed are skipped, so only new content is embedded.
+        """
+        known = set(self.chunk_ids)
+        new = [(chunk_id, chunk) for chunk_id, chunk in zip(chunk_ids, chunks) if chunk_id not in known]
+        if not new:
+            return 0
+
+        new_ids = [chunk_id for chunk_id, _ in new]
+        new_chunks = [chunk for _, chunk in new]
+        return self.add_embeddings(new_chunks, new_ids, self.embedder.encode(new_chunks, convert_to_numpy=True))
+
+    def add_embeddings(self, chunks, chunk_ids, embeddings):
+        """
+        Adds already-embedded chunks (e.g. from a snapshot). When there is no index yet,
+        it is created and, for trained types, trained on `embeddings`; a flat stand-in
+        is retrained once enough vectors have accumulated.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.index is None:
+            self.index = self._new_index(embeddings)
+        self.index.add_with_ids(embeddings, self._faiss_ids(chunk_ids))
+        if self._is_untrained_fallback() and self.index.ntotal >= self._min_training_vectors():
+            self._retrain()
+        self.text_chunks.extend(chunks)
+        self.chunk_ids.extend(chunk_ids)
+        self._positions = None
+        return len(chunk_ids)
+
+    def remove_chunks(self, chunk_ids):
+        """Removes chunks from the index by chunk ID."""
+        to_remove = set(chunk_ids) & set(self.chunk_ids)
+        if not to_remove:
+            return 0
+        if self.index is not None:
+            try:
+                self.index.remove_ids(self._faiss_ids(list(to_remove)))
+            except RuntimeError:
+                # HNSW cannot delete; orphaned vectors are skipped at search time until the next build_index
+                pass
+        kept = [(chunk_id, chunk) for chunk_id, chunk in zip(self.chunk_ids, self.text_chunks) if chunk_id not in to_remove]
+        self.chunk_ids = [chunk_id for chunk_id, _ in kept]
+        self.text_chunks = [chunk for _, chunk in kept]
+        self._positions = None
+        return len(to_remove)
+
+    def save_index(self):
+        """Writes the index and, next to it, the chunk IDs and texts it was built from."""
         faiss.write_index(self.index, self.vector_db_path)
+        with open(self.chunks_path, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.chunk_ids, "texts": self.text_chunks}, f)
         print(f"✅ Vector index saved to {self.vector_db_path}")
 
     def load_index(self):
         if os.path.exists(self.vector_db_path):
             self.index = faiss.read_index(self.vector_db_path)
+            if os.path.exists(self.chunks_path):
+                with open(self.chunks_path, "r", encoding="utf-8") as f:
+                    chunks = json.load(f)
+                self.chunk_ids, self.text_chunks = chunks["ids"], chunks["texts"]
+                self._positions = None
             print("✅ Loaded existing vector index")
         else:
             raise FileNotFoundError("No index found. Build index first.")
 
     # ---------- Retrieval ----------
-    def retrieve(self, query, top_k=3):
+    def retrieve(self, query, top_k=3, nprobe=None, ef_search=None):
+        """
+        Returns the `top_k` chunks closest to `query`.
+        `nprobe` (IVF indexes) and `ef_search` (HNSW) trade recall for speed per call.
+        """
         if self.index is None:
             self.load_index()
         q_emb = self.embedder.encode([query], convert_to_numpy=True)
-        D, I = self.index.search(q_emb, top_k)
-        results = [self.text_chunks[i] for i in I[0]]
-        return results
+
+        # Oversample by the number of orphaned vectors (removed chunks an index could not delete)
+        k = min(self.index.ntotal, top_k + max(0, self.index.ntotal - len(self.chunk_ids)))
+        params = self._search_params(nprobe, ef_search, k)
+        D, I = self.index.search(q_emb, k, params=params) if params is not None else self.index.search(q_emb, k)
+
+        if self._positions is None:
+            self._positions = {int(faiss_id): i for i, faiss_id in enumerate(self._faiss_ids(self.chunk_ids))}
+        results = []
+        for i in dict.fromkeys(int(i) for i in I[0]):
+            if i in self._positions:
+                results.append(self.text_chunks[self._positions[i]])
+        return results[:top_k]
 
     # ---------- RAG Answer Generation ----------
     def ask(self, query, top_k=3):
@@ -0,0 +1,9 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 3
+    filters: Optional[Dict] = None
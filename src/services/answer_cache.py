@@ -0,0 +1,105 @@
+# src/services/answer_cache.py
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 86400))
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed on the embedding of the standalone (rephrased) query.
+
+    A lookup returns the stored answer of the most similar cached query when its
+    cosine similarity is at least `threshold`. Entries sit in a fixed-size ring of
+    unit-normalized float32 rows, so a lookup is one matrix-vector product.
+    `invalidate()` drops everything and bumps `version`; writers pass the version they
+    read before generating so answers built on a stale collection are never stored.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_SIMILARITY, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)  # 0 marks an empty slot
+        self._answers = [None] * self.max_entries
+        self._generation_seconds = np.zeros(self.max_entries, dtype=np.float32)
+        self._next = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding) -> Optional[str]:
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[self._expires < time.monotonic()] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.latency_saved_seconds += float(self._generation_seconds[best])
+            return self._answers[best]
+
+    def store(self, embedding, answer: str, generation_seconds: float, version: int):
+        query = self._normalize(embedding)
+        with self._lock:
+            if version != self.version:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+            slot = self._next
+            self._next = (self._next + 1) % self.max_entries
+            self._vectors[slot] = query
+            self._answers[slot] = answer
+            self._generation_seconds[slot] = generation_seconds
+            self._expires[slot] = time.monotonic() + self.ttl_seconds
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._expires[:] = 0
+            self._answers = [None] * self.max_entries
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "threshold": self.threshold,
+            "entries": int(np.count_nonzero(self._expires > time.monotonic())),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.latency_saved_seconds, 3),
+        }
+
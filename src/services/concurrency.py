@@ -0,0 +1,141 @@
+# src/services/concurrency.py
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+from dotenv import load_dotenv
+
+from src.utils.Metrics import Histogram
+
+load_dotenv()
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", 4))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", 32))
+OLLAMA_QUEUE_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", 30))
+
+
+class ServiceOverloaded(RuntimeError):
+    """A request was shed for backpressure; the API answers 503 with `Retry-After: retry_after`."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after))
+
+
+class ConcurrencyLimiter:
+    """
+    Async admission control in front of a slow backend (the Ollama server).
+
+    At most `max_in_flight` holders run at once and up to `max_queue` more wait in FIFO
+    order, each for at most `queue_timeout` seconds. A request that finds the queue full,
+    or times out in it, gets `ServiceOverloaded` right away with a Retry-After estimate
+    derived from the recent slot hold time.
+    """
+
+    def __init__(self, name: str, max_in_flight: int = OLLAMA_MAX_IN_FLIGHT, max_queue: int = OLLAMA_MAX_QUEUE,
+                 queue_timeout: float = OLLAMA_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_hold_seconds: Optional[float] = None
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_ms = Histogram()
+
+    def is_saturated(self) -> bool:
+        """True when a new request would be rejected immediately."""
+        with self._lock:
+            return self._in_flight >= self.max_in_flight and len(self._waiters) >= self.max_queue
+
+    def load(self) -> float:
+        """Holders plus waiters per slot; 1.0 means every slot is busy and nobody waits."""
+        with self._lock:
+            return (self._in_flight + len(self._waiters)) / self.max_in_flight
+
+    def retry_after(self) -> int:
+        hold = self._avg_hold_seconds or 1.0
+        return max(1, math.ceil(hold * (len(self._waiters) + 1) / self.max_in_flight))
+
+    async def acquire(self):
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                self.admitted += 1
+                self.wait_ms.observe(0)
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise ServiceOverloaded(f"{self.name} is at capacity, try again later", self.retry_after())
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            if handed_over:
+                # release() gave us the slot just as we gave up: pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                with self._lock:
+                    self.rejected_timeout += 1
+                raise ServiceOverloaded(f"Timed out waiting for {self.name}", self.retry_after()) from None
+            raise
+        with self._lock:
+            self.admitted += 1
+        self.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+    def release(self, hold_seconds: Optional[float] = None):
+        with self._lock:
+            if hold_seconds is not None:
+                previous = self._avg_hold_seconds
+                self._avg_hold_seconds = hold_seconds if previous is None else 0.8 * previous + 0.2 * hold_seconds
+            # Hand the slot straight to the oldest live waiter; in-flight stays unchanged
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                    return
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "avg_hold_seconds": round(self._avg_hold_seconds, 3) if self._avg_hold_seconds is not None else None,
+            }
+        return dict(counters, wait_ms=self.wait_ms.snapshot())
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,207 @@
+# src/services/context_assembler.py
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.services.lexical_index import tokenize
+from src.utils.Logger import logger
+from src.utils.Metrics import Histogram, metrics
+
+load_dotenv()
+MODEL_NAME = os.getenv("MODEL_NAME")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Optional per-model overrides, e.g. CONTEXT_TOKEN_BUDGETS='{"mistral": 6000, "llama3": 7000}'
+CONTEXT_TOKEN_BUDGETS: Dict[str, int] = json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", "{}"))
+CONTEXT_HISTORY_SHARE = float(os.getenv("CONTEXT_HISTORY_SHARE", 0.25))
+# Longest repeated prefix/tail checked between passages; matches the ingestion splitter's chunk_overlap
+CONTEXT_OVERLAP_CHARS = int(os.getenv("CONTEXT_OVERLAP_CHARS", 50))
+MIN_PASSAGE_TOKENS = 40
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cheap tokenizer-free estimate: word and punctuation pieces times 4/3, which tracks
+    the sub-word tokenizers of the Llama/Mistral family closely enough for budgeting.
+    """
+    return math.ceil(len(_TOKEN.findall(text or "")) * 4 / 3)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` to roughly `max_tokens`, preferring to end on a sentence boundary."""
+    pieces = list(_TOKEN.finditer(text))
+    limit = int(max_tokens * 3 / 4)
+    if len(pieces) <= limit:
+        return text
+    cut = text[:pieces[limit - 1].end()]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if sentence_end > len(cut) // 2:
+        cut = cut[:sentence_end + 1]
+    return cut.rstrip() + " …"
+
+
+def split_passages(text: str, max_tokens: int = 200) -> List[str]:
+    """Splits a document into paragraph-sized passages of at most ~`max_tokens` each."""
+    passages, current = [], ""
+    for paragraph in (p.strip() for p in _PARAGRAPH.split(text or "")):
+        if not paragraph:
+            continue
+        if current and count_tokens(current) + count_tokens(paragraph) > max_tokens:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+        while count_tokens(current) > max_tokens:
+            head = truncate_to_tokens(current, max_tokens).rstrip(" …")
+            if not head:
+                break
+            passages.append(head)
+            current = current[len(head):].strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def query_overlap(query: str, text: str) -> float:
+    """Fraction of the query's terms found in `text`."""
+    terms = set(tokenize(query))
+    return len(terms & set(tokenize(text))) / len(terms) if terms else 0.0
+
+
+class _Deduper:
+    """
+    Tracks kept passage texts. A new text is rejected when it is contained in a kept one;
+    otherwise a prefix repeating the tail of a kept passage (splitter overlap, at most
+    `window` chars) is stripped by looking it up in a set of the kept tails.
+    """
+
+    def __init__(self, window: int = CONTEXT_OVERLAP_CHARS, min_chars: int = 20):
+        self.window = window
+        self.min_chars = min_chars
+        self.texts: List[str] = []
+        self.tails = set()
+
+    def add(self, text: str) -> str:
+        """Returns the part of `text` worth keeping ("" for a duplicate) and remembers it."""
+        if not text or any(text in other for other in self.texts):
+            return ""
+        for size in range(min(self.window, len(text) - 1), self.min_chars - 1, -1):
+            if text[:size] in self.tails:
+                text = text[size:].lstrip()
+                break
+        if text:
+            self.texts.append(text)
+            self.tails.update(text[-size:] for size in range(self.min_chars, min(self.window, len(text) - 1) + 1))
+        return text
+
+
+class ContextAssembler:
+    """
+    Fits retrieved passages, user documents and chat history into a per-model token budget.
+
+    Passages are deduplicated (exact repeats, contained chunks and splitter overlap),
+    then admitted best-score first; history keeps the newest turns. Whatever does not
+    fit is truncated or dropped, and the tokens saved are reported per request.
+    """
+
+    def __init__(self, model: str = MODEL_NAME):
+        self.model = model
+        self.tokens_saved = Histogram([0, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000])
+        self.prompt_tokens = Histogram([250, 500, 1000, 2000, 4000, 8000, 16000, 32000])
+        metrics.register("context_assembler", self.stats)
+
+    def budget_for(self, model: Optional[str] = None) -> int:
+        return int(CONTEXT_TOKEN_BUDGETS.get(model or self.model, CONTEXT_TOKEN_BUDGET))
+
+    def assemble(self, query: str, passages: List[Dict], history: Optional[List[Dict]] = None,
+                 reserved_text: str = "", model: Optional[str] = None) -> Dict:
+        """
+        `passages` are dicts with `text` and `score` (higher is better); `history` is the
+        client chat history (`sender`/`content`). Returns the kept passages and turns plus
+        token accounting. CPU-bound on large uploads: run it on the embedding executor.
+        """
+        history = history or []
+        budget = self.budget_for(model)
+        reserved = count_tokens(reserved_text) + count_tokens(query)
+        original = reserved + sum(count_tokens(p["text"]) for p in passages) + \
+            sum(count_tokens(m.get("content", "")) for m in history)
+
+        available = max(0, budget - reserved)
+        history_allowance = int(available * CONTEXT_HISTORY_SHARE)
+
+        # History first pass: newest turns inside the history allowance
+        kept_turns, history_used = self._fit_history(history, history_allowance)
+
+        # Passages take everything that history did not use; only candidates that can
+        # still fit are deduplicated, so the work stays bounded by the budget
+        kept_passages, passages_used = [], 0
+        remaining = available - history_used
+        deduper = _Deduper()
+        for passage in sorted(passages, key=lambda p: p["score"], reverse=True):
+            if remaining <= 0:
+                break
+            text = passage["text"].strip()
+            if remaining < MIN_PASSAGE_TOKENS and count_tokens(text) > remaining:
+                continue
+            text = deduper.add(text)
+            if not text:
+                continue
+            passage = dict(passage, text=text)
+            tokens = count_tokens(text)
+            if tokens > remaining:
+                if remaining < MIN_PASSAGE_TOKENS:
+                    continue
+                passage = dict(passage, text=truncate_to_tokens(text, remaining))
+                tokens = count_tokens(passage["text"])
+            kept_passages.append(passage)
+            passages_used += tokens
+            remaining -= tokens
+
+        # Second pass: unused passage budget goes back to older history turns
+        if len(kept_turns) < len(history) and remaining > 0:
+            kept_turns, history_used = self._fit_history(history, history_used + remaining)
+
+        used = reserved + passages_used + history_used
+        saved = max(0, original - used)
+        self.tokens_saved.observe(saved)
+        self.prompt_tokens.observe(used)
+        if saved:
+            logger.info(
+                f"Context assembler: {original} -> {used} tokens (budget {budget}), "
+                f"dropped {len(passages) - len(kept_passages)} passages and {len(history) - len(kept_turns)} history turns"
+            )
+
+        return {
+            "passages": kept_passages,
+            "context_text": "\n\n".join(p["text"] for p in kept_passages),
+            "history": kept_turns,
+            "budget": budget,
+            "tokens_original": original,
+            "tokens_used": used,
+            "tokens_saved": saved,
+        }
+
+    @staticmethod
+    def _fit_history(history: List[Dict], allowance: int):
+        kept, used = [], 0
+        for message in reversed(history):
+            tokens = count_tokens(message.get("content", ""))
+            if used + tokens > allowance:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    def stats(self) -> dict:
+        return {
+            "default_budget": CONTEXT_TOKEN_BUDGET,
+            "model_budgets": CONTEXT_TOKEN_BUDGETS,
+            "tokens_saved": self.tokens_saved.snapshot(),
+            "prompt_tokens": self.prompt_tokens.snapshot(),
+        }
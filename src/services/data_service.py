@@ -1,35 +1,74 @@
 import json
 import os
-import uuid
+from typing import List
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from src.services.vector_store_service import VectorStoreService
+from src.services.ingestion_manifest import IngestionManifest
+from src.services.vector_store_service import get_vector_store_service, CHROMA_DB_DIR
 
 SAMPLE_DIR = "sample_data"
-vector_store_service = VectorStoreService()
+MANIFEST_PATH = os.path.join(CHROMA_DB_DIR, "ingestion_manifest.json")
+vector_store_service = get_vector_store_service()
 
 # Text splitter config
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
 
 class DataService:
 
-    def __init__(self):
-        pass
+    def __init__(self, manifest_path: str = MANIFEST_PATH):
+        self.manifest = IngestionManifest(manifest_path)
+
+    def _sync_chunks(self, filepath: str, chunks: List[str]):
+        """
+        Brings the vector store in line with the current chunks of `filepath`:
+        only chunks missing from the collection are embedded, and chunks the file
+        no longer produces are deleted.
+        """
+        chunk_ids, stale_ids = self.manifest.diff(filepath, chunks)
+        present = vector_store_service.existing_ids(chunk_ids)
+
+        new_docs, new_ids = [], []
+        for chunk_id, chunk in zip(chunk_ids, chunks):
+            if chunk_id not in present:
+                new_docs.append(chunk)
+                new_ids.append(chunk_id)
+
+        source = os.path.basename(filepath)
+        vector_store_service.add_to_vectorstore(new_docs, new_ids, [{"source": source} for _ in new_docs])
+        vector_store_service.delete_vectors(stale_ids)
+        self.manifest.record(filepath, chunk_ids)
+        self.manifest.save()
+        print(f"✅ Loaded {filepath}: {len(chunks)} chunks, {len(new_docs)} embedded, {len(stale_ids)} removed")
+
+    def prune_missing(self) -> List[str]:
+        """Deletes the chunks of files that were recorded before but no longer exist."""
+        removed = []
+        for filepath in self.manifest.missing_files():
+            vector_store_service.delete_vectors(self.manifest.forget(filepath))
+            removed.append(filepath)
+            print(f"🗑️ Removed {filepath}")
+        if removed:
+            self.manifest.save()
+        return removed
 
     def load_text_file(self, filepath):
         """Load and split a plain text file."""
         try:
+            if not self.manifest.needs_ingest(filepath):
+                print(f"⏭️ Unchanged, skipping {filepath}")
+                return
             with open(filepath, "r", encoding="utf-8") as f:
                 text = f.read()
             chunks = splitter.split_text(text)
-            ids = [str(uuid.uuid4()) for _ in chunks]
-            vector_store_service.add_to_vectorstore(chunks, ids)
-            print(f"✅ Loaded {filepath} with {len(chunks)} chunks")
+            self._sync_chunks(filepath, chunks)
         except Exception as e:
             print(f"⚠️ Error loading {filepath}: {e}")
 
     def load_json_file(self, filepath):
         """Load and split JSON file with text fields."""
         try:
+            if not self.manifest.needs_ingest(filepath):
+                print(f"⏭️ Unchanged, skipping {filepath}")
+                return
             with open(filepath, "r", encoding="utf-8") as f:
                 data = json.load(f)
 
@@ -41,9 +80,7 @@ class DataService:
                     if text:
                         chunks.extend(splitter.split_text(text))
 
-            ids = [str(uuid.uuid4()) for _ in chunks]
-            vector_store_service.add_to_vectorstore(chunks, ids)
-            print(f"✅ Loaded {filepath} with {len(chunks)} chunks")
+            self._sync_chunks(filepath, chunks)
         except Exception as e:
             print(f"⚠️ Error loading {filepath}: {e}")
 
@@ -57,6 +94,9 @@ if __name__ == "__main__":
         "franchise_data.json"
     ]
 
+    # Drop chunks of files that were removed since the last run
+    data_service.prune_missing()
+
     for file in sample_files:
         file_path = os.path.join(SAMPLE_DIR, file)  # always look inside sample_data/
         if not os.path.exists(file_path):
@@ -68,6 +108,9 @@ if __name__ == "__main__":
         else:
             data_service.load_text_file(file_path)
 
+    data_service.manifest.save()  # persist stat refreshes of touched-but-unchanged files
+    vector_store_service.flush_lexical_index()
+
     # Debugging: check how many vectors we have
     try:
         print("📊 Vector store count:", vector_store_service.collection.count())
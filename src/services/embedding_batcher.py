@@ -0,0 +1,164 @@
+# src/services/embedding_batcher.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.services.service_registry import registry, EMBEDDING_MODEL
+from src.utils.Logger import logger
+from src.utils.Metrics import Histogram, metrics
+
+load_dotenv()
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 3))
+
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front end for an embedding model.
+
+    Callers submit texts from any thread and block on their own result. A single
+    dispatcher thread gathers the requests that arrive within `max_wait_ms` (or until
+    `max_batch_size` texts are queued), encodes them in one `model.encode` call and
+    hands every caller back its rows.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS, name: str = "embedding-batcher"):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.wait_ms = Histogram()
+        self.encode_ms = Histogram()
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encodes `texts` as part of the next batch. Returns a float32 array, one row per text."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._closed:
+            raise RuntimeError("EmbeddingBatcher is closed")
+
+        future: Future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish the current batch, then let the loop see the stop marker
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._fail_pending()
+                break
+
+            batch = self._collect(first)
+            texts = [text for item in batch for text in item[0]]
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(self.model.encode(texts), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"EmbeddingBatcher: batch of {len(texts)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self.batches += 1
+            self.items += len(texts)
+            self.batch_sizes.observe(len(texts))
+            self.encode_ms.observe((finished - started) * 1000)
+
+            offset = 0
+            for item_texts, future, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("EmbeddingBatcher is closed"))
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot(),
+        }
+
+
+class _DirectEncoder:
+    """Pass-through used when batching is disabled."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts)), dtype=np.float32)
+
+
+def get_embedding_batcher(model_name: str = EMBEDDING_MODEL):
+    """Returns the process-wide query encoder for `model_name` (batched unless EMBEDDING_BATCHING=false)."""
+    def build():
+        model = registry.get_embedding_model(model_name)
+        if not EMBEDDING_BATCHING:
+            return _DirectEncoder(model)
+        batcher = EmbeddingBatcher(model)
+        metrics.register(f"embedding_batcher.{model_name}", batcher.stats)
+        return batcher
+
+    def shutdown(batcher):
+        metrics.unregister(f"embedding_batcher.{model_name}")
+        if isinstance(batcher, EmbeddingBatcher):
+            batcher.close()
+
+    return registry.get_or_create(("embedding_batcher", model_name), build, shutdown=shutdown)
@@ -0,0 +1,140 @@
+# src/services/embedding_cache.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.services.service_registry import registry, EMBEDDING_MODEL
+from src.utils.Metrics import metrics
+
+load_dotenv()
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", 16))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 3600))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a query: case-folded, whitespace collapsed, trailing punctuation dropped."""
+    return _WHITESPACE.sub(" ", text).strip().rstrip("?!. ").lower()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of text embeddings.
+
+    Vectors live in one preallocated float32 block (`capacity x dim`) sized from
+    `max_bytes`; the LRU map only stores the row index of each key, so a cached
+    embedding costs `dim * 4` bytes instead of a list of Python floats.
+    """
+
+    def __init__(self, max_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+                 ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.capacity = 0
+        self._block: Optional[np.ndarray] = None  # allocated on the first put, once dim is known
+        self._slots: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (row, expires_at)
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _allocate(self, dim: int):
+        self.capacity = max(1, self.max_bytes // (dim * 4))
+        self._block = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._free = list(range(self.capacity - 1, -1, -1))
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = normalize_text(text)
+        with self._lock:
+            entry = self._slots.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            row, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._slots[key]
+                self._free.append(row)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._slots.move_to_end(key)
+            self.hits += 1
+            return self._block[row].copy()
+
+    def put(self, text: str, vector: np.ndarray):
+        key = normalize_text(text)
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self._block is None:
+                self._allocate(vector.shape[0])
+            if vector.shape[0] != self._block.shape[1]:
+                return
+
+            entry = self._slots.pop(key, None)
+            if entry is not None:
+                row = entry[0]
+            elif self._free:
+                row = self._free.pop()
+            else:
+                _, (row, _) = self._slots.popitem(last=False)
+                self.evictions += 1
+
+            self._block[row] = vector
+            self._slots[key] = (row, time.monotonic() + self.ttl_seconds)
+
+    def encode(self, texts: List[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Returns embeddings for `texts`, serving cached rows and encoding all misses
+        with a single `encoder` call.
+        """
+        cached = [self.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            fresh = np.asarray(encoder([texts[i] for i in missing]), dtype=np.float32)
+            for i, vector in zip(missing, fresh):
+                self.put(texts[i], vector)
+                cached[i] = vector
+        return np.vstack(cached).astype(np.float32, copy=False) if cached else np.zeros((0, 0), dtype=np.float32)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._free = list(range(self.capacity - 1, -1, -1))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "memory_bytes": self._block.nbytes if self._block is not None else 0,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def get_embedding_cache(model_name: str = EMBEDDING_MODEL) -> EmbeddingCache:
+    """Returns the process-wide embedding cache for `model_name`."""
+    def build():
+        cache = EmbeddingCache()
+        metrics.register(f"embedding_cache.{model_name}", cache.stats)
+        return cache
+
+    return registry.get_or_create(
+        ("embedding_cache", model_name), build,
+        shutdown=lambda _: metrics.unregister(f"embedding_cache.{model_name}")
+    )
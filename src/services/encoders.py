@@ -0,0 +1,238 @@
+# src/services/encoders.py
+import os
+import time
+from typing import List, Protocol, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.Logger import logger
+
+load_dotenv()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "torch" (SentenceTransformer as-is), "torch-int8" (dynamic int8 Linear layers),
+# "onnx" (ONNX Runtime, fp32) or "onnx-int8" (ONNX Runtime, dynamically quantized weights)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./data/onnx")
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", 0))  # 0 lets ONNX Runtime decide
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+class Encoder(Protocol):
+    """What the services need from an embedding model; SentenceTransformer satisfies it as-is."""
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray: ...
+
+    def get_sentence_embedding_dimension(self) -> int: ...
+
+
+class OnnxEncoder:
+    """
+    Runs the transformer of a SentenceTransformer model with ONNX Runtime and applies
+    the model's own pooling and normalization in numpy, so fp32 output matches the
+    PyTorch backend to within float rounding.
+
+    The graph is exported once to `EMBEDDING_ONNX_DIR/<model>/model.onnx` (and, for
+    `quantize=True`, dynamically quantized to `model.int8.onnx`); a model file placed
+    there beforehand is used as-is.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantize: bool = False, export_dir: str = EMBEDDING_ONNX_DIR):
+        import onnxruntime as ort
+        from sentence_transformers import SentenceTransformer, models
+
+        source = SentenceTransformer(model_name, device="cpu")
+        pooling = next((m for m in source if isinstance(m, models.Pooling)), None)
+        self.pooling_mode = pooling.get_pooling_mode_str() if pooling else "mean"
+        if self.pooling_mode not in ("mean", "cls", "max"):
+            raise ValueError(f"Unsupported pooling mode '{self.pooling_mode}' for the ONNX backend")
+        self.normalize = any(isinstance(m, models.Normalize) for m in source)
+        self.tokenizer = source.tokenizer
+        self.max_seq_length = source.max_seq_length
+        self.dimension = source.get_sentence_embedding_dimension()
+        self.backend = "onnx-int8" if quantize else "onnx"
+
+        directory = os.path.join(export_dir, model_name.replace("/", "__"))
+        path = os.path.join(directory, "model.onnx")
+        if not os.path.exists(path):
+            export_onnx(source, path)
+        if quantize:
+            path = quantize_onnx(path)
+        del source  # the PyTorch weights are no longer needed
+
+        options = ort.SessionOptions()
+        if EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = EMBEDDING_ONNX_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        logger.info(f"ONNX encoder ready: {path} ({self.pooling_mode} pooling, normalize={self.normalize})")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Same contract as `SentenceTransformer.encode` for numpy output; other keyword options are ignored."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Length-sorted batches keep padding (and wasted compute) to a minimum
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        output = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            output[rows] = self._encode_batch([texts[i] for i in rows])
+        return output[0] if single else output
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        features = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        feeds = {name: features[name].astype(np.int64) for name in self.input_names if name in features}
+        hidden = self.session.run(None, feeds)[0]
+        embeddings = pool(hidden, features["attention_mask"], self.pooling_mode)
+        if self.normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def pool(hidden: np.ndarray, attention_mask: np.ndarray, mode: str = "mean") -> np.ndarray:
+    """Token embeddings (batch, tokens, dim) -> sentence embeddings, ignoring padding."""
+    mask = attention_mask[:, :, None].astype(np.float32)
+    if mode == "cls":
+        return hidden[:, 0].astype(np.float32)
+    if mode == "max":
+        return np.where(mask > 0, hidden, -1e9).max(axis=1).astype(np.float32)
+    return ((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)).astype(np.float32)
+
+
+def export_onnx(model, path: str, opset: int = 17):
+    """Exports the transformer module of a SentenceTransformer (token embeddings output) to ONNX."""
+    import torch
+
+    transformer = model[0].auto_model.eval()
+    input_names = [n for n in model.tokenizer.model_input_names if n in ("input_ids", "attention_mask", "token_type_ids")]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = model.tokenizer(["an export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "tokens"}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(), tuple(sample[name] for name in input_names), tmp_path,
+            input_names=input_names, output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False,
+        )
+    os.replace(tmp_path, path)
+    logger.info(f"Exported ONNX embedding model to {path}")
+
+
+def quantize_onnx(path: str) -> str:
+    """Writes (once) and returns a copy of `path` with dynamically int8-quantized weights."""
+    quantized_path = path[:-len(".onnx")] + ".int8.onnx"
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info(f"Quantized ONNX embedding model written to {quantized_path}")
+    return quantized_path
+
+
+def quantize_torch(model):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized on the fly)."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_encoder(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> Encoder:
+    """Builds the encoder for `model_name` on the configured backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of {BACKENDS}.")
+    if backend.startswith("onnx"):
+        return OnnxEncoder(model_name, quantize=backend == "onnx-int8")
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch-int8":
+        return quantize_torch(SentenceTransformer(model_name, device="cpu"))
+    return SentenceTransformer(model_name)
+
+
+def compare_encoders(reference: Encoder, candidates: dict, texts: List[str], batch_size: int = 32) -> dict:
+    """
+    Parity and throughput of each candidate against `reference`: cosine similarity of
+    the embeddings of `texts` (min and mean), batch throughput and single-text latency.
+    """
+    def timed(encoder):
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        started = time.perf_counter()
+        vectors = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+        batch_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for text in texts[:50]:
+            encoder.encode([text])
+        single_ms = (time.perf_counter() - started) / min(len(texts), 50) * 1000
+        return vectors, {"texts_per_second": round(len(texts) / batch_seconds, 1), "single_text_ms": round(single_ms, 2)}
+
+    def unit(vectors):
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    reference_vectors, report_reference = timed(reference)
+    report = {"reference": report_reference}
+    for name, encoder in candidates.items():
+        vectors, entry = timed(encoder)
+        cosine = (unit(vectors) * unit(reference_vectors)).sum(axis=1)
+        entry.update(
+            cosine_min=round(float(cosine.min()), 5),
+            cosine_mean=round(float(cosine.mean()), 5),
+            speedup=round(entry["texts_per_second"] / report_reference["texts_per_second"], 2),
+        )
+        report[name] = entry
+    return report
+
+
+def reembed_collection(collection, encoder: Encoder, page_size: int = 256) -> int:
+    """Re-encodes every stored document with `encoder` and overwrites its embedding in place."""
+    offset, updated = 0, 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["documents"])
+        if not page["ids"]:
+            return updated
+        embeddings = np.asarray(encoder.encode(page["documents"]), dtype=np.float32)
+        collection.update(ids=page["ids"], embeddings=embeddings.tolist())
+        offset += len(page["ids"])
+        updated += len(page["ids"])
+
+
+if __name__ == "__main__":
+    # Parity + throughput against the PyTorch model:  python -m src.services.encoders compare
+    # Re-embed the collection with EMBEDDING_BACKEND: python -m src.services.encoders reembed
+    # (stop the API first; the quantized search copy is rebuilt from the new vectors on the next start)
+    import json
+    import sys
+
+    from src.services.service_registry import registry
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "compare"
+    collection = registry.get_collection()
+    if command == "reembed":
+        count = reembed_collection(collection, load_encoder(EMBEDDING_MODEL, EMBEDDING_BACKEND))
+        print(f"✅ Re-embedded {count} documents with the '{EMBEDDING_BACKEND}' backend")
+    else:
+        sample = collection.get(limit=512, include=["documents"])["documents"] or [
+            f"What is the royalty fee for franchise number {i}?" for i in range(512)
+        ]
+        candidates = {}
+        for backend in BACKENDS[1:]:
+            try:
+                candidates[backend] = load_encoder(EMBEDDING_MODEL, backend)
+            except Exception as e:
+                print(f"⚠️ Skipping backend '{backend}': {e}")
+        print(json.dumps(compare_encoders(load_encoder(EMBEDDING_MODEL, "torch"), candidates, sample), indent=2))
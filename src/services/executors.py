@@ -0,0 +1,189 @@
+# src/services/executors.py
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable
+
+from dotenv import load_dotenv
+
+from src.services.concurrency import ServiceOverloaded
+from src.services.service_registry import registry
+from src.utils.Metrics import Histogram, metrics
+
+load_dotenv()
+# CPU-bound work (embedding, vector search): roughly one worker per core the model can use
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", min(4, os.cpu_count() or 1)))
+EMBEDDING_EXECUTOR_QUEUE = int(os.getenv("EMBEDDING_EXECUTOR_QUEUE", 64))
+# I/O-bound LLM calls: size to the number of generations Ollama can serve in parallel
+LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", 8))
+LLM_EXECUTOR_QUEUE = int(os.getenv("LLM_EXECUTOR_QUEUE", 64))
+
+
+class ExecutorSaturated(ServiceOverloaded):
+    """Raised when an executor already holds `max_workers + max_queue` tasks."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded backlog, used to keep blocking calls off the event loop.
+
+    At most `max_workers` tasks run and `max_queue` more wait; further submissions are
+    rejected with `ExecutorSaturated` instead of piling up unbounded. Queue depth,
+    queue wait and run time are tracked for `/metrics`.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_ms = Histogram()
+        self.run_ms = Histogram()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} executor is saturated ({self.max_workers} running, {self.max_queue} queued)")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+            self.wait_ms.observe((started - submitted) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                self.run_ms.observe((time.perf_counter() - started) * 1000)
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                self._slots.release()
+
+        def on_done(future: Future):
+            # A task cancelled while still queued never runs, so give its slot back here
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+                self._slots.release()
+
+        try:
+            # Run in the caller's context so request-scoped state (the trace) follows the task
+            future = self._pool.submit(contextvars.copy_context().run, task)
+        except RuntimeError:
+            with self._lock:
+                self.queued -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(on_done)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Runs `fn(*args, **kwargs)` on the pool and awaits its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def iterate(self, fn: Callable, *args, **kwargs) -> AsyncIterator:
+        """
+        Consumes the blocking iterator returned by `fn(*args, **kwargs)` on the pool and
+        yields its items on the event loop. Closing the async iterator early stops the
+        producer at its next item and closes the blocking iterator.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def publish(kind, value):
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+            except RuntimeError:  # event loop already closed
+                stop.set()
+
+        def produce():
+            iterator = None
+            try:
+                iterator = iter(fn(*args, **kwargs))
+                for item in iterator:
+                    if stop.is_set():
+                        break
+                    publish("item", item)
+                publish("end", None)
+            except BaseException as e:
+                publish("error", e)
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+
+        self.submit(produce)
+        try:
+            while True:
+                kind, value = await items.get()
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            stop.set()
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        return dict(counters, wait_ms=self.wait_ms.snapshot(), run_ms=self.run_ms.snapshot())
+
+
+def _get_executor(name: str, max_workers: int, max_queue: int) -> BoundedExecutor:
+    def build():
+        executor = BoundedExecutor(name, max_workers, max_queue)
+        metrics.register(f"executor.{name}", executor.stats)
+        return executor
+
+    def shutdown(executor):
+        metrics.unregister(f"executor.{name}")
+        executor.shutdown(wait=False)
+
+    return registry.get_or_create(("executor", name), build, shutdown=shutdown)
+
+
+def get_embedding_executor() -> BoundedExecutor:
+    """Process-wide pool for CPU-bound work: query embedding, vector and lexical search, ingestion."""
+    return _get_executor("embedding", EMBEDDING_EXECUTOR_WORKERS, EMBEDDING_EXECUTOR_QUEUE)
+
+
+def get_llm_executor() -> BoundedExecutor:
+    """Process-wide pool for blocking LLM calls."""
+    return _get_executor("llm", LLM_EXECUTOR_WORKERS, LLM_EXECUTOR_QUEUE)
@@ -0,0 +1,177 @@
+# src/services/history_manager.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.services.context_assembler import count_tokens, truncate_to_tokens
+from src.utils.Logger import logger
+from src.utils.Metrics import Histogram
+
+load_dotenv()
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() == "true"
+# Newest messages always kept word for word; older ones are folded into the running summary
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", 6))
+# Hard ceiling for summary + verbatim turns in both the rephrase and the answer prompt
+HISTORY_TOKEN_CEILING = int(os.getenv("HISTORY_TOKEN_CEILING", 800))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 250))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", 1000))
+
+# (previous summary or None, turns to fold in) -> new summary
+Summarizer = Callable[[Optional[str], List[Dict]], Awaitable[str]]
+
+
+def format_transcript(turns: List[Dict]) -> str:
+    """Client chat turns (`sender`/`content`) as `Sender: content` lines."""
+    return "".join(f"{msg.get('sender', 'user').capitalize()}: {msg.get('content', '')}\n" for msg in turns)
+
+
+def _digest(turns: List[Dict]) -> str:
+    payload = json.dumps([[msg.get("sender"), msg.get("content")] for msg in turns], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class HistoryManager:
+    """
+    Bounds the chat history that goes into the prompts.
+
+    The last `recent_turns` messages are kept verbatim; everything older is represented by a
+    running summary, cached per conversation together with how many messages it covers. The
+    summary is (re)computed in a background task, never on the request path: a turn that
+    arrives before the summary has caught up keeps the not-yet-summarized messages verbatim
+    (newest first) instead. Summary and turns together never exceed `token_ceiling`.
+
+    Conversations are keyed by the client's conversation id or, without one, by their first
+    message. A cached summary is only used while the messages it covers are unchanged.
+    """
+
+    def __init__(self, summarize: Summarizer, recent_turns: int = HISTORY_RECENT_TURNS,
+                 token_ceiling: int = HISTORY_TOKEN_CEILING, summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+                 max_conversations: int = HISTORY_SUMMARY_CACHE_SIZE):
+        self.summarize = summarize
+        self.recent_turns = max(1, recent_turns)
+        self.token_ceiling = token_ceiling
+        self.summary_max_tokens = min(summary_max_tokens, token_ceiling // 2)
+        self.max_conversations = max_conversations
+        self._summaries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.summary_hits = 0
+        self.summary_stale = 0
+        self.summaries_built = 0
+        self.summary_failures = 0
+        self.turns_dropped = 0
+        self.summary_ms = Histogram()
+        self.history_tokens = Histogram(buckets=[50, 100, 200, 400, 800, 1600, 3200, 6400])
+
+    def compact(self, history: Optional[List[Dict]], conversation_id: Optional[str] = None) -> Dict:
+        """
+        Returns `summary` (str or None) and `turns` (the verbatim messages) for this request,
+        plus `tokens`. Schedules a background summary refresh when older messages are not
+        covered yet; must be called from the event loop.
+        """
+        history = history or []
+        with self._lock:
+            self.requests += 1
+        older = history[:-self.recent_turns] if len(history) > self.recent_turns else []
+        summary, covered = None, 0
+        if older and HISTORY_SUMMARY_ENABLED:
+            key = conversation_id or _digest(history[:1])
+            summary, covered = self._lookup(key, older)
+            if covered < len(older):
+                self._schedule(key, older, summary, covered)
+
+        summary_tokens = count_tokens(summary) if summary else 0
+        turns, used = self._fit(history[covered:], self.token_ceiling - summary_tokens)
+        with self._lock:
+            self.turns_dropped += len(history) - covered - len(turns)
+        self.history_tokens.observe(summary_tokens + used)
+        return {"summary": summary, "turns": turns, "tokens": summary_tokens + used}
+
+    def _lookup(self, key: str, older: List[Dict]):
+        with self._lock:
+            entry = self._summaries.get(key)
+            if entry is None or entry["covered"] > len(older) or entry["digest"] != _digest(older[:entry["covered"]]):
+                return None, 0
+            self._summaries.move_to_end(key)
+            if entry["covered"] == len(older):
+                self.summary_hits += 1
+            else:
+                self.summary_stale += 1
+            return entry["summary"], entry["covered"]
+
+    def _schedule(self, key: str, older: List[Dict], summary: Optional[str], covered: int):
+        if key in self._pending:
+            return  # one refresh per conversation at a time; the next turn picks up the rest
+        task = asyncio.ensure_future(self._refresh(key, list(older), summary, covered))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def _refresh(self, key: str, older: List[Dict], summary: Optional[str], covered: int):
+        started = time.perf_counter()
+        try:
+            updated = await self.summarize(summary, older[covered:])
+        except Exception as e:
+            with self._lock:
+                self.summary_failures += 1
+            logger.warning(f"History summary for conversation {key[:12]} failed: {e}")
+            return
+        self.summary_ms.observe((time.perf_counter() - started) * 1000)
+        entry = {
+            "covered": len(older),
+            "digest": _digest(older),
+            "summary": truncate_to_tokens(updated.strip(), self.summary_max_tokens),
+        }
+        with self._lock:
+            self.summaries_built += 1
+            self._summaries[key] = entry
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_conversations:
+                self._summaries.popitem(last=False)
+
+    @staticmethod
+    def _fit(turns: List[Dict], allowance: int):
+        """Newest turns first within `allowance` tokens; a newest turn that is too long alone is truncated."""
+        kept, used = [], 0
+        for msg in reversed(turns):
+            tokens = count_tokens(msg.get("content", ""))
+            if used + tokens > allowance:
+                if not kept and allowance > 0:
+                    content = truncate_to_tokens(msg.get("content", ""), allowance)
+                    kept.append(dict(msg, content=content))
+                    used += count_tokens(content)
+                break
+            kept.append(msg)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    async def drain(self):
+        """Waits for the background summaries in flight (used by tests and shutdown)."""
+        pending: Set[asyncio.Task] = set(self._pending.values())
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "recent_turns": self.recent_turns,
+                "token_ceiling": self.token_ceiling,
+                "requests": self.requests,
+                "summary_hits": self.summary_hits,
+                "summary_stale": self.summary_stale,
+                "summaries_built": self.summaries_built,
+                "summary_failures": self.summary_failures,
+                "summaries_pending": len(self._pending),
+                "conversations_cached": len(self._summaries),
+                "turns_dropped": self.turns_dropped,
+            }
+        return dict(counters, summary_ms=self.summary_ms.snapshot(), history_tokens=self.history_tokens.snapshot())
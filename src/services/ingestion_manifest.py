@@ -0,0 +1,108 @@
+# src/services/ingestion_manifest.py
+import hashlib
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from src.utils.Logger import logger
+
+
+def file_sha256(filepath: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_ids(source: str, chunks: List[str]) -> List[str]:
+    """
+    Deterministic, content-addressed chunk IDs.
+    The ID hashes the source, the chunk text and the occurrence number of that text
+    within the source, so re-ingesting unchanged content yields the same IDs and
+    repeated chunks inside one file stay distinct.
+    """
+    seen = Counter()
+    ids = []
+    for chunk in chunks:
+        occurrence = seen[chunk]
+        seen[chunk] += 1
+        digest = hashlib.sha256(f"{source}\x00{occurrence}\x00{chunk}".encode("utf-8")).hexdigest()
+        ids.append(digest[:32])
+    return ids
+
+
+class IngestionManifest:
+    """
+    Persistent record of what has been ingested: for every file its mtime, size,
+    content hash and the IDs of the chunks it produced.
+
+    `needs_ingest` answers from mtime/size first and only hashes the file when those
+    changed; `diff` compares the new chunk IDs with the recorded ones so callers only
+    embed new chunks and delete stale ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self._pending: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable ingestion manifest {path}: {e}")
+
+    @staticmethod
+    def key(filepath: str) -> str:
+        return os.path.normpath(filepath)
+
+    def needs_ingest(self, filepath: str) -> bool:
+        key = self.key(filepath)
+        stat = os.stat(filepath)
+        entry = self.files.get(key)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return False
+
+        sha256 = file_sha256(filepath)
+        if entry and entry["sha256"] == sha256:
+            # Touched but identical content: refresh the stat fields only
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            return False
+
+        self._pending[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha256}
+        return True
+
+    def diff(self, filepath: str, chunks: List[str]) -> Tuple[List[str], List[str]]:
+        """Returns (chunk_ids, stale_ids): the IDs for `chunks` and the recorded IDs no longer produced."""
+        chunk_ids = make_chunk_ids(self.key(filepath), chunks)
+        previous = self.files.get(self.key(filepath), {}).get("chunk_ids", [])
+        current = set(chunk_ids)
+        stale_ids = [chunk_id for chunk_id in previous if chunk_id not in current]
+        return chunk_ids, stale_ids
+
+    def record(self, filepath: str, chunk_ids: List[str]):
+        key = self.key(filepath)
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            stat = os.stat(filepath)
+            entry = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": file_sha256(filepath)}
+        entry["chunk_ids"] = list(chunk_ids)
+        self.files[key] = entry
+
+    def missing_files(self) -> List[str]:
+        return [key for key in self.files if not os.path.exists(key)]
+
+    def forget(self, filepath: str) -> List[str]:
+        """Drops a file from the manifest and returns the chunk IDs it had produced."""
+        return self.files.pop(self.key(filepath), {}).get("chunk_ids", [])
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,269 @@
+# src/services/lexical_index.py
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.utils.Logger import logger
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from how i if in into is it its me my of on or our
+should so than that the their them then there these they this to us was we what when where which who
+why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index, maintained incrementally next to the vector store.
+
+    Each term keeps two compact growable arrays: the document positions it occurs in
+    (`array('I')`) and the matching term frequencies (`array('H')`). Deleted documents
+    are tombstoned and dropped from the postings by `compact()` once they make up a
+    large share of the index; the document frequencies used for IDF only count live
+    documents, so scores do not drift in between. The index persists to a single `.npz` file.
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.doc_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.doc_len = array("I")
+        self.alive = bytearray()
+        self.vocab: Dict[str, int] = {}
+        self.postings_docs: List[array] = []
+        self.postings_tf: List[array] = []
+        self.df = array("I")  # live documents per term
+        self.doc_terms: List[array] = []  # term ids per document position, to update df on removal
+        self.live_docs = 0
+        self.total_len = 0
+
+    def __len__(self):
+        return self.live_docs
+
+    # ---------- Maintenance ----------
+    def add(self, ids: List[str], texts: List[str]):
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self.positions:
+                    self._tombstone(doc_id)
+
+                position = len(self.doc_ids)
+                terms = tokenize(text or "")
+                self.doc_ids.append(doc_id)
+                self.positions[doc_id] = position
+                self.doc_len.append(len(terms))
+                self.alive.append(1)
+                self.live_docs += 1
+                self.total_len += len(terms)
+
+                counts: Dict[str, int] = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                term_ids = array("I")
+                for term, tf in counts.items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = self.vocab[term] = len(self.postings_docs)
+                        self.postings_docs.append(array("I"))
+                        self.postings_tf.append(array("H"))
+                        self.df.append(0)
+                    self.postings_docs[term_id].append(position)
+                    self.postings_tf[term_id].append(min(tf, 0xFFFF))
+                    self.df[term_id] += 1
+                    term_ids.append(term_id)
+                self.doc_terms.append(term_ids)
+            # Re-adding an ID tombstones its old version, so upserts leave dead postings too
+            self._maybe_compact()
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self.positions:
+                    self._tombstone(doc_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self.doc_ids) > 1000 and self.live_docs < 0.7 * len(self.doc_ids):
+            self.compact()
+
+    def _tombstone(self, doc_id: str):
+        position = self.positions.pop(doc_id)
+        self.alive[position] = 0
+        self.live_docs -= 1
+        self.total_len -= self.doc_len[position]
+        for term_id in self.doc_terms[position]:
+            self.df[term_id] -= 1
+        self.doc_terms[position] = array("I")
+
+    def compact(self):
+        """Drops tombstoned documents from the postings and renumbers the live ones."""
+        with self._lock:
+            remap = np.full(len(self.doc_ids), -1, dtype=np.int64)
+            live = [i for i, flag in enumerate(self.alive) if flag]
+            remap[live] = np.arange(len(live))
+
+            for term_id in range(len(self.postings_docs)):
+                docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self.postings_tf[term_id], dtype=np.uint16)
+                keep = remap[docs] >= 0
+                self.postings_docs[term_id] = array("I", remap[docs[keep]].astype(np.uint32).tobytes())
+                self.postings_tf[term_id] = array("H", tfs[keep].tobytes())
+
+            self.doc_ids = [self.doc_ids[i] for i in live]
+            self.positions = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+            self.doc_len = array("I", [self.doc_len[i] for i in live])
+            self.doc_terms = [self.doc_terms[i] for i in live]
+            self.alive = bytearray([1]) * len(live)
+
+    # ---------- Search ----------
+    def search(self, query: str, top_k: int = 10, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Returns up to `top_k` (doc_id, bm25_score) pairs, best first, optionally only among `allowed` IDs."""
+        with self._lock:
+            terms = set(tokenize(query))
+            if not terms or not self.live_docs:
+                return []
+
+            n_docs = len(self.doc_ids)
+            avg_len = self.total_len / self.live_docs or 1.0
+            doc_len = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+            scores = np.zeros(n_docs, dtype=np.float32)
+
+            for term in terms:
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    continue
+                docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self.postings_tf[term_id], dtype=np.uint16).astype(np.float32)
+                df = self.df[term_id]
+                if not df:
+                    continue
+                idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+                np.add.at(scores, docs, idf * tfs * (self.k1 + 1) / (tfs + norm[docs]))
+
+            scores[np.frombuffer(bytes(self.alive), dtype=np.uint8) == 0] = 0
+            if allowed is not None:
+                keep = np.zeros(n_docs, dtype=bool)
+                keep[[self.positions[doc_id] for doc_id in allowed if doc_id in self.positions]] = True
+                scores[~keep] = 0
+            candidates = np.flatnonzero(scores)
+            if not len(candidates):
+                return []
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [(self.doc_ids[i], float(scores[i])) for i in candidates]
+
+    def term_coverage(self, query: str, doc_id: str) -> float:
+        """Fraction of the query's terms that occur in `doc_id`."""
+        with self._lock:
+            terms = set(tokenize(query))
+            position = self.positions.get(doc_id)
+            if not terms or position is None:
+                return 0.0
+            found = 0
+            for term in terms:
+                term_id = self.vocab.get(term)
+                if term_id is not None and position in np.frombuffer(self.postings_docs[term_id], dtype=np.uint32):
+                    found += 1
+            return found / len(terms)
+
+    # ---------- Persistence ----------
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            terms = sorted(self.vocab, key=self.vocab.get)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(p) for p in self.postings_docs])
+            postings_docs = np.frombuffer(b"".join(p.tobytes() for p in self.postings_docs), dtype=np.uint32)
+            postings_tf = np.frombuffer(b"".join(p.tobytes() for p in self.postings_tf), dtype=np.uint16)
+
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                meta=np.frombuffer(json.dumps({"terms": terms, "doc_ids": self.doc_ids}).encode("utf-8"), dtype=np.uint8),
+                doc_len=np.frombuffer(self.doc_len, dtype=np.uint32),
+                alive=np.frombuffer(bytes(self.alive), dtype=np.uint8),
+                offsets=offsets,
+                postings_docs=postings_docs,
+                postings_tf=postings_tf,
+            )
+            os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                offsets = data["offsets"]
+                postings_docs = data["postings_docs"]
+                postings_tf = data["postings_tf"]
+                doc_len = data["doc_len"]
+                alive = data["alive"]
+        except Exception as e:
+            logger.warning(f"Could not load lexical index {self.path}: {e}")
+            return False
+
+        with self._lock:
+            self._reset()
+            self.doc_ids = meta["doc_ids"]
+            self.doc_len = array("I", doc_len.astype(np.uint32).tobytes())
+            self.alive = bytearray(alive.tobytes())
+            self.positions = {doc_id: i for i, doc_id in enumerate(self.doc_ids) if self.alive[i]}
+            self.vocab = {term: i for i, term in enumerate(meta["terms"])}
+            for i in range(len(meta["terms"])):
+                start, end = offsets[i], offsets[i + 1]
+                self.postings_docs.append(array("I", postings_docs[start:end].tobytes()))
+                self.postings_tf.append(array("H", postings_tf[start:end].tobytes()))
+            self._rebuild_term_counts(offsets, postings_docs.astype(np.int64))
+            self.live_docs = len(self.positions)
+            self.total_len = int(sum(doc_len[i] for i in self.positions.values()))
+        return True
+
+    def _rebuild_term_counts(self, offsets: np.ndarray, postings_docs: np.ndarray):
+        """Derives `df` and `doc_terms` (not persisted) from the loaded postings."""
+        n_terms, n_docs = len(offsets) - 1, len(self.doc_ids)
+        posting_terms = np.repeat(np.arange(n_terms, dtype=np.uint32), np.diff(offsets))
+        live = np.frombuffer(bytes(self.alive), dtype=np.uint8)[postings_docs] == 1
+        self.df = array("I", np.bincount(posting_terms[live], minlength=n_terms).astype(np.uint32).tobytes())
+
+        docs, terms = postings_docs[live], posting_terms[live]
+        order = np.argsort(docs, kind="stable")
+        bounds = np.cumsum(np.bincount(docs, minlength=n_docs))[:-1]
+        self.doc_terms = [array("I", chunk.tobytes()) for chunk in np.split(terms[order], bounds)]
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.live_docs,
+            "tombstones": len(self.doc_ids) - self.live_docs,
+            "terms": len(self.vocab),
+            "postings": sum(len(p) for p in self.postings_docs),
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses several ranked ID lists; each ID scores sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
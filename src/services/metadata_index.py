@@ -0,0 +1,102 @@
+# src/services/metadata_index.py
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Filters = Dict[str, object]
+SCALAR_TYPES = (str, int, float, bool)
+
+
+def filter_error(filters) -> Optional[str]:
+    """Why `filters` cannot be matched, or None: it must map keys to scalars or lists of scalars."""
+    if not isinstance(filters, dict):
+        return "filters must be a JSON object"
+    for key, value in filters.items():
+        values = value if isinstance(value, list) else [value]
+        if not all(isinstance(v, SCALAR_TYPES) for v in values):
+            return f"filter '{key}' must be a string, number, boolean or a list of those"
+    return None
+
+
+class MetadataIndex:
+    """
+    In-memory inverted index from (metadata key, value) to the set of document IDs.
+
+    `match()` intersects the posting sets of a filter — e.g. `{"brand": "acme",
+    "doc_type": ["fdd", "manual"]}` (keys are ANDed, list values are ORed) — so a
+    filtered search knows its candidate IDs before any vector is scored. The cost of
+    a lookup depends on the size of the matching sets, not on how many distinct
+    values (brands, regions, ...) the collection holds.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[Tuple[str, object], Set[str]] = {}
+        self._doc_values: Dict[str, List[Tuple[str, object]]] = {}
+
+    def __len__(self):
+        return len(self._doc_values)
+
+    def add(self, ids: List[str], metadatas: List[Optional[Dict]]):
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in self._doc_values:
+                    self._remove_one(doc_id)
+                pairs = [(key, value) for key, value in (metadata or {}).items()
+                         if isinstance(value, SCALAR_TYPES)]
+                for pair in pairs:
+                    self._postings.setdefault(pair, set()).add(doc_id)
+                self._doc_values[doc_id] = pairs
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._doc_values:
+                    self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str):
+        for pair in self._doc_values.pop(doc_id):
+            posting = self._postings.get(pair)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[pair]
+
+    def match(self, filters: Filters) -> Set[str]:
+        """Returns the IDs whose metadata satisfies every key of `filters`."""
+        with self._lock:
+            per_key = []
+            for key, value in filters.items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                ids: Set[str] = set()
+                for v in values:
+                    ids |= self._postings.get((key, v), set())
+                if not ids:
+                    return set()
+                per_key.append(ids)
+            if not per_key:
+                return set(self._doc_values)
+            # Intersect smallest first so the working set only shrinks
+            per_key.sort(key=len)
+            result = set(per_key[0])
+            for ids in per_key[1:]:
+                result &= ids
+            return result
+
+    @staticmethod
+    def to_where(filters: Filters) -> Optional[Dict]:
+        """Translates `filters` into an equivalent Chroma `where` clause."""
+        clauses = [
+            {key: {"$in": list(value)}} if isinstance(value, (list, tuple, set)) else {key: value}
+            for key, value in filters.items()
+        ]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._doc_values),
+                "values": len(self._postings),
+                "keys": len({key for key, _ in self._postings}),
+            }
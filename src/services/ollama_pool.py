@@ -0,0 +1,433 @@
+# src/services/ollama_pool.py
+import asyncio
+import os
+import threading
+import socket
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set
+
+import httpx
+import ollama
+from dotenv import load_dotenv
+
+from src.services.concurrency import ConcurrencyLimiter, ServiceOverloaded, OLLAMA_MAX_IN_FLIGHT
+from src.services.service_registry import registry
+from src.utils.Logger import logger
+from src.utils.Metrics import metrics
+
+load_dotenv()
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Comma-separated list of Ollama servers to spread generations over; defaults to OLLAMA_HOST alone
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", 300))
+# Circuit breaker: consecutive failures that eject a host, and how long it stays out before a trial call
+OLLAMA_BREAKER_FAILURES = int(os.getenv("OLLAMA_BREAKER_FAILURES", 3))
+OLLAMA_BREAKER_COOLDOWN_SECONDS = float(os.getenv("OLLAMA_BREAKER_COOLDOWN_SECONDS", 30))
+# Further hosts tried after a call fails for a host-side reason (before any output was produced)
+OLLAMA_RETRY_ATTEMPTS = int(os.getenv("OLLAMA_RETRY_ATTEMPTS", 2))
+OLLAMA_MODEL_REFRESH_SECONDS = float(os.getenv("OLLAMA_MODEL_REFRESH_SECONDS", 30))
+# Expected extra latency of a host that would have to load the model into memory first
+OLLAMA_COLD_MODEL_PENALTY_MS = float(os.getenv("OLLAMA_COLD_MODEL_PENALTY_MS", 10000))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def model_tag(name: Optional[str]) -> str:
+    """Ollama lists models with an explicit tag: `llama3` is `llama3:latest`."""
+    name = name or ""
+    return name if ":" in name else f"{name}:latest"
+
+
+class _LoopClient:
+    """
+    An `ollama.AsyncClient` and its httpx transport, bound to the event loop they were
+    created on (httpx connections cannot move between loops), plus the sockets of its connections.
+    """
+
+    def __init__(self, url: str):
+        self.loop = asyncio.get_running_loop()
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=OLLAMA_MAX_IN_FLIGHT * 2, max_keepalive_connections=OLLAMA_MAX_IN_FLIGHT)
+        )
+        self.sockets = set()
+        self.client = ollama.AsyncClient(host=url, timeout=OLLAMA_TIMEOUT_SECONDS, transport=self.transport,
+                                         event_hooks={"response": [self._track]})
+
+    async def _track(self, response: httpx.Response):
+        stream = response.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is not None and sock not in self.sockets:
+            self.sockets = {s for s in self.sockets if s.fileno() != -1}
+            self.sockets.add(sock)
+
+    def close(self):
+        """
+        Releases the pooled connections: through the owning loop while it runs in another
+        thread, otherwise (loop closed, idle, or shutting down in this thread) by shutting the
+        sockets down directly, since a closed loop can no longer close its transports.
+        """
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if self.loop.is_running() and self.loop is not current:
+            asyncio.run_coroutine_threadsafe(self.transport.aclose(), self.loop)
+            return
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already closed by the server or the pool
+        self.sockets = set()
+
+
+class OllamaHost:
+    """One Ollama server: its limiter, latency EWMA, circuit breaker and known models."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.limiter = get_ollama_limiter(url)
+        self._lock = threading.Lock()
+        self._async_client: Optional[_LoopClient] = None
+        self._sync_client = None
+        self._refreshing = None
+
+        self.ewma_ms: Optional[float] = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.available_models: Optional[Set[str]] = None  # None until the first successful refresh
+        self.loaded_models: Set[str] = set()
+        self.models_checked_at = 0.0
+
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def client(self) -> ollama.AsyncClient:
+        """The pooled async client for the running event loop (httpx connections are bound to one loop)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            stale = self._async_client
+            if stale is None or stale.loop is not loop:
+                self._async_client = _LoopClient(self.url)
+            else:
+                stale = None
+            client = self._async_client.client
+        if stale is not None:
+            stale.close()
+        return client
+
+    def close(self):
+        """Closes the pooled async client (registry shutdown)."""
+        with self._lock:
+            stale, self._async_client = self._async_client, None
+        if stale is not None:
+            stale.close()
+
+    def sync_client(self) -> ollama.Client:
+        if self._sync_client is None:
+            self._sync_client = ollama.Client(host=self.url, timeout=OLLAMA_TIMEOUT_SECONDS)
+        return self._sync_client
+
+    # --- circuit breaker -------------------------------------------------------------
+
+    def cooldown_remaining(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + OLLAMA_BREAKER_COOLDOWN_SECONDS - time.monotonic())
+
+    def admit(self) -> bool:
+        """Whether this host may take a call now; after the cooldown one trial call is let through."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= OLLAMA_BREAKER_COOLDOWN_SECONDS:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial_in_flight):
+                return False
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = True
+            self.requests += 1
+            return True
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            ms = seconds * 1000
+            self.ewma_ms = ms if self.ewma_ms is None else 0.8 * self.ewma_ms + 0.2 * ms
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"Ollama host {self.url} recovered")
+            self.state = CLOSED
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= OLLAMA_BREAKER_FAILURES:
+                if self.state != OPEN:
+                    self.ejections += 1
+                    logger.warning(f"Ollama host {self.url} ejected for {OLLAMA_BREAKER_COOLDOWN_SECONDS:.0f}s: {error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without telling anything about the host's health (shed, cancelled, bad request)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    # --- model placement -------------------------------------------------------------
+
+    def has_model(self, model: str) -> Optional[bool]:
+        with self._lock:
+            return None if self.available_models is None else model_tag(model) in self.available_models
+
+    def mark_missing(self, model: str):
+        with self._lock:
+            if self.available_models is not None:
+                self.available_models.discard(model_tag(model))
+            self.loaded_models.discard(model_tag(model))
+
+    def models_stale(self) -> bool:
+        return time.monotonic() - self.models_checked_at >= OLLAMA_MODEL_REFRESH_SECONDS
+
+    def _store_models(self, available, loaded):
+        with self._lock:
+            self.available_models = {model_tag(m.get("model") or m.get("name")) for m in available["models"]}
+            self.loaded_models = {model_tag(m.get("model") or m.get("name")) for m in loaded["models"]}
+
+    def refresh_models_sync(self):
+        self.models_checked_at = time.monotonic()
+        try:
+            client = self.sync_client()
+            self._store_models(client.list(), client.ps())
+        except Exception as e:
+            logger.warning(f"Could not list models on Ollama host {self.url}: {e}")
+
+    async def refresh_models(self):
+        self.models_checked_at = time.monotonic()
+        try:
+            client = self.client()
+            self._store_models(await client.list(), await client.ps())
+        except Exception as e:
+            logger.warning(f"Could not list models on Ollama host {self.url}: {e}")
+
+    def schedule_refresh(self):
+        """Refreshes the model lists in the background when they are stale; never blocks the call."""
+        if self.models_stale() and (self._refreshing is None or self._refreshing.done()):
+            self.models_checked_at = time.monotonic()
+            self._refreshing = asyncio.ensure_future(self.refresh_models())
+
+    def expected_ms(self, model: str) -> float:
+        """Expected latency of one more call: queueing on this host times its recent latency, plus a cold-model penalty."""
+        with self._lock:
+            cold = self.available_models is not None and model_tag(model) not in self.loaded_models
+            latency = self.ewma_ms or 0.0  # hosts without samples yet are tried first
+        return (self.limiter.load() + 1) * latency + (OLLAMA_COLD_MODEL_PENALTY_MS if cold else 0.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+                "load": round(self.limiter.load(), 2),
+                "requests": self.requests,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "ejections": self.ejections,
+                "loaded_models": sorted(self.loaded_models),
+            }
+
+
+class OllamaPool:
+    """
+    Routes chat calls over several Ollama servers.
+
+    Each call goes to the admitted host with the lowest expected latency (EWMA latency
+    scaled by its queue, with a penalty when the model is not loaded there); hosts known
+    not to have the model are only used as a last resort. Connection errors, timeouts and
+    5xx answers count towards the host's circuit breaker, and the call moves to the next
+    host, as long as no output has been streamed yet. Requests shed by a host's limiter
+    also move on, without counting as failures.
+    """
+
+    def __init__(self, urls: List[str] = None):
+        self.hosts = [get_ollama_host(url) for url in (urls or OLLAMA_HOSTS)]
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _ranked(self, model: str, exclude: List[OllamaHost]) -> List[OllamaHost]:
+        candidates = [host for host in self.hosts if host not in exclude]
+        return sorted(candidates, key=lambda host: (host.has_model(model) is False, host.expected_ms(model)))
+
+    def _pick(self, model: str, exclude: List[OllamaHost]) -> Optional[OllamaHost]:
+        for host in self._ranked(model, exclude):
+            if host.admit():
+                return host
+        return None
+
+    def _attempts(self, model: str) -> Iterator[OllamaHost]:
+        tried: List[OllamaHost] = []
+        for attempt in range(OLLAMA_RETRY_ATTEMPTS + 1):
+            host = self._pick(model, tried)
+            if host is None:
+                return
+            if attempt:
+                with self._lock:
+                    self.retries += 1
+            tried.append(host)
+            yield host
+
+    def _failed(self, host: OllamaHost, model: str, error: BaseException) -> bool:
+        """Books a failed attempt on `host`; True when the call may move on to another host."""
+        if isinstance(error, ServiceOverloaded):
+            host.release()
+            return True
+        if isinstance(error, ollama.ResponseError) and error.status_code == 404:
+            host.release()
+            host.mark_missing(model)
+            return True
+        if isinstance(error, (ConnectionError, httpx.TransportError)) or \
+                (isinstance(error, ollama.ResponseError) and (error.status_code >= 500 or error.status_code == -1)):
+            host.record_failure(error)
+            return True
+        host.release()  # the request itself is at fault; another host would refuse it too
+        return False
+
+    def _exhausted(self, last_error: Optional[BaseException]):
+        with self._lock:
+            self.exhausted += 1
+        if last_error is not None:
+            raise last_error
+        raise ServiceOverloaded("No healthy Ollama host is available", self.retry_after())
+
+    async def chat(self, request: Dict):
+        last_error = None
+        for host in self._attempts(request["model"]):
+            host.schedule_refresh()
+            started = time.perf_counter()
+            try:
+                async with host.limiter.slot():
+                    response = await host.client().chat(**request)
+            except Exception as e:
+                last_error = e
+                if self._failed(host, request["model"], e):
+                    continue
+                raise
+            except BaseException:
+                host.release()
+                raise
+            host.record_success(time.perf_counter() - started)
+            return response
+        self._exhausted(last_error)
+
+    async def stream(self, request: Dict) -> AsyncIterator:
+        """Streams chat chunks; a failed host is replaced only while nothing has been yielded yet."""
+        last_error = None
+        for host in self._attempts(request["model"]):
+            host.schedule_refresh()
+            started, streamed = time.perf_counter(), False
+            try:
+                async with host.limiter.slot():
+                    chunks = await host.client().chat(**request, stream=True)
+                    async for chunk in chunks:
+                        streamed = True
+                        yield chunk
+            except Exception as e:
+                last_error = e
+                if self._failed(host, request["model"], e) and not streamed:
+                    continue
+                raise
+            except BaseException:
+                host.release()
+                raise
+            host.record_success(time.perf_counter() - started)
+            return
+        self._exhausted(last_error)
+
+    def chat_sync(self, request: Dict):
+        """Blocking `chat` for worker threads; the per-host limiters only gate the async path."""
+        last_error = None
+        for host in self._attempts(request["model"]):
+            if host.models_stale():
+                host.refresh_models_sync()
+            started = time.perf_counter()
+            try:
+                response = host.sync_client().chat(**request)
+            except Exception as e:
+                last_error = e
+                if self._failed(host, request["model"], e):
+                    continue
+                raise
+            except BaseException:
+                host.release()
+                raise
+            host.record_success(time.perf_counter() - started)
+            return response
+        self._exhausted(last_error)
+
+    def stream_sync(self, request: Dict) -> Iterator:
+        last_error = None
+        for host in self._attempts(request["model"]):
+            if host.models_stale():
+                host.refresh_models_sync()
+            started, streamed = time.perf_counter(), False
+            try:
+                for chunk in host.sync_client().chat(**request, stream=True):
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                last_error = e
+                if self._failed(host, request["model"], e) and not streamed:
+                    continue
+                raise
+            except BaseException:
+                host.release()
+                raise
+            host.record_success(time.perf_counter() - started)
+            return
+        self._exhausted(last_error)
+
+    def capacity(self) -> int:
+        """Concurrent calls the hosts that are not ejected can take without queueing."""
+        return sum(host.limiter.max_in_flight for host in self.hosts if not host.cooldown_remaining()) or 1
+
+    def is_saturated(self) -> bool:
+        """True when no host could take a new call right now."""
+        return all(host.cooldown_remaining() > 0 or host.limiter.is_saturated() for host in self.hosts)
+
+    def retry_after(self) -> int:
+        waits = [host.cooldown_remaining() or host.limiter.retry_after() for host in self.hosts]
+        return max(1, int(min(waits))) if waits else 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"retries": self.retries, "exhausted": self.exhausted}
+        return dict(counters, hosts={host.url: host.stats() for host in self.hosts})
+
+
+def get_ollama_limiter(host: str = OLLAMA_HOST) -> ConcurrencyLimiter:
+    """Process-wide limiter for one Ollama host, shared by every OllamaService."""
+    def build():
+        limiter = ConcurrencyLimiter(f"Ollama at {host}")
+        metrics.register(f"ollama_limiter.{host}", limiter.stats)
+        return limiter
+
+    return registry.get_or_create(("ollama_limiter", host), build)
+
+
+def get_ollama_host(url: str) -> OllamaHost:
+    return registry.get_or_create(("ollama_host", url), lambda: OllamaHost(url), shutdown=lambda host: host.close())
+
+
+def get_ollama_pool() -> OllamaPool:
+    """Process-wide pool over OLLAMA_HOSTS, shared by every OllamaService."""
+    def build():
+        pool = OllamaPool(OLLAMA_HOSTS)
+        metrics.register("ollama_pool", pool.stats)
+        return pool
+
+    return registry.get_or_create(("ollama_pool",), build)
@@ -1,18 +1,47 @@
 # ollama_service.py
 import os
-import ollama
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
 #import google.generativeai as genai
 from dotenv import load_dotenv
 
+from src.services.context_assembler import count_tokens
+from src.services.ollama_pool import get_ollama_pool
+from src.services.service_registry import registry
+from src.services.single_flight import SingleFlight, request_key
+from src.utils.Metrics import Histogram, metrics
+from src.utils.Tracing import record_coalesced_llm_call, record_llm_call
+
 load_dotenv()
 
 MODEL_NAME = os.getenv("MODEL_NAME")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Async calls share pooled keep-alive connections and go through the per-host concurrency limiter
+OLLAMA_ASYNC_CLIENT = os.getenv("OLLAMA_ASYNC_CLIENT", "true").lower() == "true"
+# How long the server keeps the model (and its KV cache) loaded after a call. Every call sends
+# the same value and options: a reload or a different num_ctx would throw the cached prefix away.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", 0))  # 0 keeps the model's default context size
+OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", 0.7))
+OLLAMA_TOP_K = int(os.getenv("OLLAMA_TOP_K", 40))
+OLLAMA_TOP_P = float(os.getenv("OLLAMA_TOP_P", 0.9))
+OLLAMA_REPEAT_PENALTY = float(os.getenv("OLLAMA_REPEAT_PENALTY", 1.1))
+# Identical chat requests in flight at the same time share one generation
+OLLAMA_SINGLE_FLIGHT = os.getenv("OLLAMA_SINGLE_FLIGHT", "true").lower() == "true"
+# Chat-template overhead per message, added to the content estimate when counting prompt tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Prompt = Union[str, List[Dict]]
 
 class OllamaService:
 
     def __init__(self, model: str = MODEL_NAME, gemini_api_key: str = GEMINI_API_KEY):
         self.model = model
+        # Calls are routed over the OLLAMA_HOSTS servers (a single one by default)
+        self.pool = get_ollama_pool()
+        self.prompt_eval = get_prompt_eval_stats()
+        self.single_flight = get_single_flight()
 
         # Configure Gemini if API key is provided
         if gemini_api_key:
@@ -22,10 +51,11 @@ class OllamaService:
         else:
             self.gemini_model = None
 
-    def generate_answer(self, prompt: str, provider: str = "ollama", system_instruction: str = None) -> str:
+    def generate_answer(self, prompt: Prompt, provider: str = "ollama", system_instruction: str = None) -> str:
         """
         Unified entry point to generate answers.
         provider = "ollama" | "gemini"
+        `prompt` is a single user message or a list of chat messages (`role`/`content`).
         Returns response["message"]["content"] format.
         """
         if provider == "gemini":
@@ -33,14 +63,103 @@ class OllamaService:
         else:
             return self._generate_with_ollama(prompt)["message"]["content"]
 
-    import ollama
-
-    def _generate_with_ollama(self, prompt: str, temperature: float = 0.7, top_k: int = 40, top_p: float = 0.9,
-                              repeat_penalty: float = 1.1, num_predict: int = 128) -> dict:
+    def _generate_with_ollama(self, prompt: Prompt, **options) -> dict:
         """
-        Calls Ollama API with configurable generation parameters.
+        Calls Ollama API; `options` override the configured generation parameters.
         Returns a dictionary in Ollama's format.
         """
+        request = self._chat_request(to_messages(prompt), options)
+        if OLLAMA_SINGLE_FLIGHT:
+            leader = _Leader(lambda: self._chat(request))
+            content, call = self.single_flight.run_sync(request_key(request), leader)
+            if not leader.led:
+                record_coalesced_llm_call(call)
+        else:
+            content, call = self._chat(request)
+        return {"message": {"content": content}}
+
+    def _chat(self, request: dict) -> Tuple[str, Dict]:
+        response = self.pool.chat_sync(request)
+        self.prompt_eval.observe(request["messages"], response)
+        return response["message"]["content"], record_llm_call(self.model, response)
+
+    def stream_answer(self, prompt: Prompt, **options) -> Iterator[str]:
+        """
+        Streams an Ollama answer, yielding the text pieces as they are generated.
+        Closing the generator early closes the underlying HTTP stream.
+        """
+        messages = to_messages(prompt)
+        stream = self.pool.stream_sync(self._chat_request(messages, options))
+        for chunk in stream:
+            content = chunk["message"]["content"]
+            if content:
+                yield content
+            if chunk.get("done"):
+                self.prompt_eval.observe(messages, chunk)
+                record_llm_call(self.model, chunk)
+
+    async def agenerate_answer(self, prompt: Prompt, **options) -> str:
+        """
+        Async `generate_answer` for Ollama. Waits for a limiter slot on the chosen host first
+        and raises `ServiceOverloaded` when no host can take the call.
+        """
+        request = self._chat_request(to_messages(prompt), options)
+        if not OLLAMA_SINGLE_FLIGHT:
+            return (await self._achat(request))[0]
+        leader = _Leader(lambda: self._achat(request))
+        content, call = await self.single_flight.run(request_key(request), leader)
+        if not leader.led:
+            record_coalesced_llm_call(call)
+        return content
+
+    async def _achat(self, request: dict) -> Tuple[str, Dict]:
+        response = await self.pool.chat(request)
+        self.prompt_eval.observe(request["messages"], response)
+        return response["message"]["content"], record_llm_call(self.model, response)
+
+    async def astream_answer(self, prompt: Prompt, **options) -> AsyncIterator[str]:
+        """
+        Async `stream_answer`; the limiter slot is held until the stream ends or is closed.
+        Concurrent identical requests subscribe to one shared stream.
+        """
+        request = self._chat_request(to_messages(prompt), options)
+        leader = _Leader(lambda: self._astream(request))
+        stream = self.single_flight.stream(request_key(request), leader) if OLLAMA_SINGLE_FLIGHT else leader()
+        try:
+            async for item in stream:
+                if isinstance(item, dict):
+                    if not leader.led:
+                        record_coalesced_llm_call(item)
+                    continue
+                yield item
+        finally:
+            await stream.aclose()
+
+    async def _astream(self, request: dict) -> AsyncIterator[Union[str, Dict]]:
+        """Yields the text pieces, then the recorded LLM call so coalesced subscribers can book it too."""
+        async for chunk in self.pool.stream(request):
+            content = chunk["message"]["content"]
+            if content:
+                yield content
+            if chunk.get("done"):
+                self.prompt_eval.observe(request["messages"], chunk)
+                yield record_llm_call(self.model, chunk)
+
+    def _chat_request(self, messages: List[Dict], overrides: Optional[Dict] = None) -> dict:
+        """
+        Every chat call is built here so that model, options and keep_alive are identical
+        across requests, which lets the server reuse the KV cache of a shared prompt prefix.
+        """
+        return {
+            "model": self.model,
+            "messages": messages,
+            "options": self._options(**(overrides or {})),
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+        }
+
+    @staticmethod
+    def _options(temperature: float = OLLAMA_TEMPERATURE, top_k: int = OLLAMA_TOP_K, top_p: float = OLLAMA_TOP_P,
+                 repeat_penalty: float = OLLAMA_REPEAT_PENALTY) -> dict:
         options = {
             'temperature': temperature,
             #'num_predict': num_predict,
@@ -48,15 +167,11 @@ class OllamaService:
             'top_p': top_p,
             'repeat_penalty': repeat_penalty,
         }
+        if OLLAMA_NUM_CTX:
+            options['num_ctx'] = OLLAMA_NUM_CTX
+        return options
 
-        response = ollama.chat(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            options=options,
-        )
-        return {"message": {"content": response["message"]["content"]}}
-
-    def _generate_with_gemini(self, prompt: str, system_instruction: str = None) -> dict:
+    def _generate_with_gemini(self, prompt: Prompt, system_instruction: str = None) -> dict:
         """
         Calls Gemini API.
         Returns dict wrapped in Ollama-like format.
@@ -75,3 +190,101 @@ class OllamaService:
             response = self.gemini_model.generate_content(prompt)
 
         return {"message": {"content": response.text}}
+
+
+def to_messages(prompt: Prompt) -> List[Dict]:
+    """A plain prompt string becomes one user message; a message list is passed through."""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return list(prompt)
+
+
+class _Leader:
+    """Single-flight factory that remembers whether it ran, i.e. whether this caller led the shared call."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.led = False
+
+    def __call__(self):
+        self.led = True
+        return self.factory()
+
+
+class PromptEvalStats:
+    """
+    Prefill accounting from the counters Ollama returns with every finished chat.
+
+    Ollama only evaluates the prompt tokens that are not already in the KV cache, and
+    reports them as `prompt_eval_count`. The difference from the (estimated) size of the
+    prompt that was sent is the reused prefix; multiplied by the observed per-token
+    prefill time it gives the prefill time saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.evaluated_tokens = 0
+        self.reused_tokens = 0
+        self.saved_ms = 0.0
+        self._ms_per_token: Optional[float] = None
+        self.prompt_eval_ms = Histogram()
+        self.load_ms = Histogram()
+
+    def observe(self, messages: List[Dict], response) -> Optional[Dict]:
+        evaluated = response.get("prompt_eval_count")
+        if evaluated is None:  # not reported (e.g. the whole prompt came from cache on older servers)
+            evaluated = 0
+        eval_ms = (response.get("prompt_eval_duration") or 0) / 1e6
+        load_ms = (response.get("load_duration") or 0) / 1e6
+        sent = sum(count_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+        reused = max(0, sent - evaluated)
+
+        with self._lock:
+            if evaluated and eval_ms:
+                rate = eval_ms / evaluated
+                self._ms_per_token = rate if self._ms_per_token is None else 0.9 * self._ms_per_token + 0.1 * rate
+            saved_ms = reused * (self._ms_per_token or 0.0)
+            self.calls += 1
+            self.prompt_tokens += sent
+            self.evaluated_tokens += evaluated
+            self.reused_tokens += reused
+            self.saved_ms += saved_ms
+        self.prompt_eval_ms.observe(eval_ms)
+        self.load_ms.observe(load_ms)
+        return {"prompt_tokens": sent, "evaluated_tokens": evaluated, "reused_tokens": reused, "saved_ms": saved_ms}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "prompt_tokens_estimated": self.prompt_tokens,
+                "evaluated_tokens": self.evaluated_tokens,
+                "reused_tokens_estimated": self.reused_tokens,
+                "reuse_ratio": round(self.reused_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None,
+                "prefill_ms_per_token": round(self._ms_per_token, 4) if self._ms_per_token is not None else None,
+                "prefill_saved_ms": round(self.saved_ms, 1),
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+            }
+        return dict(counters, prompt_eval_ms=self.prompt_eval_ms.snapshot(), load_ms=self.load_ms.snapshot())
+
+
+def get_prompt_eval_stats() -> PromptEvalStats:
+    """Process-wide prefill counters, shared by every OllamaService."""
+    def build():
+        stats = PromptEvalStats()
+        metrics.register("ollama_prompt_eval", stats.stats)
+        return stats
+
+    return registry.get_or_create(("ollama_prompt_eval",), build)
+
+
+def get_single_flight() -> SingleFlight:
+    """Process-wide request coalescing for Ollama calls, shared by every OllamaService."""
+    def build():
+        single_flight = SingleFlight()
+        metrics.register("ollama_single_flight", single_flight.stats)
+        return single_flight
+
+    return registry.get_or_create(("ollama_single_flight",), build)
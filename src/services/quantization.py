@@ -0,0 +1,281 @@
+# src/services/quantization.py
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+QUANTIZED_PQ_M = int(os.getenv("QUANTIZED_PQ_M", 48))
+QUANTIZED_TRAIN_SAMPLE = int(os.getenv("QUANTIZED_TRAIN_SAMPLE", 20000))
+_BLOCK_ROWS = 65536  # rows decoded per step, bounds temporary memory during scans
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (data ** 2).sum(1)[:, None] - 2 * data @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        assignment = distances.argmin(1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        counts = np.bincount(assignment, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids.astype(np.float32)
+
+
+class ScalarQuantizer:
+    """Per-dimension affine int8 codes: 1 byte per dimension (4x smaller than float32)."""
+
+    def train(self, vectors: np.ndarray):
+        self.low = vectors.min(0).astype(np.float32)
+        self.scale = np.maximum((vectors.max(0) - self.low) / 255.0, 1e-12).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.low) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128) * self.scale + self.low
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        # ||x||^2 - 2 q.x + ||q||^2 with q.x expanded over the affine code, without materializing x
+        q_scaled = query * self.scale
+        offset = float(query @ self.low) + 128 * float(q_scaled.sum())
+        dots = codes.astype(np.float32) @ q_scaled + offset
+        return norms - 2 * dots + float(query @ query)
+
+
+class ProductQuantizer:
+    """`m` sub-vector codebooks of up to 256 centroids: `m` bytes per vector."""
+
+    def __init__(self, m: int = QUANTIZED_PQ_M):
+        self.m = m
+
+    def train(self, vectors: np.ndarray):
+        dim = vectors.shape[1]
+        if dim % self.m:
+            self.m = next(d for d in range(min(self.m, dim), 0, -1) if dim % d == 0)
+        self.sub_dim = dim // self.m
+        self.codebooks = np.stack([
+            self._pad(_kmeans(vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim], 256, seed=j))
+            for j in range(self.m)
+        ])
+
+    @staticmethod
+    def _pad(centroids: np.ndarray) -> np.ndarray:
+        # Keep a fixed 256-row codebook even when trained on fewer points
+        if len(centroids) < 256:
+            centroids = np.vstack([centroids, np.repeat(centroids[-1:], 256 - len(centroids), axis=0)])
+        return centroids
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            book = self.codebooks[j]
+            distances = (sub ** 2).sum(1)[:, None] - 2 * sub @ book.T + (book ** 2).sum(1)[None, :]
+            codes[:, j] = distances.argmin(1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.hstack([self.codebooks[j][codes[:, j]] for j in range(self.m)])
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, norms: np.ndarray = None) -> np.ndarray:
+        # Asymmetric distance: one (m x 256) lookup table per query, summed over the codes
+        sub_queries = query.reshape(self.m, 1, self.sub_dim)
+        table = ((self.codebooks - sub_queries) ** 2).sum(2)
+        return table[np.arange(self.m), codes.astype(np.int64)].sum(1)
+
+
+class QuantizedVectorIndex:
+    """
+    In-memory vector index that keeps only quantized codes ("int8" or "pq").
+
+    Search scans the codes for approximate squared-L2 distances; callers that can
+    fetch full-precision vectors rescore the best candidates (`search(..., rescore=...)`).
+    Rows are stored in growable arrays; deleting swaps the last row into the hole.
+    """
+
+    def __init__(self, mode: str = "int8", pq_m: int = QUANTIZED_PQ_M):
+        if mode not in ("int8", "pq"):
+            raise ValueError(f"Unknown quantization mode '{mode}'")
+        self.mode = mode
+        self.quantizer = ScalarQuantizer() if mode == "int8" else ProductQuantizer(pq_m)
+        self.trained_on = 0
+        self.dim = None
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._codes: Optional[np.ndarray] = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.trained_on > 0
+
+    def needs_retrain(self) -> bool:
+        """True once the index holds several times the data its codebooks were trained on."""
+        return self.is_trained and self.trained_on < QUANTIZED_TRAIN_SAMPLE and len(self) >= 4 * self.trained_on
+
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > QUANTIZED_TRAIN_SAMPLE:
+            vectors = vectors[np.random.default_rng(0).choice(len(vectors), QUANTIZED_TRAIN_SAMPLE, replace=False)]
+        with self._lock:
+            self.quantizer.train(vectors)
+            self.trained_on = len(vectors)
+            self.dim = vectors.shape[1]
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if not self.is_trained:
+                self.train(vectors)
+            self.remove([doc_id for doc_id in ids if doc_id in self.positions])
+
+            codes = self.quantizer.encode(vectors)
+            norms = (self.quantizer.decode(codes) ** 2).sum(1).astype(np.float32)
+            start = len(self.ids)
+            self._reserve(start + len(ids), codes.shape[1], codes.dtype)
+            self._codes[start:start + len(ids)] = codes
+            self._norms[start:start + len(ids)] = norms
+            for offset, doc_id in enumerate(ids):
+                self.positions[doc_id] = start + offset
+            self.ids.extend(ids)
+
+    def _reserve(self, rows: int, width: int, dtype):
+        if self._codes is None:
+            self._codes = np.zeros((max(rows, 1024), width), dtype=dtype)
+            self._norms = np.zeros(len(self._codes), dtype=np.float32)
+        elif rows > len(self._codes):
+            capacity = max(rows, 2 * len(self._codes))
+            self._codes = np.resize(self._codes, (capacity, width))
+            self._norms = np.resize(self._norms, capacity)
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                position = self.positions.pop(doc_id, None)
+                if position is None:
+                    continue
+                last = len(self.ids) - 1
+                if position != last:
+                    moved = self.ids[last]
+                    self._codes[position] = self._codes[last]
+                    self._norms[position] = self._norms[last]
+                    self.ids[position] = moved
+                    self.positions[moved] = position
+                self.ids.pop()
+
+    def search(self, query: np.ndarray, top_k: int = 10, candidates: Optional[int] = None,
+               rescore: Optional[Callable[[List[str]], Dict[str, np.ndarray]]] = None,
+               allowed: Optional[set] = None) -> List[Tuple[str, float]]:
+        """
+        Returns (id, squared_l2) pairs, nearest first. With `rescore`, the best `candidates`
+        approximate hits are re-ranked with the full-precision vectors it returns.
+        `allowed` restricts the scan to a set of IDs.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return []
+            if allowed is not None:
+                rows = np.fromiter((self.positions[i] for i in allowed if i in self.positions), dtype=np.int64)
+                if not len(rows):
+                    return []
+                distances = self.quantizer.distances(query, self._codes[rows], self._norms[rows])
+            else:
+                rows = None
+                distances = np.concatenate([
+                    self.quantizer.distances(query, self._codes[s:min(s + _BLOCK_ROWS, n)], self._norms[s:min(s + _BLOCK_ROWS, n)])
+                    for s in range(0, n, _BLOCK_ROWS)
+                ])
+
+            k = min(len(distances), candidates or top_k)
+            best = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+            best = best[np.argsort(distances[best])]
+            hits = [(self.ids[rows[i] if rows is not None else i], float(distances[i])) for i in best]
+
+        if rescore is None:
+            return hits[:top_k]
+        exact = rescore([doc_id for doc_id, _ in hits])
+        rescored = [
+            (doc_id, float(((exact[doc_id] - query) ** 2).sum())) if doc_id in exact else (doc_id, approx)
+            for doc_id, approx in hits
+        ]
+        return sorted(rescored, key=lambda hit: hit[1])[:top_k]
+
+    def memory_bytes(self) -> int:
+        used = len(self.ids)
+        code_bytes = self._codes[:used].nbytes if self._codes is not None else 0
+        return code_bytes + self._norms[:used].nbytes
+
+    def stats(self) -> dict:
+        used = len(self.ids)
+        per_vector = self.memory_bytes() / used if used else None
+        return {
+            "mode": self.mode,
+            "vectors": used,
+            "trained_on": self.trained_on,
+            "memory_bytes": self.memory_bytes(),
+            "bytes_per_vector": per_vector,
+            "float32_bytes_per_vector": self.dim * 4 if self.dim else None,
+        }
+
+
+def evaluate_quantization(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                          modes=("int8", "pq"), rescore_factor: int = 4) -> Dict[str, Dict]:
+    """
+    Reports recall@k against exact search and bytes per vector for each quantization mode,
+    with and without full-precision rescoring of `rescore_factor * top_k` candidates.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    ids = [str(i) for i in range(len(vectors))]
+    exact_distances = (vectors ** 2).sum(1)[None, :] - 2 * queries @ vectors.T
+    exact = np.argsort(exact_distances, axis=1)[:, :top_k]
+
+    report = {"float32": {"bytes_per_vector": vectors.shape[1] * 4, "recall": 1.0}}
+    for mode in modes:
+        index = QuantizedVectorIndex(mode)
+        index.add(ids, vectors)
+        lookup = lambda hit_ids: {i: vectors[int(i)] for i in hit_ids}
+        recall, recall_rescored = [], []
+        for query, truth in zip(queries, exact):
+            truth = {str(i) for i in truth}
+            approx = {i for i, _ in index.search(query, top_k)}
+            rescored = {i for i, _ in index.search(query, top_k, candidates=top_k * rescore_factor, rescore=lookup)}
+            recall.append(len(approx & truth) / len(truth))
+            recall_rescored.append(len(rescored & truth) / len(truth))
+        report[mode] = {
+            "bytes_per_vector": index.memory_bytes() / len(vectors),
+            "compression": round(vectors.shape[1] * 4 / (index.memory_bytes() / len(vectors)), 1),
+            "recall": round(float(np.mean(recall)), 4),
+            "recall_rescored": round(float(np.mean(recall_rescored)), 4),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # Recall/memory report for the current collection: python -m src.services.quantization
+    import json
+    from src.services.vector_store_service import get_vector_store_service
+
+    store = get_vector_store_service()
+    embeddings = [e for page in store.iter_collection(include=["embeddings"]) for e in page["embeddings"]]
+    if not embeddings:
+        print("⚠️ Collection is empty")
+    else:
+        data = np.asarray(embeddings, dtype=np.float32)
+        sample = data[np.random.default_rng(0).choice(len(data), min(100, len(data)), replace=False)]
+        print(json.dumps(evaluate_quantization(data, sample + 0.01 * np.random.default_rng(1).standard_normal(sample.shape)), indent=2))
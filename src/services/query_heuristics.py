@@ -0,0 +1,41 @@
+# src/services/query_heuristics.py
+import os
+import re
+
+from dotenv import load_dotenv
+
+from src.services.lexical_index import tokenize
+
+load_dotenv()
+SELF_CONTAINED_MIN_TERMS = int(os.getenv("SELF_CONTAINED_MIN_TERMS", 3))
+NEAR_IDENTICAL_JACCARD = float(os.getenv("NEAR_IDENTICAL_JACCARD", 0.8))
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Words that point back into the conversation instead of naming what they refer to
+_REFERRING = frozenset("""
+it its it's itself this that these those they them their theirs he him his she her hers there here
+above previous former latter same such one ones also too else another other
+""".split())
+_FOLLOW_UP_OPENERS = ("and ", "but ", "so ", "or ", "then ", "also ", "what about", "how about", "why not", "what if")
+
+
+def is_self_contained(query: str) -> bool:
+    """
+    Cheap test for follow-ups that need no rephrasing: no back-references ("it", "that
+    one", "what about ..."), and at least SELF_CONTAINED_MIN_TERMS content terms.
+    Errs on the side of False, which only costs the usual rephrase call.
+    """
+    lowered = (query or "").lower().strip()
+    if lowered.startswith(_FOLLOW_UP_OPENERS):
+        return False
+    if any(word in _REFERRING for word in _WORD.findall(lowered)):
+        return False
+    return len(set(tokenize(lowered))) >= SELF_CONTAINED_MIN_TERMS
+
+
+def near_identical(a: str, b: str, threshold: float = NEAR_IDENTICAL_JACCARD) -> bool:
+    """True when two queries share (almost) the same content terms, so they retrieve the same documents."""
+    terms_a, terms_b = set(tokenize(a or "")), set(tokenize(b or ""))
+    if not terms_a or not terms_b:
+        return (a or "").strip().lower() == (b or "").strip().lower()
+    return len(terms_a & terms_b) / len(terms_a | terms_b) >= threshold
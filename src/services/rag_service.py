@@ -1,197 +1,478 @@
 # src/services/rag_service.py
+import asyncio
 import os
-from typing import List, Optional, Dict
+import time
+from collections import Counter
+from typing import AsyncIterator, List, Optional, Dict
 from fastapi import UploadFile
 from dotenv import load_dotenv
-from src.services.ollama_service import OllamaService
-from src.services.vector_store_service import VectorStoreService
+from src.services.answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from src.services.executors import get_embedding_executor, get_llm_executor
+from src.services.history_manager import HistoryManager, format_transcript
+from src.services.context_assembler import ContextAssembler, split_passages, query_overlap
+from src.services.concurrency import ServiceOverloaded
+from src.services.ollama_service import OllamaService, OLLAMA_ASYNC_CLIENT, Prompt
+from src.services.query_heuristics import is_self_contained, near_identical
+from src.services.service_registry import registry
+from src.services.topic_gate import TopicGate
+from src.services.vector_store_service import get_vector_store_service
+from src.utils.Logger import logger
+from src.utils.Metrics import metrics
+from src.utils.Tracing import span
 
 load_dotenv()
 MODEL_NAME = os.getenv("MODEL_NAME")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Search with the raw follow-up while it is being rephrased; keep the results if the rephrase barely changes it
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+# Skip the rephrase LLM call for follow-ups that already read as standalone questions
+SKIP_SELF_CONTAINED_REPHRASE = os.getenv("SKIP_SELF_CONTAINED_REPHRASE", "true").lower() == "true"
+# Concurrent generations of one batch request; 0 uses the capacity of the Ollama pool
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 0))
+CONSULTANT_PERSONA = """You are a helpful assistant. You will assume the persona of a Franchise Consultant from "Franchise Middle East." Your role is to provide expert guidance to clients on all matters related to franchises, franchising, and business consulting. Your responses must be professional, concise, and formatted clearly using standard web-friendly Markdown to guide the client.
+
+Please use the following Markdown elements:
+- Use **bold** for key terms and titles.
+- Use `##` for main section headings.
+- Use `*` or `-` for bulleted lists.
+- Use `1.` `2.` `3.` for numbered lists.
+- Use `---` for a horizontal line to separate major sections."""
+REPHRASE_INSTRUCTIONS = "Given the following conversation and a follow-up question, rephrase the follow-up question to be a standalone question. This standalone question can then be used to perform a relevant search."
+SUMMARY_INSTRUCTIONS = "You maintain a running summary of a conversation between a client and a franchise consultant. Merge the new turns into the summary. Keep names, brands, locations, figures and open questions; drop pleasantries. Reply with the updated summary only, in at most a few short sentences."
+OUT_OF_SCOPE_ANSWER = "Sorry, as a Franchise Consultant, your question is not within my scope."
 ALLOWED_KEYWORDS = ["franchise", "franchising", "royalty", "franchise fee", "brand expansion", "territory", "franchise agreement"]
 
 
 class RAGService:
     def __init__(self):
-        self.vector_store = VectorStoreService()
+        self.vector_store = get_vector_store_service()
         self.ollama = OllamaService()
+        self.context_assembler = ContextAssembler(self.ollama.model)
+        # Blocking stages run on bounded pools so a slow generation never stalls the event loop
+        self.embedding_executor = get_embedding_executor()
+        self.llm_executor = get_llm_executor()
+
+        # Answers are cached per standalone query and dropped whenever the collection changes
+        self.answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+        if self.answer_cache:
+            self.vector_store.add_change_listener(self.answer_cache.invalidate)
+            metrics.register("answer_cache", self.answer_cache.stats)
+
+        # Long conversations: recent turns verbatim, older ones as a background-built summary
+        self.history_manager = HistoryManager(self._summarize_history)
+        metrics.register("chat_history", self.history_manager.stats)
+
+        self.batch_stats = {"batches": 0, "queries": 0, "duplicates": 0, "out_of_scope": 0, "cache_hits": 0,
+                            "shared_passages": 0, "errors": 0}
+        metrics.register("answer_batch", lambda: dict(self.batch_stats))
+
+        self.rephrase_stats = {"llm": 0, "skipped_self_contained": 0, "speculative_hits": 0, "speculative_misses": 0}
+        metrics.register("query_rephrase", lambda: dict(self.rephrase_stats))
+
+        # Off-domain questions get OUT_OF_SCOPE_ANSWER before any LLM call or retrieval
+        self.topic_gate = TopicGate(self.vector_store.embed_queries, ALLOWED_KEYWORDS)
+        metrics.register("topic_gate", self.topic_gate.stats)
 
     def update_base_vectors(self, docs: List[str]):
         added_count = self.vector_store.add_to_vectorstore(docs)
         return {"added_docs": added_count}
 
-    async def _rephrase_query(self, query: str, chat_history: List[Dict]) -> str:
+    async def _rephrase_query(self, query: str, chat_history: List[Dict], summary: Optional[str] = None) -> str:
         """Uses the LLM to rephrase a follow-up question into a standalone query."""
         try:
-            if not chat_history:
+            if not chat_history and not summary:
                 return query
 
-            history_prompt = ""
-            for msg in chat_history:
-                history_prompt += f"{msg['sender'].capitalize()}: {msg['content']}\n"
-
-            rephrase_prompt = f"""Given the following conversation and a follow-up question, rephrase the follow-up question to be a standalone question. This standalone question can then be used to perform a relevant search.
-    
-    Conversation History:
-    {history_prompt}
-    
-    Follow-up Question: {query}
-    
-    Standalone Question:"""
+            history_prompt = format_transcript(chat_history)
+            if summary:
+                history_prompt = f"(Summary of the earlier conversation: {summary})\n{history_prompt}"
 
-            rephrased_query = self.ollama.generate_answer(rephrase_prompt)
+            with span("rephrase"):
+                rephrased_query = await self._generate([
+                    {"role": "system", "content": REPHRASE_INSTRUCTIONS},
+                    {"role": "user", "content": f"Conversation History:\n{history_prompt}\nFollow-up Question: {query}\n\nStandalone Question:"},
+                ])
             # ADD THIS PRINT STATEMENT
             print(f"DEBUG: Rephrased Query is: '{rephrased_query.strip()}'")
             return rephrased_query.strip()
 
+        except ServiceOverloaded:
+            raise
         except Exception as e:
-            # A more detailed error response can be helpful for debugging
-            return {"error": str(e)}, 500
+            # Fall back to the original wording rather than searching with an error value
+            logger.error(f"Query rephrase failed, using the original query: {e}")
+            return query
 
-    async def answer_with_user_docs(
+    async def _in_scope(self, query: str, chat_history: Optional[List[Dict]]) -> bool:
+        """
+        Runs the topic gate on the question; a follow-up is scored together with the previous
+        user message, since "and in Riyadh?" only makes sense in its conversation.
+        """
+        text = query
+        previous = next((msg.get("content", "") for msg in reversed(chat_history or []) if msg.get("sender", "user") == "user"), "")
+        if previous:
+            text = f"{previous}\n{query}"
+        with span("topic_gate") as attrs:
+            decision = (await self.embedding_executor.run(self.topic_gate.check, [text]))[0]
+            attrs.update(score=decision["score"], in_scope=decision["in_scope"])
+        return decision["in_scope"]
+
+    async def _summarize_history(self, summary: Optional[str], turns: List[Dict]) -> str:
+        """Folds `turns` into the running conversation summary (runs in the background)."""
+        content = f"Conversation:\n{format_transcript(turns)}"
+        if summary:
+            content = f"Summary so far:\n{summary}\n\nNew turns:\n{format_transcript(turns)}"
+        with span("history_summary", turns=len(turns)):
+            return await self._generate([
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": content},
+            ])
+
+    async def _generate(self, prompt: Prompt) -> str:
+        if OLLAMA_ASYNC_CLIENT:
+            return await self.ollama.agenerate_answer(prompt)
+        return await self.llm_executor.run(self.ollama.generate_answer, prompt)
+
+    def _stream(self, prompt: Prompt) -> AsyncIterator[str]:
+        if OLLAMA_ASYNC_CLIENT:
+            return self.ollama.astream_answer(prompt)
+        return self.llm_executor.iterate(self.ollama.stream_answer, prompt)
+
+    async def _retrieve(self, query: str, top_k: int, filters: Optional[Dict]) -> List[Dict]:
+        search = self.vector_store.hybrid_search if HYBRID_SEARCH else self.vector_store.search_vectors
+        return await self.embedding_executor.run(search, query, top_k=top_k, filters=filters)
+
+    async def _prepare_answer(
             self,
             query: str,
             user_docs: Optional[List[UploadFile]] = None,
-            save: bool = True,
             top_k: int = 3,
-            chat_history: Optional[List[Dict]] = None
-    ) -> str:
+            chat_history: Optional[List[Dict]] = None,
+            filters: Optional[Dict] = None,
+            conversation_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Runs every stage before generation: checks the topic, reads uploaded docs, rephrases,
+        checks the answer cache, retrieves and assembles the prompt. On a cache hit
+        `cached_answer` is set; `messages` stays None when the question is off-topic
+        (`out_of_scope`) or nothing relevant was found.
+        """
+        started = time.perf_counter()
+        prepared = {
+            "started": started,
+            "standalone_query": query,
+            "extra_docs": [],
+            "retrieved_docs": [],
+            "messages": None,
+            "cached_answer": None,
+            "cache_key": None,
+            "timings": {},
+            "out_of_scope": False,
+        }
+        # Uploaded documents define their own scope, so only bare questions are gated
+        if self.topic_gate.enabled and query and not user_docs and not await self._in_scope(query, chat_history):
+            prepared["out_of_scope"] = True
+            return prepared
+
         extra_docs_content: List[str] = []
         if user_docs:
-            for doc in user_docs:
-                content_bytes = await doc.read()
-                content_str = content_bytes.decode("utf-8", errors="ignore")
-                extra_docs_content.append(content_str)
+            with span("read_user_docs", count=len(user_docs)):
+                for doc in user_docs:
+                    content_bytes = await doc.read()
+                    content_str = content_bytes.decode("utf-8", errors="ignore")
+                    extra_docs_content.append(content_str)
 
-        # Step 1: Rephrase the query to a standalone question using the chat history
-        standalone_query = await self._rephrase_query(query, chat_history)
+        # Both prompts see the same bounded history: a cached summary plus the newest turns
+        history = self.history_manager.compact(chat_history, conversation_id)
+        summary = history["summary"]
 
-        # Step 2: Perform the vector search using the rephrased query
-        retrieved_docs = self.vector_store.search_vectors(standalone_query, top_k=top_k)
-        context_parts = [doc["text"] for doc in retrieved_docs]
+        # Step 1: Rephrase the query to a standalone question using the chat history,
+        # unless the follow-up already stands on its own. While the LLM rephrases,
+        # retrieval with the raw query runs speculatively.
+        speculative = None
+        if chat_history and SKIP_SELF_CONTAINED_REPHRASE and is_self_contained(query):
+            self.rephrase_stats["skipped_self_contained"] += 1
+            standalone_query = query
+        else:
+            if chat_history:
+                self.rephrase_stats["llm"] += 1
+                if SPECULATIVE_RETRIEVAL:
+                    speculative = asyncio.ensure_future(self._retrieve(query, top_k, filters))
+            try:
+                standalone_query = await self._rephrase_query(query, history["turns"], summary)
+            except BaseException:
+                _discard(speculative)
+                raise
+        timings = prepared["timings"]
+        timings["rephrase_ms"] = (time.perf_counter() - started) * 1000
+        prepared["standalone_query"] = standalone_query
+        prepared["extra_docs"] = extra_docs_content
 
-        if extra_docs_content:
-            context_parts.extend(extra_docs_content)
+        # Requests carrying their own documents or metadata filters bypass the answer cache
+        use_cache = self.answer_cache is not None and not extra_docs_content and not filters
+        if use_cache:
+            with span("answer_cache") as attrs:
+                cache_version = self.answer_cache.version
+                query_embedding = (await self.embedding_executor.run(self.vector_store.embed_queries, [standalone_query]))[0]
+                prepared["cache_key"] = (query_embedding, cache_version)
+                cached_answer = self.answer_cache.lookup(query_embedding)
+                attrs["hit"] = cached_answer is not None
+            if cached_answer is not None:
+                logger.info(f"Answer cache hit for standalone query: '{standalone_query}'")
+                _discard(speculative)
+                prepared["cached_answer"] = cached_answer
+                return prepared
 
-        context_text = "\n\n".join(context_parts)
+        # Step 2: Retrieve with the rephrased query (BM25 + dense fused, or dense only),
+        # reusing the speculative results when the rephrase kept the query's terms
+        retrieval_started = time.perf_counter()
+        with span("retrieval") as attrs:
+            if speculative is not None and near_identical(query, standalone_query):
+                self.rephrase_stats["speculative_hits"] += 1
+                attrs["speculative"] = True
+                retrieved_docs = await speculative
+            else:
+                if speculative is not None:
+                    self.rephrase_stats["speculative_misses"] += 1
+                    _discard(speculative)
+                retrieved_docs = await self._retrieve(standalone_query, top_k, filters)
+            attrs["results"] = len(retrieved_docs)
+        timings["retrieval_ms"] = (time.perf_counter() - retrieval_started) * 1000
+        prepared["retrieved_docs"] = retrieved_docs
+        # Fit passages and history into the model's token budget (off the event loop: large
+        # uploads make splitting and deduplication CPU-heavy)
+        reserved_text = f"{CONSULTANT_PERSONA}\n{summary}" if summary else CONSULTANT_PERSONA
 
-        if context_text:
-            # Step 3: Use the original chat history and retrieved documents to generate the final answer
-            history_prompt = ""
-            if chat_history:
-                for msg in chat_history:
-                    history_prompt += f"{msg['sender'].capitalize()}: {msg['content']}\n"
-
-            # prompt = f"""You are a helpful assistant. Here is the previous conversation history:
-            # {history_prompt}
-            #
-            # As a Franchise Consultant, you ONLY answer questions related to franchises, franchising, and business consulting.
-            # If the user asks something unrelated (e.g., about health, travel, coding, or personal topics), respond with exactly:
-            # "I'm only specialized in giving franchise consulting answers."
-            #
-            # Context:
-            # {context_text}
-            #
-            # Question:
-            # {query}"""
-
-            # prompt = f"""You are a helpful assistant.Here is the
-            # previous
-            # conversation
-            # history:
-            # {history_prompt}
-            #
-            # As
-            # a
-            # Franchise
-            # Consultant
-            # from
-            # "Franchise Middle East,"
-            # you
-            # ONLY
-            # answer
-            # questions
-            # related
-            # to
-            # franchises, franchising, and business
-            # consulting.Your
-            # responses
-            # should
-            # be
-            # professional, concise, and focused
-            # on
-            # the
-            # services
-            # your
-            # company
-            # provides.You
-            # should
-            # frame
-            # your
-            # answers
-            # from the perspective
-            # of
-            # an
-            # expert
-            # guiding
-            # a
-            # client.
-            #
-            # If
-            # the
-            # user
-            # asks
-            # something
-            # unrelated(e.g., about
-            # health, travel, coding, or personal
-            # topics), respond
-            # with exactly:
-            #     "I'm only specialized in giving franchise consulting answers."
-            #
-            # Context:
-            # {context_text}
-            #
-            # Question:
-            # {query}"""
-
-#             prompt= f"""You are a helpful assistant. Here is the previous conversation history:
-# {history_prompt}
-#
-# As a Franchise Consultant from "Franchise Middle East," you ONLY answer questions related to franchises, franchising, and business consulting. Your responses should be professional, concise, and focused on the services your company provides. You should frame your answers from the perspective of an expert guiding a client.
-#
-# If the user asks something unrelated (e.g., about health, travel, coding, or personal topics), respond with exactly:
-# "I'm only specialized in giving franchise consulting answers."
-#
-# Context:
-# {context_text}
-#
-# Question:
-# {query}"""
-
-            prompt= f"""You are a helpful assistant. You will assume the persona of a Franchise Consultant from "Franchise Middle East." Your role is to provide expert guidance to clients on all matters related to franchises, franchising, and business consulting. Your responses must be professional, concise, and formatted clearly using standard web-friendly Markdown to guide the client.
+        def assemble():
+            # Retrieved docs are scored by rank; uploaded docs are split into passages scored by query overlap
+            passages = [{"text": doc["text"], "score": 1.0 / (rank + 1)} for rank, doc in enumerate(retrieved_docs)]
+            for content in extra_docs_content:
+                passages.extend({"text": part, "score": query_overlap(query, part)} for part in split_passages(content))
+            return self.context_assembler.assemble(query, passages, history["turns"], reserved_text=reserved_text)
 
-Please use the following Markdown elements:
-- Use **bold** for key terms and titles.
-- Use `##` for main section headings.
-- Use `*` or `-` for bulleted lists.
-- Use `1.` `2.` `3.` for numbered lists.
-- Use `---` for a horizontal line to separate major sections.
+        with span("context_assembly") as attrs:
+            assembled = await self.embedding_executor.run(assemble)
+            attrs["prompt_tokens_estimated"] = assembled["tokens_used"]
+        context_text = assembled["context_text"]
+
+        if context_text:
+            # Step 3 prompt: persona, summary and history first, context and question last
+            prepared["messages"] = answer_messages(query, context_text, assembled["history"], summary)
+        return prepared
 
+    async def _finish_answer(self, prepared: Dict, answer: str, generation_seconds: float, save: bool):
+        """Caches a freshly generated answer and saves the uploaded docs when asked to."""
+        if prepared["cache_key"] is not None:
+            query_embedding, cache_version = prepared["cache_key"]
+            self.answer_cache.store(query_embedding, answer, generation_seconds, cache_version)
 
-Here is the previous conversation history:
-{history_prompt}
+        if save and prepared["extra_docs"]:
+            await self.embedding_executor.run(self.vector_store.add_to_vectorstore, prepared["extra_docs"])
 
-Context:
-{context_text}
+    async def answer_with_user_docs(
+            self,
+            query: str,
+            user_docs: Optional[List[UploadFile]] = None,
+            save: bool = True,
+            top_k: int = 3,
+            chat_history: Optional[List[Dict]] = None,
+            filters: Optional[Dict] = None,
+            conversation_id: Optional[str] = None
+    ) -> str:
+        prepared = await self._prepare_answer(query, user_docs, top_k, chat_history, filters, conversation_id)
+        if prepared["cached_answer"] is not None:
+            return prepared["cached_answer"]
+        if prepared["messages"] is None:
+            return OUT_OF_SCOPE_ANSWER
 
-Question:
-{query}"""
+        # Step 3: Generate the final answer
+        generation_started = time.perf_counter()
+        with span("generation"):
+            answer = await self._generate(prepared["messages"])
+        await self._finish_answer(prepared, answer, time.perf_counter() - generation_started, save)
+        return answer
 
-            answer = self.ollama.generate_answer(prompt)
+    async def stream_answer_with_user_docs(
+            self,
+            query: str,
+            user_docs: Optional[List[UploadFile]] = None,
+            save: bool = True,
+            top_k: int = 3,
+            chat_history: Optional[List[Dict]] = None,
+            filters: Optional[Dict] = None,
+            conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of `answer_with_user_docs`. Yields `token` events as the model
+        produces text, then a single `done` event with the retrieved ids and stage timings.
+        """
+        prepared = await self._prepare_answer(query, user_docs, top_k, chat_history, filters, conversation_id)
+        timings = prepared["timings"]
 
-            if save and extra_docs_content:
-                self.vector_store.add_to_vectorstore(extra_docs_content)
+        if prepared["cached_answer"] is not None or prepared["messages"] is None:
+            answer = prepared["cached_answer"] or OUT_OF_SCOPE_ANSWER
+            timings["first_token_ms"] = (time.perf_counter() - prepared["started"]) * 1000
+            yield {"event": "token", "data": {"text": answer}}
         else:
-            answer = "Sorry, as a Franchise Consultant, your question is not within my scope."
+            generation_started = time.perf_counter()
+            parts: List[str] = []
+            with span("generation", stream=True) as attrs:
+                async for text in self._stream(prepared["messages"]):
+                    if not parts:
+                        timings["first_token_ms"] = (time.perf_counter() - prepared["started"]) * 1000
+                        attrs["first_token_ms"] = round((time.perf_counter() - generation_started) * 1000, 2)
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+            generation_seconds = time.perf_counter() - generation_started
+            timings["generation_ms"] = generation_seconds * 1000
+            await self._finish_answer(prepared, "".join(parts), generation_seconds, save)
+
+        timings["total_ms"] = (time.perf_counter() - prepared["started"]) * 1000
+        yield {
+            "event": "done",
+            "data": {
+                "standalone_query": prepared["standalone_query"],
+                "retrieved_ids": [doc["id"] for doc in prepared["retrieved_docs"]],
+                "cached": prepared["cached_answer"] is not None,
+                "out_of_scope": prepared["out_of_scope"],
+                "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+            },
+        }
+
+    async def answer_batch(self, queries: List[str], top_k: int = 3, filters: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """
+        Answers many standalone questions in one go. Repeated questions are answered once,
+        all questions are embedded and retrieved in one batched search, and generations run
+        concurrently up to the Ollama pool's capacity. Yields one result per input position
+        (`index`, `query`, `status` "ok" or "error", ...) in completion order.
+        """
+        positions: Dict[str, List[int]] = {}
+        for index, query in enumerate(queries):
+            positions.setdefault(query.strip(), []).append(index)
+        self.batch_stats["batches"] += 1
+        self.batch_stats["queries"] += len(queries)
+        self.batch_stats["duplicates"] += len(queries) - len(positions)
+
+        def results_for(query: str, result: Dict) -> List[Dict]:
+            if result["status"] == "error":
+                self.batch_stats["errors"] += len(positions[query])
+            return [dict(result, index=index, query=queries[index]) for index in positions[query]]
+
+        if "" in positions:
+            for result in results_for("", {"status": "error", "error": "Empty query"}):
+                yield result
+        unique = [query for query in positions if query]
+
+        # Off-topic questions are refused before anything else is spent on them
+        if self.topic_gate.enabled and unique:
+            decisions = await self.embedding_executor.run(self.topic_gate.check, unique)
+            for query, decision in zip(unique, decisions):
+                if decision["in_scope"]:
+                    continue
+                self.batch_stats["out_of_scope"] += len(positions[query])
+                for result in results_for(query, {"status": "ok", "answer": OUT_OF_SCOPE_ANSWER, "cached": False,
+                                                  "out_of_scope": True, "retrieved_ids": []}):
+                    yield result
+            unique = [query for query, decision in zip(unique, decisions) if decision["in_scope"]]
+
+        # Cached answers go out first; the rest keep their cache key for storing the new answer
+        cache_keys = {}
+        pending = unique
+        if self.answer_cache is not None and not filters and unique:
+            cache_version = self.answer_cache.version
+            embeddings = await self.embedding_executor.run(self.vector_store.embed_queries, unique)
+            pending = []
+            for query, embedding in zip(unique, embeddings):
+                cached_answer = self.answer_cache.lookup(embedding)
+                if cached_answer is None:
+                    cache_keys[query] = (embedding, cache_version)
+                    pending.append(query)
+                    continue
+                self.batch_stats["cache_hits"] += 1
+                for result in results_for(query, {"status": "ok", "answer": cached_answer, "cached": True, "retrieved_ids": []}):
+                    yield result
+        if not pending:
+            return
+
+        # One embedding call and one multi-query search for the whole batch (query embeddings
+        # already computed for the cache lookup are served from the embedding cache)
+        search = self.vector_store.hybrid_search_batch if HYBRID_SEARCH else self.vector_store.search_vectors_batch
+        retrieved = await self.embedding_executor.run(search, pending, top_k=top_k, filters=filters)
+        # Passages retrieved for several questions are placed first, in one fixed order, so the
+        # prompts of those questions share a prefix the model server can reuse
+        shared = Counter(doc["id"] for docs in retrieved for doc in docs)
+        self.batch_stats["shared_passages"] += sum(1 for count in shared.values() if count > 1)
+
+        generation_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY or self.ollama.pool.capacity())
+
+        async def answer_one(query: str, docs: List[Dict]):
+            started = time.perf_counter()
+            retrieved_ids = [doc["id"] for doc in docs]
+            try:
+                passages = [{"id": doc["id"], "text": doc["text"], "score": 1.0 / (rank + 1)} for rank, doc in enumerate(docs)]
+                assembled = await self.embedding_executor.run(
+                    self.context_assembler.assemble, query, passages, reserved_text=CONSULTANT_PERSONA
+                )
+                if not assembled["context_text"]:
+                    answer = OUT_OF_SCOPE_ANSWER
+                else:
+                    kept = sorted(assembled["passages"], key=lambda p: (-shared[p["id"]], p["id"]))
+                    async with generation_slots:
+                        answer = await self._generate(answer_messages(query, "\n\n".join(p["text"] for p in kept)))
+                    if query in cache_keys:
+                        query_embedding, cache_version = cache_keys[query]
+                        self.answer_cache.store(query_embedding, answer, time.perf_counter() - started, cache_version)
+                result = {"status": "ok", "answer": answer, "cached": False, "retrieved_ids": retrieved_ids}
+            except ServiceOverloaded as e:
+                result = {"status": "error", "error": str(e), "retry_after": e.retry_after, "retrieved_ids": retrieved_ids}
+            except Exception as e:
+                logger.error(f"Batch answer failed for '{query}': {e}")
+                result = {"status": "error", "error": str(e), "retrieved_ids": retrieved_ids}
+            result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return query, result
+
+        tasks = [asyncio.ensure_future(answer_one(query, docs)) for query, docs in zip(pending, retrieved)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                query, result = await finished
+                for item in results_for(query, result):
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()  # the client went away: stop the generations nobody will read
+
+
+def answer_messages(query: str, context_text: str, history: Optional[List[Dict]] = None,
+                    summary: Optional[str] = None) -> List[Dict]:
+    """
+    The answer prompt: the persona is a fixed system message and the history turns follow
+    as chat messages, so consecutive requests share a prompt prefix the server can keep
+    cached. Only the last message (retrieved context and question) changes every turn;
+    the summary changes only when a background refresh lands.
+    """
+    return [
+        {"role": "system", "content": CONSULTANT_PERSONA},
+        *([{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] if summary else []),
+        *history_messages(history or []),
+        {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion:\n{query}"},
+    ]
+
+
+def history_messages(history: List[Dict]) -> List[Dict]:
+    """Client chat history (`sender`/`content`) as chat messages; anything not from the user is the assistant."""
+    return [
+        {"role": "user" if msg.get("sender") == "user" else "assistant", "content": msg.get("content", "")}
+        for msg in history
+    ]
+
+
+def _discard(task: Optional[asyncio.Future]):
+    """Abandons a speculative task; its outcome (including any error) is ignored."""
+    if task is not None:
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
 
-        return answer
\ No newline at end of file
+def get_rag_service() -> RAGService:
+    """Returns the process-wide RAGService shared by all routers."""
+    return registry.get_or_create(("rag_service",), RAGService)
@@ -0,0 +1,102 @@
+# src/services/service_registry.py
+import os
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from src.utils.Logger import logger
+
+load_dotenv()
+CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", "./data/chroma_db")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+class ServiceRegistry:
+    """
+    Process-wide owner of the heavy shared resources (embedding models, Chroma clients,
+    collections and the services built on top of them).
+
+    Every resource is built lazily on first use and exactly once per worker process,
+    so all routers share one SentenceTransformer and one PersistentClient per path.
+    Resources that need cleanup register a shutdown hook, which `shutdown()` runs in
+    reverse order of creation.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances: Dict[Tuple, Any] = {}
+        self._shutdown_hooks: List[Tuple[str, Callable[[], None]]] = []
+
+    def get_or_create(self, key: Tuple, factory: Callable[[], Any], shutdown: Callable[[Any], None] = None):
+        """
+        Returns the instance registered under `key`, building it with `factory` on first use.
+        If `shutdown` is given it is called with the instance when the registry shuts down.
+        """
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                logger.info(f"Registry: building {key}")
+                instance = factory()
+                self._instances[key] = instance
+                if shutdown is not None:
+                    self.register_shutdown_hook(str(key), lambda: shutdown(instance))
+        return instance
+
+    def register_shutdown_hook(self, name: str, hook: Callable[[], None]):
+        with self._lock:
+            self._shutdown_hooks.append((name, hook))
+
+    def get_embedding_model(self, model_name: str = EMBEDDING_MODEL):
+        """Shared embedding encoder, loaded once per process on the EMBEDDING_BACKEND backend."""
+        def build():
+            from src.services.encoders import load_encoder
+            return load_encoder(model_name)
+
+        return self.get_or_create(("embedding_model", model_name), build)
+
+    def get_chroma_client(self, path: str = CHROMA_DB_DIR):
+        """Shared Chroma PersistentClient, one per persistence directory."""
+        def build():
+            from chromadb import PersistentClient
+            os.makedirs(path, exist_ok=True)
+            return PersistentClient(path=path)
+
+        return self.get_or_create(("chroma_client", os.path.abspath(path)), build, shutdown=_close_chroma_client)
+
+    def get_collection(self, name: str = "documents", path: str = CHROMA_DB_DIR):
+        """Shared Chroma collection handle."""
+        def build():
+            return self.get_chroma_client(path).get_or_create_collection(
+                name=name,
+                metadata={"description": "RAG documents collection"}
+            )
+
+        return self.get_or_create(("collection", os.path.abspath(path), name), build)
+
+    def shutdown(self):
+        """Runs the registered shutdown hooks (newest first) and drops every cached instance."""
+        with self._lock:
+            hooks = list(reversed(self._shutdown_hooks))
+            self._shutdown_hooks.clear()
+            self._instances.clear()
+
+        for name, hook in hooks:
+            try:
+                hook()
+                logger.info(f"Registry: released {name}")
+            except Exception as e:
+                logger.error(f"Registry: error while releasing {name}: {e}")
+
+
+def _close_chroma_client(client):
+    close = getattr(client, "close", None)
+    if close is not None:
+        close()
+
+
+registry = ServiceRegistry()
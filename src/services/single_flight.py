@@ -0,0 +1,159 @@
+# src/services/single_flight.py
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+def request_key(payload: Dict) -> str:
+    """Stable hash of a request payload (model, options, messages, ...)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class _Broadcast:
+    """One upstream token stream fanned out to every subscriber, late joiners replaying from the start."""
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("Shared generation was cancelled")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            close = getattr(source, "aclose", None)
+            if close is not None:
+                await close()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(self.chunks):
+                    yield self.chunks[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                self._task.cancel()  # nobody is listening any more
+
+
+class SingleFlight:
+    """
+    Coalesces identical requests that are in flight at the same time: the first caller
+    for a key (the leader) runs the work and every caller that arrives before it finishes
+    shares the result, error included. Nothing is cached once the leader is done.
+
+    `run` covers coroutines, `stream` async token streams (each subscriber gets every
+    chunk from the first one on) and `run_sync` blocking calls made from worker threads.
+    The shared work is cancelled only when every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict = {}
+        self._streams: Dict = {}
+        self._sync_calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.stream_leaders = 0
+        self.stream_coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable]):
+        slot = (asyncio.get_running_loop(), key)
+        entry = self._calls.get(slot)
+        with self._lock:
+            if entry is None:
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if entry is None:
+            entry = self._calls[slot] = {"task": asyncio.ensure_future(factory()), "waiters": 0}
+            entry["task"].add_done_callback(lambda _: self._forget(self._calls, slot, entry))
+
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        finally:
+            entry["waiters"] -= 1
+            if not entry["waiters"] and not entry["task"].done():
+                entry["task"].cancel()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        slot = (asyncio.get_running_loop(), key)
+        broadcast = self._streams.get(slot)
+        with self._lock:
+            if broadcast is None:
+                self.stream_leaders += 1
+            else:
+                self.stream_coalesced += 1
+        if broadcast is None:
+            broadcast = self._streams[slot] = _Broadcast(factory())
+            broadcast._task.add_done_callback(lambda _: self._forget(self._streams, slot, broadcast))
+
+        subscription = broadcast.subscribe()
+        try:
+            async for chunk in subscription:
+                yield chunk
+        finally:
+            await subscription.aclose()
+
+    def run_sync(self, key: str, fn: Callable):
+        with self._lock:
+            future = self._sync_calls.get(key)
+            leader = future is None
+            if leader:
+                self.leaders += 1
+                future = self._sync_calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._sync_calls.pop(key, None)
+        return future.result()
+
+    @staticmethod
+    def _forget(table: Dict, slot, entry):
+        if table.get(slot) is entry:
+            del table[slot]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "stream_leaders": self.stream_leaders,
+                "stream_coalesced": self.stream_coalesced,
+                "in_flight": len(self._calls) + len(self._sync_calls),
+                "streams_in_flight": len(self._streams),
+            }
@@ -0,0 +1,198 @@
+# src/services/snapshot.py
+import json
+import os
+import shutil
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.Logger import logger
+
+load_dotenv()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", 1000))
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+COLUMNS = {"ids": "ids.jsonl", "documents": "documents.jsonl", "metadatas": "metadatas.jsonl"}
+
+
+def export_snapshot(collection, directory: str, page_size: int = SNAPSHOT_PAGE_SIZE) -> Dict:
+    """
+    Writes every row of a Chroma collection to `directory`:
+
+    - `embeddings.npy`: one contiguous float32 (rows, dim) block, memory-mappable on import
+    - `ids.jsonl`, `documents.jsonl`, `metadatas.jsonl`: one JSON value per line, row-aligned
+    - `manifest.json`: row count, dimension and the embedding model that produced the vectors
+
+    The collection is read page by page, so memory use does not grow with its size.
+    """
+    os.makedirs(directory, exist_ok=True)
+    raw_path = os.path.join(directory, f"{EMBEDDINGS_FILE}.raw")
+    columns = {name: open(os.path.join(directory, f"{filename}.tmp"), "w", encoding="utf-8") for name, filename in COLUMNS.items()}
+    rows, dim, offset = 0, None, 0
+    try:
+        with open(raw_path, "wb") as raw:
+            while True:
+                page = collection.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+                if not len(page["ids"]):
+                    break
+                embeddings = np.asarray(page["embeddings"], dtype="<f4")
+                dim = dim or embeddings.shape[1]
+                raw.write(np.ascontiguousarray(embeddings).tobytes())
+                for name, f in columns.items():
+                    f.writelines(json.dumps(value, ensure_ascii=False) + "\n" for value in page[name])
+                rows += len(page["ids"])
+                offset += len(page["ids"])
+    finally:
+        for f in columns.values():
+            f.close()
+
+    # Prefix the raw block with an .npy header now that the final shape is known
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    with open(f"{embeddings_path}.tmp", "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, {"descr": "<f4", "fortran_order": False, "shape": (rows, dim or 0)})
+        shutil.copyfileobj(raw, out, 1 << 20)
+    os.remove(raw_path)
+    os.replace(f"{embeddings_path}.tmp", embeddings_path)
+    for filename in COLUMNS.values():
+        os.replace(os.path.join(directory, f"{filename}.tmp"), os.path.join(directory, filename))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "rows": rows,
+        "dim": dim,
+        "dtype": "float32",
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "collection": getattr(collection, "name", None),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Snapshot of {rows} rows written to {directory}")
+    return manifest
+
+
+class Snapshot:
+    """
+    Read side of a snapshot directory. `embeddings` is a read-only memory map, so a
+    batch only touches the pages it covers and nothing is re-encoded.
+    """
+
+    def __init__(self, directory: str, expected_model: Optional[str] = EMBEDDING_MODEL):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.manifest.get('version')}")
+        if expected_model and self.manifest["embedding_model"] != expected_model:
+            raise ValueError(
+                f"Snapshot was embedded with '{self.manifest['embedding_model']}', expected '{expected_model}'"
+            )
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        if self.embeddings.shape[0] != self.manifest["rows"]:
+            raise ValueError(f"Snapshot is truncated: {self.embeddings.shape[0]} of {self.manifest['rows']} vectors")
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def _column(self, name: str) -> Iterator:
+        with open(os.path.join(self.directory, COLUMNS[name]), "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def batches(self, batch_size: int = SNAPSHOT_PAGE_SIZE) -> Iterator[Dict]:
+        """Yields row-aligned batches: ids, documents, metadatas and a float32 embeddings view."""
+        ids, documents, metadatas = self._column("ids"), self._column("documents"), self._column("metadatas")
+        for start in range(0, len(self), batch_size):
+            count = min(batch_size, len(self) - start)
+            yield {
+                "ids": list(islice(ids, count)),
+                "documents": list(islice(documents, count)),
+                "metadatas": list(islice(metadatas, count)),
+                "embeddings": self.embeddings[start:start + count],
+            }
+
+
+def import_to_chroma(snapshot: Snapshot, collection, batch_size: int = SNAPSHOT_PAGE_SIZE, lexical_index=None) -> int:
+    """
+    Bulk-upserts a snapshot into a Chroma collection with its stored vectors.
+    `lexical_index` (a BM25Index), if given, is updated with the same documents.
+    """
+    imported = 0
+    for batch in snapshot.batches(batch_size):
+        collection.upsert(
+            ids=batch["ids"],
+            embeddings=np.asarray(batch["embeddings"]),
+            documents=batch["documents"],
+            metadatas=[metadata or None for metadata in batch["metadatas"]],
+        )
+        if lexical_index is not None:
+            lexical_index.add(batch["ids"], batch["documents"])
+        imported += len(batch["ids"])
+    if lexical_index is not None:
+        lexical_index.save()
+    logger.info(f"Imported {imported} rows into collection '{getattr(collection, 'name', '?')}'")
+    return imported
+
+
+def import_to_faiss(snapshot: Snapshot, rag_model, batch_size: int = 50000) -> int:
+    """
+    Loads a snapshot into a RAGModel's FAISS index; trained index types are trained on
+    the first batch. Rows whose chunk ID is already indexed are skipped.
+    """
+    known = set(rag_model.chunk_ids)
+    imported = 0
+    for batch in snapshot.batches(batch_size):
+        keep: List[int] = [i for i, chunk_id in enumerate(batch["ids"]) if chunk_id not in known]
+        if not keep:
+            continue
+        imported += rag_model.add_embeddings(
+            [batch["documents"][i] for i in keep],
+            [batch["ids"][i] for i in keep],
+            batch["embeddings"][keep],
+        )
+    return imported
+
+
+if __name__ == "__main__":
+    # python -m src.services.snapshot export <dir> [collection]
+    # python -m src.services.snapshot import <dir> [collection]
+    # python -m src.services.snapshot import-faiss <dir> [index_path]
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "import", "import-faiss"):
+        print("usage: python -m src.services.snapshot {export|import|import-faiss} <dir> [collection|index_path]")
+        sys.exit(2)
+    command, directory = sys.argv[1], sys.argv[2]
+
+    if command == "import-faiss":
+        from src.models.RAGModel import RAGModel
+        rag = RAGModel(vector_db_path=sys.argv[3] if len(sys.argv) > 3 else "vector.index")
+        if os.path.exists(rag.vector_db_path):
+            rag.load_index()
+        count = import_to_faiss(Snapshot(directory), rag)
+        rag.save_index()
+        print(f"✅ Imported {count} vectors into {rag.vector_db_path}")
+    else:
+        from src.services.lexical_index import BM25Index
+        from src.services.service_registry import registry
+        from src.services.vector_store_service import CHROMA_DB_DIR, lexical_index_path
+
+        name = sys.argv[3] if len(sys.argv) > 3 else "documents"
+        collection = registry.get_collection(name, CHROMA_DB_DIR)
+        if command == "export":
+            manifest = export_snapshot(collection, directory)
+            print(f"✅ Exported {manifest['rows']} rows to {directory}")
+        else:
+            lexical = BM25Index(lexical_index_path(name))
+            lexical.load()
+            count = import_to_chroma(Snapshot(directory), collection, lexical_index=lexical)
+            print(f"✅ Imported {count} rows into '{name}'")
+        registry.shutdown()
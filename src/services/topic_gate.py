@@ -0,0 +1,215 @@
+# src/services/topic_gate.py
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.Logger import logger
+from src.utils.Metrics import Histogram
+
+load_dotenv()
+# "enforce" answers off-topic questions with the canned refusal, "shadow" only scores and
+# logs them (for tuning the threshold on live traffic), "off" skips the gate entirely
+TOPIC_GATE_MODE = os.getenv("TOPIC_GATE_MODE", "enforce").lower()
+# Minimum cosine similarity between the query and the nearest domain centroid
+TOPIC_GATE_THRESHOLD = float(os.getenv("TOPIC_GATE_THRESHOLD", 0.3))
+# Queries naming one of the allowed keywords pass without being scored
+TOPIC_GATE_KEYWORDS = os.getenv("TOPIC_GATE_KEYWORDS", "true").lower() == "true"
+# Optional JSON file {"topic": ["example question", ...], ...} replacing DOMAIN_TOPICS
+TOPIC_GATE_TOPICS_FILE = os.getenv("TOPIC_GATE_TOPICS_FILE", "")
+TOPIC_GATE_LOG_EVERY = int(os.getenv("TOPIC_GATE_LOG_EVERY", 100))
+MODES = ("enforce", "shadow", "off")
+
+# Example questions per area of the franchise domain; each area becomes one centroid
+DOMAIN_TOPICS: Dict[str, List[str]] = {
+    "fees": [
+        "What is the franchise fee?",
+        "How much royalty do franchisees pay each month?",
+        "Is there a marketing or advertising fund contribution?",
+        "What are the ongoing fees of this franchise?",
+    ],
+    "investment": [
+        "How much does it cost to open a franchise?",
+        "What is the initial investment for a restaurant franchise?",
+        "How long until a franchise outlet breaks even?",
+        "Can I get financing to buy a franchise?",
+    ],
+    "agreement": [
+        "How long is the franchise agreement term?",
+        "Can I renew or transfer my franchise agreement?",
+        "What happens if the franchisor terminates the contract?",
+        "What does the franchise disclosure document include?",
+    ],
+    "expansion": [
+        "How can I franchise my business?",
+        "Which brands are expanding into the Middle East?",
+        "What is a master franchise for a whole country?",
+        "How do I grow my brand through franchising in the GCC?",
+    ],
+    "operations": [
+        "What training and support does the franchisor provide?",
+        "How are territories and site locations selected?",
+        "What are the staffing and supply requirements for franchisees?",
+        "How do franchisees report sales to the franchisor?",
+    ],
+    "brands": [
+        "Tell me about the KFC franchise.",
+        "Which coffee shop franchises are available in Dubai?",
+        "What are the best food and beverage franchises in Saudi Arabia?",
+        "Compare retail franchise opportunities in the UAE.",
+    ],
+}
+
+
+def load_topics(path: str = TOPIC_GATE_TOPICS_FILE) -> Dict[str, List[str]]:
+    if not path:
+        return DOMAIN_TOPICS
+    with open(path, encoding="utf-8") as f:
+        topics = json.load(f)
+    if not isinstance(topics, dict) or not all(isinstance(v, list) and v for v in topics.values()):
+        raise ValueError(f"{path} must map topic names to non-empty lists of example questions")
+    return topics
+
+
+def _stem(word: str) -> str:
+    """Crude suffix strip so every inflection of a keyword shares its prefix (franchise -> franchis)."""
+    for suffix in ("ing", "ies", "es", "s", "y", "e"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def keyword_pattern(keyword: str) -> str:
+    """Regex for a (multi-word) keyword where each word may carry any suffix."""
+    return r"\s+".join(rf"{re.escape(_stem(word))}\w*" for word in keyword.lower().split())
+
+
+class TopicGate:
+    """
+    Cheap pre-filter that keeps off-domain questions away from the rephrase call,
+    retrieval and generation.
+
+    A query is in scope when it names one of `keywords` (case-insensitive, any inflection:
+    "franchise" also matches "franchises", "franchisee", "franchising") or
+    when its embedding has cosine similarity of at least `threshold` with the nearest
+    domain centroid; centroids are the normalized means of each topic's example questions,
+    embedded once on first use. `embed` is the service's query embedder, so a query's
+    embedding is computed once and reused for the answer cache and retrieval.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], keywords: Optional[List[str]] = None,
+                 threshold: float = TOPIC_GATE_THRESHOLD, mode: str = TOPIC_GATE_MODE,
+                 topics: Optional[Dict[str, List[str]]] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown topic gate mode '{mode}'. Choose one of {MODES}.")
+        self.embed = embed
+        self.threshold = threshold
+        self.mode = mode
+        self.topics = topics or load_topics()
+        self._keywords = None
+        if keywords and TOPIC_GATE_KEYWORDS:
+            alternatives = "|".join(keyword_pattern(k) for k in sorted(keywords, key=len, reverse=True))
+            self._keywords = re.compile(rf"\b(?:{alternatives})")
+        self._centroids: Optional[np.ndarray] = None
+        self._topic_names: List[str] = []
+        self._lock = threading.Lock()
+
+        self.checked = 0
+        self.keyword_matches = 0
+        self.similarity_matches = 0
+        self.rejected = 0
+        self.scores = Histogram(buckets=[0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _build_centroids(self) -> np.ndarray:
+        with self._lock:
+            if self._centroids is None:
+                names = list(self.topics)
+                centroids = []
+                for name in names:
+                    vectors = np.asarray(self.embed(self.topics[name]), dtype=np.float32)
+                    centroids.append(_normalize(vectors.mean(axis=0)))
+                self._topic_names = names
+                self._centroids = np.stack(centroids)
+                logger.info(f"Topic gate ready: {len(names)} domain centroids, threshold {self.threshold}, mode '{self.mode}'")
+            return self._centroids
+
+    def check(self, queries: List[str]) -> List[Dict]:
+        """
+        Scores each query and returns `in_scope` (after the mode is applied), `score`
+        (None for keyword matches), `topic` and `reason` per query. Blocking: run it on
+        the embedding executor.
+        """
+        decisions: List[Optional[Dict]] = [None] * len(queries)
+        to_score = []
+        for i, query in enumerate(queries):
+            if self._keywords is not None and self._keywords.search(query.lower()):
+                decisions[i] = {"in_scope": True, "score": None, "topic": None, "reason": "keyword"}
+            else:
+                to_score.append(i)
+
+        if to_score:
+            centroids = self._build_centroids()
+            embeddings = np.asarray(self.embed([queries[i] for i in to_score]), dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            similarities = (embeddings / np.where(norms == 0, 1.0, norms)) @ centroids.T
+            for row, i in enumerate(to_score):
+                best = int(np.argmax(similarities[row]))
+                score = float(similarities[row, best])
+                self.scores.observe(score)
+                matched = score >= self.threshold
+                decisions[i] = {
+                    "in_scope": matched or self.mode == "shadow",
+                    "score": round(score, 4),
+                    "topic": self._topic_names[best],
+                    "reason": "similarity" if matched else "off_topic",
+                }
+                if not matched:
+                    logger.info(f"Topic gate {'would reject' if self.mode == 'shadow' else 'rejected'} "
+                                f"(score {score:.3f} < {self.threshold}, nearest '{self._topic_names[best]}'): '{queries[i][:200]}'")
+
+        self._count(decisions)
+        return decisions
+
+    def _count(self, decisions: List[Dict]):
+        with self._lock:
+            before = self.checked
+            self.checked += len(decisions)
+            for decision in decisions:
+                if decision["reason"] == "keyword":
+                    self.keyword_matches += 1
+                elif decision["reason"] == "similarity":
+                    self.similarity_matches += 1
+                else:
+                    self.rejected += 1
+            report = TOPIC_GATE_LOG_EVERY > 0 and self.checked // TOPIC_GATE_LOG_EVERY > before // TOPIC_GATE_LOG_EVERY
+            checked, rejected = self.checked, self.rejected
+        if report:
+            logger.info(f"Topic gate: {rejected}/{checked} queries off-topic ({rejected / checked:.1%}), mode '{self.mode}'")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "mode": self.mode,
+                "threshold": self.threshold,
+                "topics": len(self.topics),
+                "checked": self.checked,
+                "keyword_matches": self.keyword_matches,
+                "similarity_matches": self.similarity_matches,
+                # in shadow mode these are the queries that would have been rejected
+                "rejected": self.rejected,
+                "rejection_rate": round(self.rejected / self.checked, 4) if self.checked else None,
+            }
+        return dict(counters, scores=self.scores.snapshot())
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
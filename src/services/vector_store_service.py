@@ -1,14 +1,34 @@
 import os
+import threading
 import uuid
-from typing import List, Optional, Dict
-from chromadb import PersistentClient
+import numpy as np
+from typing import Callable, List, Optional, Dict
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from src.services.embedding_batcher import get_embedding_batcher
+from src.services.embedding_cache import get_embedding_cache
+from src.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from src.services.metadata_index import MetadataIndex
+from src.services.quantization import QuantizedVectorIndex, QUANTIZED_TRAIN_SAMPLE
+from src.services.service_registry import registry
+from src.utils.Logger import logger
+from src.utils.Metrics import metrics
+from src.utils.Tracing import span
 
 # Load environment variables
 load_dotenv()
 CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", "./data/chroma_db")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+LEXICAL_SHORTCUT_COVERAGE = float(os.getenv("LEXICAL_SHORTCUT_COVERAGE", 1.0))
+LEXICAL_SHORTCUT_MARGIN = float(os.getenv("LEXICAL_SHORTCUT_MARGIN", 0.5))
+# "float32" searches through Chroma; "int8" / "pq" search an in-memory quantized copy and rescore from Chroma
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "float32").lower()
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", 8))
+# Filtered searches whose candidate set is larger than this fall back to a Chroma `where` clause
+METADATA_FILTER_MAX_IDS = int(os.getenv("METADATA_FILTER_MAX_IDS", 20000))
+# Writes to the BM25 index are persisted this long after the last change (0 saves on every change)
+LEXICAL_INDEX_SAVE_DELAY_SECONDS = float(os.getenv("LEXICAL_INDEX_SAVE_DELAY_SECONDS", 5))
 
 # Ensure persistence directory exists
 os.makedirs(CHROMA_DB_DIR, exist_ok=True)
@@ -18,14 +38,118 @@ class VectorStoreService:
     def __init__(self, collection_name: str = "documents"):
         """
         Initialize ChromaDB client and embedding model.
+        The client, collection and model are shared process-wide through the service registry.
         """
-        # Use PersistentClient for disk persistence
-        self.chroma_client = PersistentClient(path=CHROMA_DB_DIR)
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=collection_name,
-            metadata={"description": "RAG documents collection"}
+        self.chroma_client = registry.get_chroma_client(CHROMA_DB_DIR)
+        self.collection = registry.get_collection(collection_name, CHROMA_DB_DIR)
+        self.embedding_model = registry.get_embedding_model(EMBEDDING_MODEL)
+        # Single-text encodes (queries, upserts) go through the shared micro-batcher
+        self.query_encoder = get_embedding_batcher(EMBEDDING_MODEL)
+        self.embedding_cache = get_embedding_cache(EMBEDDING_MODEL)
+        self._change_listeners: List[Callable[[], None]] = []
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self.lexical_index = self._load_lexical_index(collection_name)
+        self.lexical_shortcuts = 0
+        metrics.register(
+            f"lexical_index.{collection_name}",
+            lambda: dict(self.lexical_index.stats(), shortcuts=self.lexical_shortcuts)
         )
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.metadata_index = self._build_metadata_index()
+        metrics.register(f"metadata_index.{collection_name}", lambda: self.metadata_index.stats())
+        self.quantized_index = None
+        if VECTOR_STORAGE_MODE in ("int8", "pq"):
+            self.quantized_index = self._build_quantized_index()
+            metrics.register(f"quantized_index.{collection_name}", lambda: self.quantized_index.stats())
+
+    def _build_quantized_index(self) -> QuantizedVectorIndex:
+        """Builds the quantized search copy from the collection, training on the first pages."""
+        index = QuantizedVectorIndex(VECTOR_STORAGE_MODE)
+        pending_ids, pending_vectors = [], []
+        for page in self.iter_collection(include=["embeddings"]):
+            if index.is_trained:
+                index.add(page["ids"], np.asarray(page["embeddings"], dtype=np.float32))
+                continue
+            pending_ids.extend(page["ids"])
+            pending_vectors.extend(page["embeddings"])
+            if len(pending_ids) >= QUANTIZED_TRAIN_SAMPLE:
+                index.add(pending_ids, np.asarray(pending_vectors, dtype=np.float32))
+                pending_ids, pending_vectors = [], []
+        if pending_ids:
+            index.add(pending_ids, np.asarray(pending_vectors, dtype=np.float32))
+        logger.info(f"Quantized index ready: {index.stats()}")
+        return index
+
+    def _index_quantized(self, ids: List[str], embeddings):
+        if self.quantized_index is None:
+            return
+        self.quantized_index.add(ids, np.asarray(embeddings, dtype=np.float32))
+        if self.quantized_index.needs_retrain():
+            self.quantized_index = self._build_quantized_index()
+
+    def _build_metadata_index(self) -> MetadataIndex:
+        index = MetadataIndex()
+        for page in self.iter_collection(include=["metadatas"]):
+            index.add(page["ids"], page["metadatas"])
+        return index
+
+    def _load_lexical_index(self, collection_name: str) -> BM25Index:
+        """Loads the persisted BM25 index, rebuilding it from the collection when it is missing or out of sync."""
+        index = BM25Index(lexical_index_path(collection_name))
+        if index.load() and len(index) == self.collection.count():
+            return index
+
+        logger.info(f"Rebuilding lexical index for collection '{collection_name}'")
+        index = BM25Index(index.path)
+        for page in self.iter_collection(include=["documents"]):
+            index.add(page["ids"], page["documents"])
+        index.save()
+        return index
+
+    def iter_collection(self, page_size: int = 1000, include: Optional[List[str]] = None, start: int = 0):
+        """Yields the collection page by page as `collection.get` results, from offset `start`."""
+        offset = start
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=include or [])
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+
+    def add_change_listener(self, listener: Callable[[], None]):
+        """Registers a callback that runs whenever documents are added, updated or deleted."""
+        self._change_listeners.append(listener)
+
+    def _notify_change(self):
+        self._schedule_lexical_save()
+        for listener in self._change_listeners:
+            listener()
+
+    def _schedule_lexical_save(self):
+        """Debounces BM25 persistence so a burst of upserts/deletes writes the index once."""
+        if LEXICAL_INDEX_SAVE_DELAY_SECONDS <= 0:
+            self.lexical_index.save()
+            return
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(LEXICAL_INDEX_SAVE_DELAY_SECONDS, self.flush_lexical_index)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush_lexical_index(self):
+        """Persists pending BM25 changes now; called at the end of ingestion and on shutdown."""
+        with self._save_lock:
+            pending, self._save_timer = self._save_timer, None
+            if pending is None:
+                return
+            pending.cancel()
+            self.lexical_index.save()
+
+    def embed_queries(self, texts: List[str]):
+        """Embeds query-like texts, serving repeats from the LRU cache and batching the misses."""
+        with span("embed", texts=len(texts)):
+            return self.embedding_cache.encode(texts, self.query_encoder.encode)
 
     def add_to_vectorstore(
         self,
@@ -59,30 +183,149 @@ class VectorStoreService:
                 ids=batch_ids,
                 metadatas=batch_metadata
             )
+            self.lexical_index.add(batch_ids, batch_docs)
+            self.metadata_index.add(batch_ids, batch_metadata)
+            self._index_quantized(batch_ids, embeddings)
             total_added += len(batch_docs)
 
+        self._notify_change()
         return total_added
 
-    def search_vectors(self, query: str, top_k: int = 3) -> List[Dict]:
+    def search_vectors(self, query: str, top_k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
         """
         Search the most relevant documents for a query.
         Returns a list of dicts with id, text, metadata, and distance score.
+        `filters` restricts the search by metadata, e.g. {"brand": "acme", "region": ["uae", "ksa"]}.
         """
-        query_embedding = self.embedding_model.encode([query]).tolist()
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=top_k
-        )
+        return self.search_vectors_batch([query], top_k, filters)[0]
+
+    def search_vectors_batch(self, queries: List[str], top_k: int = 3, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        `search_vectors` for many queries at once: one embedding call for all of them and a
+        single multi-query `collection.query`. Returns one result list per query, in order.
+        """
+        if not queries:
+            return []
+        allowed = self.metadata_index.match(filters) if filters else None
+        if allowed is not None and not allowed:
+            return [[] for _ in queries]
+
+        query_embeddings = self.embed_queries(queries)
+        if self.quantized_index is not None:
+            return [self._search_quantized(embedding, top_k, allowed) for embedding in query_embeddings]
 
-        formatted = []
-        for i, doc in enumerate(results["documents"][0]):
-            formatted.append({
-                "id": results["ids"][0][i],
+        # Candidates come from the metadata index, so Chroma only scores the matching IDs
+        scope = {}
+        if allowed is not None:
+            scope = {"ids": list(allowed)} if len(allowed) <= METADATA_FILTER_MAX_IDS else {"where": MetadataIndex.to_where(filters)}
+        with span("vector_query", queries=len(queries)):
+            results = self.collection.query(
+                query_embeddings=np.asarray(query_embeddings).tolist(),
+                n_results=min(top_k, len(allowed)) if allowed is not None else top_k,
+                **scope
+            )
+
+        metadatas = results.get("metadatas") or [[{}] * len(ids) for ids in results["ids"]]
+        batch = []
+        for q in range(len(queries)):
+            formatted = []
+            for i, doc in enumerate(results["documents"][q]):
+                formatted.append({
+                    "id": results["ids"][q][i],
+                    "text": doc,
+                    "metadata": metadatas[q][i],
+                    "score": results["distances"][q][i]
+                })
+            batch.append(formatted)
+        return batch
+
+    def _search_quantized(self, query_embedding, top_k: int, allowed: Optional[set] = None) -> List[Dict]:
+        """
+        Scans the quantized codes (only the `allowed` rows, if given) for
+        `top_k * QUANTIZED_RESCORE_FACTOR` candidates, then rescores them with their
+        full-precision embeddings from Chroma.
+        """
+        with span("quantized_scan"):
+            hits = self.quantized_index.search(query_embedding, top_k * QUANTIZED_RESCORE_FACTOR, allowed=allowed)
+        if not hits:
+            return []
+        with span("quantized_rescore", candidates=len(hits)):
+            found = self.collection.get(ids=[doc_id for doc_id, _ in hits], include=["embeddings", "documents", "metadatas"])
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        rows = [
+            {
+                "id": doc_id,
                 "text": doc,
-                "metadata": results.get("metadatas", [{}])[0][i],
-                "score": results["distances"][0][i]
-            })
-        return formatted
+                "metadata": meta,
+                "score": float(((np.asarray(embedding, dtype=np.float32) - query_embedding) ** 2).sum()),
+            }
+            for doc_id, doc, meta, embedding in zip(found["ids"], found["documents"], found["metadatas"], found["embeddings"])
+        ]
+        return sorted(rows, key=lambda row: row["score"])[:top_k]
+
+    def hybrid_search(self, query: str, top_k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Combines BM25 and dense retrieval with reciprocal-rank fusion.
+        When the best lexical hit covers every query term and clearly beats the runner-up,
+        the lexical ranking is returned as-is and the query is never embedded.
+        `filters` scopes both rankings by metadata, as in `search_vectors`.
+        """
+        return self.hybrid_search_batch([query], top_k, filters)[0]
+
+    def hybrid_search_batch(self, queries: List[str], top_k: int = 3, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        `hybrid_search` for many queries: the queries that need dense retrieval share one
+        `search_vectors_batch` call, and documents missing from the dense results are
+        fetched from Chroma in one `get` for the whole batch.
+        """
+        allowed = self.metadata_index.match(filters) if filters else None
+        if allowed is not None and not allowed:
+            return [[] for _ in queries]
+
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        with span("lexical_search", queries=len(queries)):
+            lexical = [self.lexical_index.search(query, candidates, allowed=allowed) for query in queries]
+        shortcut = [bool(hits) and self._lexical_is_confident(query, hits) for query, hits in zip(queries, lexical)]
+        self.lexical_shortcuts += sum(shortcut)
+
+        dense_positions = [i for i, confident in enumerate(shortcut) if not confident]
+        dense = dict(zip(dense_positions, self.search_vectors_batch([queries[i] for i in dense_positions], candidates, filters)))
+
+        # Final (id, score) rankings per query, then one fetch for every document not already loaded
+        rankings, by_id = [], {}
+        for i in range(len(queries)):
+            if shortcut[i]:
+                rankings.append([(doc_id, score) for doc_id, score in lexical[i][:top_k]])
+                continue
+            by_id.update((doc["id"], doc) for doc in dense[i])
+            if not lexical[i]:
+                rankings.append([(doc["id"], doc["score"]) for doc in dense[i][:top_k]])
+                continue
+            rankings.append(reciprocal_rank_fusion(
+                [[doc["id"] for doc in dense[i]], [doc_id for doc_id, _ in lexical[i]]], k=HYBRID_RRF_K
+            )[:top_k])
+
+        missing = list(dict.fromkeys(doc_id for ranking in rankings for doc_id, _ in ranking if doc_id not in by_id))
+        by_id.update((doc["id"], doc) for doc in self._fetch_results(missing, {}))
+        return [[dict(by_id[doc_id], score=score) for doc_id, score in ranking if doc_id in by_id] for ranking in rankings]
+
+    def _lexical_is_confident(self, query: str, lexical: List) -> bool:
+        best_id, best_score = lexical[0]
+        runner_up = lexical[1][1] if len(lexical) > 1 else 0.0
+        margin = (best_score - runner_up) / best_score if best_score else 0.0
+        return margin >= LEXICAL_SHORTCUT_MARGIN and self.lexical_index.term_coverage(query, best_id) >= LEXICAL_SHORTCUT_COVERAGE
+
+    def _fetch_results(self, ids: List[str], scores: Dict[str, float]) -> List[Dict]:
+        """Loads documents by ID and formats them like `search_vectors` results, preserving `ids` order."""
+        if not ids:
+            return []
+        with span("fetch_documents", ids=len(ids)):
+            found = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        rows = {
+            doc_id: {"id": doc_id, "text": doc, "metadata": meta, "score": scores.get(doc_id)}
+            for doc_id, doc, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [rows[doc_id] for doc_id in ids if doc_id in rows]
 
     def upsert_vector(
         self,
@@ -95,13 +338,17 @@ class VectorStoreService:
         """
         vector_id = id or str(uuid.uuid4())
         meta = metadata or {}
-        embedding = self.embedding_model.encode([doc]).tolist()
+        embedding = self.embed_queries([doc]).tolist()
         self.collection.upsert(
             documents=[doc],
             embeddings=embedding,
             ids=[vector_id],
             metadatas=[meta]
         )
+        self.lexical_index.add([vector_id], [doc])
+        self.metadata_index.add([vector_id], [meta])
+        self._index_quantized([vector_id], embedding)
+        self._notify_change()
         return vector_id
 
     def delete_vector(self, id: str):
@@ -109,3 +356,45 @@ class VectorStoreService:
         Remove a document from the vector store by ID.
         """
         self.collection.delete(ids=[id])
+        self.lexical_index.remove([id])
+        self.metadata_index.remove([id])
+        if self.quantized_index is not None:
+            self.quantized_index.remove([id])
+        self._notify_change()
+
+    def delete_vectors(self, ids: List[str], chunk_size: int = 500):
+        """
+        Remove several documents from the vector store by ID.
+        """
+        if not ids:
+            return 0
+        for i in range(0, len(ids), chunk_size):
+            self.collection.delete(ids=ids[i:i + chunk_size])
+        self.lexical_index.remove(ids)
+        self.metadata_index.remove(ids)
+        if self.quantized_index is not None:
+            self.quantized_index.remove(ids)
+        self._notify_change()
+        return len(ids)
+
+    def existing_ids(self, ids: List[str]) -> set:
+        """
+        Returns the subset of `ids` already stored in the collection.
+        """
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+
+def lexical_index_path(collection_name: str = "documents") -> str:
+    """Where the BM25 index of `collection_name` is persisted."""
+    return os.path.join(CHROMA_DB_DIR, f"bm25_{collection_name}.npz")
+
+
+def get_vector_store_service(collection_name: str = "documents") -> VectorStoreService:
+    """Returns the process-wide VectorStoreService for `collection_name`."""
+    return registry.get_or_create(
+        ("vector_store_service", collection_name),
+        lambda: VectorStoreService(collection_name),
+        shutdown=lambda store: store.flush_lexical_index()
+    )
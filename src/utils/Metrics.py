@@ -0,0 +1,90 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional
+
+from src.utils.Logger import logger
+
+# Default buckets (milliseconds) for latency histograms
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    """
+    Small thread-safe fixed-bucket histogram.
+    Percentiles are approximated by the upper bound of the bucket they fall into.
+    """
+
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = sorted(buckets or LATENCY_BUCKETS_MS)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is the +Inf bucket
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._count:
+                return None
+            rank = q * self._count
+            cumulative = 0
+            for i, count in enumerate(self._counts):
+                cumulative += count
+                if cumulative >= rank:
+                    return self.buckets[i] if i < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            count, total, maximum = self._count, self._sum, self._max
+            buckets = {str(b): c for b, c in zip(self.buckets, self._counts)}
+            buckets["+Inf"] = self._counts[-1]
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else None,
+            "max": round(maximum, 3),
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """Collects `stats()` snapshots from every component that registered a provider."""
+
+    def __init__(self):
+        self._providers: Dict[str, Callable[[], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, provider: Callable[[], Dict]):
+        with self._lock:
+            self._providers[name] = provider
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._providers.pop(name, None)
+
+    def collect(self) -> Dict[str, Dict]:
+        with self._lock:
+            providers = dict(self._providers)
+
+        snapshot = {}
+        for name, provider in providers.items():
+            try:
+                snapshot[name] = provider()
+            except Exception as e:
+                logger.error(f"Metrics provider '{name}' failed: {e}")
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+
+metrics = MetricsRegistry()
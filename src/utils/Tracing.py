@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from src.utils.Metrics import Histogram, metrics
+
+TOKEN_BUCKETS = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+
+
+class Trace:
+    """
+    Span timings and LLM token counts collected while one request is handled.
+    Spans are flat (`name`, `start_ms` relative to the request start, `duration_ms`, attributes);
+    concurrent stages simply overlap.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.llm_calls: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, ended: float, attrs: Dict):
+        span = {"name": name, "start_ms": round((started - self.started) * 1000, 2), "duration_ms": round((ended - started) * 1000, 2)}
+        if attrs:
+            span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def add_llm_call(self, call: Dict):
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def stages(self) -> Dict[str, float]:
+        """Total milliseconds per span name."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = round(totals.get(span["name"], 0.0) + span["duration_ms"], 2)
+        return totals
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            calls = list(self.llm_calls)
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        tokens = {
+            "llm_calls": len(calls),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "prompt_eval_ms": round(sum(c["prompt_eval_ms"] for c in calls), 2),
+            "eval_ms": round(sum(c["eval_ms"] for c in calls), 2),
+            # calls another identical request made and this one shared (single-flight)
+            "coalesced_calls": sum(1 for c in calls if c.get("coalesced")),
+        }
+        return {"stages": self.stages(), "tokens": tokens, "spans": spans, "llm": calls}
+
+
+class StageMetrics:
+    """Process-wide per-stage latency histograms and LLM token histograms, exposed at /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_ms: Dict[str, Histogram] = {}
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.prompt_eval_ms = Histogram()
+        self.eval_ms = Histogram()
+        self.tokens_per_second = Histogram([1, 2, 5, 10, 20, 50, 100, 200, 500])
+
+    def observe_stage(self, name: str, ms: float):
+        with self._lock:
+            histogram = self.stage_ms.get(name)
+            if histogram is None:
+                histogram = self.stage_ms[name] = Histogram()
+        histogram.observe(ms)
+
+    def observe_llm(self, call: Dict):
+        self.prompt_tokens.observe(call["prompt_tokens"])
+        self.completion_tokens.observe(call["completion_tokens"])
+        self.prompt_eval_ms.observe(call["prompt_eval_ms"])
+        self.eval_ms.observe(call["eval_ms"])
+        if call["eval_ms"]:
+            self.tokens_per_second.observe(call["completion_tokens"] / (call["eval_ms"] / 1000))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stages = dict(self.stage_ms)
+        return {
+            "stage_ms": {name: histogram.snapshot() for name, histogram in sorted(stages.items())},
+            "llm": {
+                "prompt_tokens": self.prompt_tokens.snapshot(),
+                "completion_tokens": self.completion_tokens.snapshot(),
+                "prompt_eval_ms": self.prompt_eval_ms.snapshot(),
+                "eval_ms": self.eval_ms.snapshot(),
+                "tokens_per_second": self.tokens_per_second.snapshot(),
+            },
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("request_trace", default=None)
+stage_metrics = StageMetrics()
+metrics.register("pipeline", stage_metrics.stats)
+
+
+def start_trace() -> Trace:
+    """Starts collecting spans for the current request (and the tasks and executor jobs it spawns)."""
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the enclosed block into the per-stage histogram and, inside a request, its trace."""
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        ended = time.perf_counter()
+        stage_metrics.observe_stage(name, (ended - started) * 1000)
+        trace = _current.get()
+        if trace is not None:
+            trace.add_span(name, started, ended, attrs)
+
+
+def record_llm_call(model: str, response, host: Optional[str] = None):
+    """Books the token counts and durations of a finished Ollama chat (the final chunk, when streaming)."""
+    call = {
+        "model": model,
+        "prompt_tokens": response.get("prompt_eval_count") or 0,
+        "completion_tokens": response.get("eval_count") or 0,
+        "prompt_eval_ms": round((response.get("prompt_eval_duration") or 0) / 1e6, 2),
+        "eval_ms": round((response.get("eval_duration") or 0) / 1e6, 2),
+        "load_ms": round((response.get("load_duration") or 0) / 1e6, 2),
+        "total_ms": round((response.get("total_duration") or 0) / 1e6, 2),
+    }
+    if host:
+        call["host"] = host
+    stage_metrics.observe_llm(call)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_llm_call(call)
+    return call
+
+
+def record_coalesced_llm_call(call: Dict):
+    """
+    Books an LLM call led by another request (single-flight) in the current trace, marked
+    `coalesced`. The process-wide histograms already counted it when the leader recorded it.
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.add_llm_call(dict(call, coalesced=True))
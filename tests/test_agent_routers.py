@@ -0,0 +1,23 @@
+import importlib
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+agent_routers = importlib.import_module("routers.agent_routers")
+
+
+def make_client():
+    app = FastAPI()
+    app.include_router(agent_routers.router)
+    return TestClient(app)
+
+
+def test_nested_filters_are_rejected_with_400():
+    client = make_client()
+    bad = '{"brand": {"$ne": "acme"}}'
+
+    response = client.post("/agent/ask", data={"query": "fees?", "filters": bad})
+    assert response.status_code == 400 and "brand" in response.json()["detail"]
+    assert client.post("/agent/ask/stream", data={"query": "fees?", "filters": '[["uae"]]'}).status_code == 400
+    response = client.post("/agent/ask/batch", json={"queries": ["fees?"], "filters": {"region": [{"a": 1}]}})
+    assert response.status_code == 400 and "region" in response.json()["detail"]
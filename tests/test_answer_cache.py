@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.services.answer_cache import SemanticAnswerCache
+
+
+def test_similar_query_hits_and_reports_saved_latency():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=4)
+    cache.store([1.0, 0.0, 0.0], "A franchise fee is ...", generation_seconds=2.5, version=cache.version)
+
+    assert cache.lookup([0.99, 0.05, 0.0]) == "A franchise fee is ..."
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["latency_saved_seconds"] == 2.5
+
+
+def test_invalidate_drops_entries_and_rejects_stale_writes():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=4)
+    version = cache.version
+    cache.store(np.ones(3), "old answer", generation_seconds=1.0, version=version)
+
+    cache.invalidate()
+    assert cache.lookup(np.ones(3)) is None
+
+    # An answer generated before the collection changed must not be stored
+    cache.store(np.ones(3), "stale answer", generation_seconds=1.0, version=version)
+    assert cache.lookup(np.ones(3)) is None
@@ -0,0 +1,97 @@
+import threading
+import uuid
+
+import chromadb
+import numpy as np
+
+from src.services.lexical_index import BM25Index
+from src.services.metadata_index import MetadataIndex
+from src.services.vector_store_service import VectorStoreService
+
+TOPICS = ["royalty fee", "territory rights", "franchise agreement", "brand expansion", "marketing fund"]
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.queries = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        return self._collection.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+def _vector(text):
+    vector = np.array([1.0 if topic.split()[0] in text else 0.0 for topic in TOPICS] + [0.1], dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def make_store():
+    collection = chromadb.EphemeralClient().create_collection(f"batch_{uuid.uuid4().hex}", embedding_function=None)
+    ids = [f"doc-{i}" for i in range(10)]
+    docs = [f"{TOPICS[i % 5]} clause number {i}" for i in range(10)]
+    metadatas = [{"brand": "acme" if i < 5 else "zest"} for i in range(10)]
+    collection.add(ids=ids, documents=docs, metadatas=metadatas, embeddings=[_vector(d).tolist() for d in docs])
+
+    store = VectorStoreService.__new__(VectorStoreService)
+    store.collection = CountingCollection(collection)
+    store.quantized_index = None
+    store.lexical_shortcuts = 0
+    store.metadata_index = MetadataIndex()
+    store.metadata_index.add(ids, metadatas)
+    store.lexical_index = BM25Index()
+    store.lexical_index.add(ids, docs)
+    store.embedded = []
+    store.embed_queries = lambda texts: store.embedded.append(list(texts)) or np.stack([_vector(t) for t in texts])
+    return store
+
+
+def test_batch_search_matches_single_queries_with_one_query_call():
+    store = make_store()
+    queries = ["royalty fee due", "territory question", "marketing fund size"]
+    singles = [store.search_vectors(q, top_k=3) for q in queries]
+    store.collection.queries, store.embedded = 0, []
+
+    batch = store.search_vectors_batch(queries, top_k=3)
+    assert [[d["id"] for d in r] for r in batch] == [[d["id"] for d in r] for r in singles]
+    assert store.collection.queries == 1
+    assert store.embedded == [queries]
+
+
+def test_batch_search_applies_filters_to_every_query():
+    store = make_store()
+    batch = store.search_vectors_batch(["royalty fee", "territory"], top_k=3, filters={"brand": "zest"})
+    assert all(d["metadata"]["brand"] == "zest" for results in batch for d in results)
+    assert store.search_vectors_batch(["royalty"], filters={"brand": "nobody"}) == [[]]
+
+
+def test_hybrid_batch_matches_single_hybrid_search():
+    store = make_store()
+    queries = ["royalty fee clause", "brand expansion plans", "unrelated words"]
+    singles = [[d["id"] for d in store.hybrid_search(q, top_k=3)] for q in queries]
+    store.collection.queries = 0
+
+    batch = store.hybrid_search_batch(queries, top_k=3)
+    assert [[d["id"] for d in r] for r in batch] == singles
+    assert store.collection.queries <= 1
+
+
+def test_lexical_index_saves_are_debounced_until_flush():
+    store = make_store()
+    store._change_listeners = []
+    store._save_lock = threading.Lock()
+    store._save_timer = None
+    saves = []
+    store.lexical_index.save = lambda: saves.append(1)
+
+    store.delete_vector("doc-0")
+    store.delete_vectors(["doc-1", "doc-2"])
+    assert saves == []  # still pending
+
+    store.flush_lexical_index()
+    store.flush_lexical_index()  # nothing left to write
+    assert saves == [1]
+    assert "doc-1" not in dict(store.lexical_index.search("clause", top_k=10))
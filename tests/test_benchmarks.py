@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+
+from benchmarks.__main__ import ask_succeeded
+from benchmarks.harness import compare, percentile, run_level
+
+
+def _result(scenario, concurrency, p95, throughput, errors=0):
+    return {"scenario": scenario, "concurrency": concurrency, "errors": errors, "throughput_rps": throughput,
+            "latency_ms": {"p50": p95 / 2, "p95": p95, "p99": p95}}
+
+
+def test_percentile_interpolates_between_ranks():
+    samples = [float(v) for v in range(1, 101)]
+    assert percentile(samples, 0.5) == 50.5
+    assert percentile(samples, 0.99) == 99.01
+    assert percentile([7.0], 0.95) == 7.0
+    assert percentile([], 0.5) is None
+
+
+def test_run_level_counts_errors_and_only_times_successes():
+    def handler(request):
+        return httpx.Response(500 if request.url.params["n"] == "3" else 200, json={})
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://bench") as client:
+            return await run_level(client, lambda c, n: c.get("/", params={"n": n}), concurrency=4, requests=10)
+
+    level = asyncio.run(scenario())
+    assert (level["ok"], level["errors"]) == (9, 1)
+    assert level["status_codes"] == {"200": 9, "500": 1}
+    assert level["latency_ms"]["p50"] is not None and level["throughput_rps"] > 0
+
+
+def test_ask_errors_reported_with_status_200_count_as_failures():
+    def handler(request):
+        n = int(request.url.params["n"])
+        body = [{"error": "Ollama unavailable"}, 500] if n % 5 == 0 else {"answer": "ok"}
+        return httpx.Response(200, json=body)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://bench") as client:
+            return await run_level(client, lambda c, n: c.post("/agent/ask", params={"n": n}), concurrency=2,
+                                   requests=10, succeeded=ask_succeeded)
+
+    level = asyncio.run(scenario())
+    assert (level["ok"], level["errors"]) == (8, 2)
+    assert level["status_codes"] == {"200": 10}
+    assert level["failures"] == {"error_body": 2}
+
+
+def test_compare_flags_latency_throughput_and_error_regressions():
+    baseline = {"results": [_result("ask", 1, 100, 10), _result("ask", 8, 200, 40), _result("login", 1, 10, 100)]}
+    current = {"results": [_result("ask", 1, 110, 9.5), _result("ask", 8, 300, 30), _result("login", 1, 10, 100, errors=2),
+                           _result("list-vectors", 1, 5, 200)]}
+
+    rows = {(r["scenario"], r["concurrency"]): r for r in compare(baseline, current, tolerance=0.15)}
+    assert rows[("ask", 1)]["regressions"] == []
+    assert rows[("ask", 8)]["regressions"] == ["p95", "p99", "throughput_rps"]
+    assert rows[("login", 1)]["regressions"] == ["errors"]
+    assert ("list-vectors", 1) not in rows  # no baseline to compare against
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from src.services.concurrency import ConcurrencyLimiter, ServiceOverloaded
+
+
+def test_full_queue_is_rejected_immediately_with_retry_after():
+    limiter = ConcurrencyLimiter("test", max_in_flight=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter.is_saturated()
+        with pytest.raises(ServiceOverloaded) as rejected:
+            await limiter.acquire()
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    stats = limiter.stats()
+    assert stats["rejected_queue_full"] == 1 and stats["admitted"] == 2
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+
+
+def test_queue_wait_times_out():
+    limiter = ConcurrencyLimiter("test", max_in_flight=1, max_queue=4, queue_timeout=0.05)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(ServiceOverloaded):
+            await limiter.acquire()
+        limiter.release()
+        await limiter.acquire()  # the timed-out waiter left no stale state behind
+        limiter.release()
+
+    asyncio.run(scenario())
+    assert limiter.stats()["rejected_timeout"] == 1 and limiter.stats()["in_flight"] == 0
+
+
+def test_in_flight_never_exceeds_limit_and_order_is_fifo():
+    limiter = ConcurrencyLimiter("test", max_in_flight=2, max_queue=10, queue_timeout=5)
+    running, peak, order = 0, 0, []
+
+    async def job(i):
+        nonlocal running, peak
+        async with limiter.slot():
+            running += 1
+            peak = max(peak, running)
+            order.append(i)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(job(i) for i in range(8)))
+
+    asyncio.run(scenario())
+    assert peak == 2 and order == list(range(8))
@@ -0,0 +1,52 @@
+import time
+
+from src.services.context_assembler import ContextAssembler, count_tokens, split_passages
+
+
+def test_dedupes_repeated_and_overlapping_chunks():
+    assembler = ContextAssembler("test-model")
+    overlap = "the franchisee pays a monthly royalty"
+    passages = [
+        {"text": f"The initial fee covers training and {overlap}", "score": 1.0},
+        {"text": f"{overlap} of six percent of gross sales", "score": 0.5},
+        {"text": "The initial fee covers training", "score": 0.3},
+    ]
+    kept = assembler.assemble("what is the royalty", passages)["passages"]
+    assert [p["text"] for p in kept] == [passages[0]["text"], "of six percent of gross sales"]
+
+
+def test_budget_drops_low_scoring_passages_and_old_history():
+    assembler = ContextAssembler("test-model")
+    assembler.budget_for = lambda model=None: 200
+    passages = [{"text": f"passage {i} " + "word " * 60, "score": 1.0 / (i + 1)} for i in range(5)]
+    history = [{"sender": "user", "content": "turn " * 40} for _ in range(4)]
+
+    result = assembler.assemble("what is the fee", passages, history)
+
+    assert result["tokens_used"] <= 200
+    assert result["tokens_saved"] > 0
+    assert result["passages"][0]["text"].startswith("passage 0")
+    assert len(result["history"]) < len(history)
+
+
+def test_split_passages_respects_size():
+    text = "\n\n".join("sentence number %d is here." % i for i in range(100))
+    parts = split_passages(text, max_tokens=50)
+    assert len(parts) > 1
+    assert all(count_tokens(part) <= 60 for part in parts)
+
+
+def test_large_upload_assembles_quickly():
+    assembler = ContextAssembler("test-model")
+    words = [f"clause{i} covers royalty terms and territory rights." for i in range(6000)]
+    text = "\n\n".join(" ".join(words[i:i + 5]) for i in range(0, len(words), 5))
+    assert len(text) > 250_000
+    passages = [{"text": part, "score": 0.5} for part in split_passages(text)]
+    passages += [dict(p) for p in passages]  # every passage uploaded twice
+
+    started = time.perf_counter()
+    result = assembler.assemble("royalty terms", passages)
+    assert time.perf_counter() - started < 1.0
+    assert result["tokens_used"] <= assembler.budget_for()
+    texts = [p["text"] for p in result["passages"]]
+    assert len(texts) == len(set(texts))
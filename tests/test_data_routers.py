@@ -0,0 +1,63 @@
+import importlib
+import json
+import uuid
+
+import chromadb
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+data_routers = importlib.import_module("routers.data_routers")
+from src.services.vector_store_service import VectorStoreService
+
+
+class FakeStore:
+    def __init__(self, n):
+        self.collection = chromadb.EphemeralClient().create_collection(f"list_vectors_{uuid.uuid4().hex}", embedding_function=None)
+        self.collection.add(
+            ids=[f"doc-{i:03d}" for i in range(n)],
+            documents=[f"text {i}" for i in range(n)],
+            metadatas=[{"source": f"file{i % 3}.txt"} for i in range(n)],
+            embeddings=[[float(i), 1.0] for i in range(n)],
+        )
+
+    iter_collection = VectorStoreService.iter_collection
+
+
+def make_client(monkeypatch, n=25):
+    store = FakeStore(n)
+    monkeypatch.setattr(data_routers, "get_vector_store_service", lambda: store)
+    app = FastAPI()
+    app.include_router(data_routers.router)
+    return TestClient(app)
+
+
+def test_pages_follow_cursor_and_respect_cap(monkeypatch):
+    monkeypatch.setattr(data_routers, "LIST_VECTORS_MAX_PAGE_SIZE", 10)
+    client = make_client(monkeypatch)
+
+    seen, cursor = [], 0
+    while cursor is not None:
+        body = client.get("/data/list-vectors", params={"limit": 1000, "cursor": cursor}).json()
+        assert body["limit"] == 10 and body["total"] == 25
+        seen += [row["id"] for row in body["documents"]]
+        cursor = body["next_cursor"]
+    assert len(seen) == len(set(seen)) == 25
+
+
+def test_field_selection(monkeypatch):
+    client = make_client(monkeypatch)
+    rows = client.get("/data/list-vectors", params={"fields": "ids"}).json()["documents"]
+    assert set(rows[0]) == {"id"}
+    rows = client.get("/data/list-vectors", params={"fields": "metadata"}).json()["documents"]
+    assert set(rows[0]) == {"id", "metadata"}
+    assert client.get("/data/list-vectors", params={"fields": "embeddings"}).status_code == 400
+
+
+def test_ndjson_export_streams_everything(monkeypatch):
+    monkeypatch.setattr(data_routers, "LIST_VECTORS_EXPORT_PAGE_SIZE", 7)
+    client = make_client(monkeypatch)
+    response = client.get("/data/list-vectors", params={"format": "ndjson", "fields": "ids,documents,metadata"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 25
+    assert rows[0]["metadata"]["source"] == "file0.txt"
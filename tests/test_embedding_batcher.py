@@ -0,0 +1,46 @@
+import threading
+
+import numpy as np
+
+from src.services.embedding_batcher import EmbeddingBatcher
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_one_encode_call():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=64, max_wait_ms=50)
+    results = {}
+
+    def worker(text):
+        results[text] = batcher.encode([text])
+
+    threads = [threading.Thread(target=worker, args=("q" * n,)) for n in range(1, 9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert len(model.calls) < 8
+    for text, vector in results.items():
+        assert vector.shape == (1, 2)
+        assert vector[0][0] == len(text)
+    assert batcher.stats()["items"] == 8
+
+
+def test_encode_after_close_raises():
+    batcher = EmbeddingBatcher(FakeModel(), max_wait_ms=0)
+    batcher.close()
+    try:
+        batcher.encode(["hello"])
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.services.embedding_cache import EmbeddingCache, normalize_text
+
+
+def test_normalize_text_folds_case_space_and_punctuation():
+    assert normalize_text("  What is a   Franchise fee? ") == "what is a franchise fee"
+
+
+def test_encode_only_calls_encoder_for_misses():
+    cache = EmbeddingCache(max_bytes=1024)
+    calls = []
+
+    def encoder(texts):
+        calls.append(list(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    cache.encode(["what is a franchise fee"], encoder)
+    vectors = cache.encode(["What is a franchise fee?", "royalty"], encoder)
+
+    assert calls == [["what is a franchise fee"], ["royalty"]]
+    assert vectors.shape == (2, 4) and vectors.dtype == np.float32
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction_respects_memory_cap():
+    cache = EmbeddingCache(max_bytes=2 * 4 * 4)  # room for two 4-dim vectors
+    cache.put("a", np.zeros(4))
+    cache.put("b", np.ones(4))
+    cache.get("a")  # "b" is now least recently used
+    cache.put("c", np.full(4, 2.0))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = EmbeddingCache(max_bytes=1024, ttl_seconds=-1)
+    cache.put("a", np.zeros(4))
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
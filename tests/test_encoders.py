@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from src.services.encoders import OnnxEncoder, load_encoder, pool, quantize_torch
+
+WORDS = "what is the royalty fee for a franchise territory agreement brand expansion".split()
+TEXTS = ["what is the royalty fee", "franchise territory agreement", "brand expansion", "fee"]
+
+
+@pytest.fixture(scope="module")
+def tiny_model_dir(tmp_path_factory):
+    """A small random BERT + mean pooling + normalize SentenceTransformer, saved locally."""
+    torch = pytest.importorskip("torch")
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    base = tmp_path_factory.mktemp("tiny_bert")
+    (base / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    BertTokenizerFast(vocab_file=str(base / "vocab.txt")).save_pretrained(base)
+    torch.manual_seed(0)
+    BertModel(BertConfig(vocab_size=len(WORDS) + 5, hidden_size=32, num_hidden_layers=2,
+                         num_attention_heads=2, intermediate_size=64)).save_pretrained(base)
+
+    model = SentenceTransformer(modules=[models.Transformer(str(base)), models.Pooling(32), models.Normalize()], device="cpu")
+    target = tmp_path_factory.mktemp("tiny_st")
+    model.save(str(target))
+    return str(target)
+
+
+def cosine(a, b):
+    return (a * b).sum(1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def test_mean_pool_ignores_padding():
+    hidden = np.array([[[1.0, 1.0], [3.0, 3.0], [100.0, 100.0]]])
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool(hidden, mask, "mean"), [[2.0, 2.0]])
+    assert np.allclose(pool(hidden, mask, "max"), [[3.0, 3.0]])
+    assert np.allclose(pool(hidden, mask, "cls"), [[1.0, 1.0]])
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        load_encoder("all-MiniLM-L6-v2", backend="tensorrt")
+
+
+def test_torch_int8_matches_fp32(tiny_model_dir):
+    reference = load_encoder(tiny_model_dir, "torch")
+    quantized = quantize_torch(load_encoder(tiny_model_dir, "torch"))
+    assert cosine(reference.encode(TEXTS), quantized.encode(TEXTS)).min() > 0.98
+
+
+def test_onnx_matches_fp32(tiny_model_dir, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    reference = load_encoder(tiny_model_dir, "torch").encode(TEXTS)
+    encoder = OnnxEncoder(tiny_model_dir, export_dir=str(tmp_path))
+    vectors = encoder.encode(TEXTS, batch_size=3)
+    assert vectors.shape == reference.shape
+    assert cosine(reference, vectors).min() > 0.9999
+    assert np.allclose(encoder.encode(TEXTS[0]), vectors[0], atol=1e-5)
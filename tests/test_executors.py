@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.services.executors import BoundedExecutor, ExecutorSaturated
+
+
+def test_rejects_beyond_workers_plus_queue():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+    with pytest.raises(ExecutorSaturated):
+        executor.submit(lambda: "rejected")
+
+    release.set()
+    assert running.result(timeout=2) and queued.result(timeout=2) == "queued"
+    stats = executor.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["max_queued"] >= 1
+    assert executor.submit(lambda: 1).result(timeout=2) == 1  # slots are released
+    executor.shutdown()
+
+
+def test_failures_are_counted_and_propagated():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(lambda: 1 / 0).result(timeout=2)
+    assert executor.stats()["failed"] == 1
+    executor.shutdown()
+
+
+def test_blocking_call_does_not_stall_event_loop():
+    executor = BoundedExecutor("test", max_workers=2, max_queue=0)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await executor.run(time.sleep, 0.2)
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(scenario())
+    assert result is None and ticks >= 5
+    executor.shutdown()
+
+
+def test_iterate_streams_items_and_errors():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+
+    def produce(n, fail=False):
+        for i in range(n):
+            time.sleep(0.01)
+            yield i
+        if fail:
+            raise ValueError("boom")
+
+    async def collect(**kwargs):
+        return [item async for item in executor.iterate(produce, 3, **kwargs)]
+
+    assert asyncio.run(collect()) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        asyncio.run(collect(fail=True))
+    executor.shutdown()
+
+
+def test_iterate_closed_early_releases_the_worker():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield "tick"
+        finally:
+            closed.set()
+
+    async def first_only():
+        stream = executor.iterate(endless)
+        item = await stream.__anext__()
+        await stream.aclose()
+        return item
+
+    assert asyncio.run(first_only()) == "tick"
+    assert closed.wait(2)
+    deadline = time.monotonic() + 2
+    while executor.stats()["active"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert executor.submit(lambda: "free").result(timeout=2) == "free"
+    executor.shutdown()
+
+
+def test_cancelled_queued_task_releases_its_slot():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "never")
+    assert queued.cancel()
+    assert executor.stats()["queued"] == 0
+    release.set()
+    running.result(timeout=2)
+    assert executor.submit(lambda: "ok").result(timeout=2) == "ok"
+    executor.shutdown()
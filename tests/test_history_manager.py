@@ -0,0 +1,73 @@
+import asyncio
+
+from src.services.context_assembler import count_tokens
+from src.services.history_manager import HistoryManager
+
+
+def _history(n):
+    return [{"sender": "user" if i % 2 == 0 else "bot", "content": f"message number {i} about the franchise"} for i in range(n)]
+
+
+def test_short_history_is_kept_verbatim_without_summarizing():
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append(turns)
+        return "summary"
+
+    manager = HistoryManager(summarize, recent_turns=4)
+
+    async def scenario():
+        result = manager.compact(_history(3))
+        await manager.drain()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["summary"] is None
+    assert len(result["turns"]) == 3
+    assert calls == []
+
+
+def test_older_turns_are_summarized_in_the_background_and_reused():
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append((summary, len(turns)))
+        return f"summary of {len(turns)} turns" if summary is None else f"{summary} + {len(turns)} more"
+
+    manager = HistoryManager(summarize, recent_turns=4, token_ceiling=1000)
+
+    async def scenario():
+        first = manager.compact(_history(10), conversation_id="c1")
+        await manager.drain()
+        second = manager.compact(_history(10), conversation_id="c1")
+        third = manager.compact(_history(12), conversation_id="c1")
+        await manager.drain()
+        fourth = manager.compact(_history(12), conversation_id="c1")
+        return first, second, third, fourth
+
+    first, second, third, fourth = asyncio.run(scenario())
+    # Before the summary exists the older turns stay verbatim
+    assert first["summary"] is None and len(first["turns"]) == 10
+    assert second["summary"] == "summary of 6 turns" and len(second["turns"]) == 4
+    # Stale summary: the two newly aged-out turns are still sent verbatim, then folded in
+    assert third["summary"] == "summary of 6 turns" and len(third["turns"]) == 6
+    assert fourth["summary"] == "summary of 6 turns + 2 more" and len(fourth["turns"]) == 4
+    assert calls == [(None, 6), ("summary of 6 turns", 2)]
+    assert manager.stats()["summaries_built"] == 2
+
+
+def test_history_never_exceeds_the_token_ceiling():
+    async def summarize(summary, turns):
+        raise RuntimeError("model down")
+
+    manager = HistoryManager(summarize, recent_turns=50, token_ceiling=60)
+    history = [{"sender": "user", "content": "word " * 30} for _ in range(5)]
+
+    async def scenario():
+        return manager.compact(history)
+
+    result = asyncio.run(scenario())
+    assert result["tokens"] <= 60
+    assert sum(count_tokens(m["content"]) for m in result["turns"]) == result["tokens"]
+    assert result["turns"][-1]["content"]  # the newest turn is kept, truncated if need be
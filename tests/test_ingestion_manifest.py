@@ -0,0 +1,35 @@
+import os
+
+from src.services.ingestion_manifest import IngestionManifest, make_chunk_ids
+
+
+def test_chunk_ids_are_deterministic_and_unique():
+    ids = make_chunk_ids("faq.txt", ["a", "b", "a"])
+    assert ids == make_chunk_ids("faq.txt", ["a", "b", "a"])
+    assert len(set(ids)) == 3
+    assert ids != make_chunk_ids("other.txt", ["a", "b", "a"])
+
+
+def test_unchanged_files_are_skipped_and_changes_diffed(tmp_path):
+    source = tmp_path / "franchise.txt"
+    source.write_text("one")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    assert manifest.needs_ingest(str(source))
+    first_ids, stale = manifest.diff(str(source), ["a", "b"])
+    assert stale == []
+    manifest.record(str(source), first_ids)
+    manifest.save()
+
+    reloaded = IngestionManifest(str(tmp_path / "manifest.json"))
+    assert not reloaded.needs_ingest(str(source))
+
+    # Same content with a new mtime is still unchanged
+    os.utime(source, (1, 1))
+    assert not reloaded.needs_ingest(str(source))
+
+    source.write_text("two")
+    assert reloaded.needs_ingest(str(source))
+    new_ids, stale = reloaded.diff(str(source), ["a", "c"])
+    assert new_ids[0] == first_ids[0]
+    assert stale == [first_ids[1]]
@@ -0,0 +1,71 @@
+from src.services.lexical_index import BM25Index, reciprocal_rank_fusion
+
+
+def make_index(path=None):
+    index = BM25Index(path)
+    index.add(
+        ["fee", "agreement", "pizza"],
+        ["The initial franchise fee is paid once",
+         "The franchise agreement sets the royalty and territory",
+         "Pizza dough recipes"]
+    )
+    return index
+
+
+def test_search_ranks_exact_terms_first():
+    index = make_index()
+    results = index.search("royalty territory", top_k=2)
+    assert results[0][0] == "agreement"
+    assert index.term_coverage("royalty territory", "agreement") == 1.0
+
+
+def test_remove_and_persist_roundtrip(tmp_path):
+    index = make_index(str(tmp_path / "bm25.npz"))
+    index.remove(["fee"])
+    index.add(["fee"], ["Royalty fee schedule"])
+    index.save()
+
+    loaded = BM25Index(str(tmp_path / "bm25.npz"))
+    assert loaded.load()
+    assert len(loaded) == 3
+    assert [doc_id for doc_id, _ in loaded.search("fee")] == ["fee"]
+
+    loaded.compact()
+    assert loaded.stats()["tombstones"] == 0
+    assert [doc_id for doc_id, _ in loaded.search("pizza")] == ["pizza"]
+
+
+def test_reciprocal_rank_fusion_prefers_ids_ranked_by_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0][0] == "b"
+
+
+def test_removed_documents_no_longer_count_towards_idf(tmp_path):
+    index = make_index(str(tmp_path / "bm25.npz"))
+    index.add(["renewal"], ["The franchise agreement renewal terms"])
+    index.remove(["agreement"])
+
+    fresh = BM25Index()
+    fresh.add(
+        ["fee", "pizza", "renewal"],
+        ["The initial franchise fee is paid once", "Pizza dough recipes", "The franchise agreement renewal terms"]
+    )
+    assert index.search("franchise agreement") == fresh.search("franchise agreement")
+
+    # document frequencies are rebuilt from the live postings on load
+    index.save()
+    loaded = BM25Index(str(tmp_path / "bm25.npz"))
+    assert loaded.load()
+    assert loaded.search("franchise agreement") == fresh.search("franchise agreement")
+    loaded.remove(["renewal"])
+    assert loaded.search("agreement") == []
+
+
+def test_repeated_upserts_are_compacted():
+    index = BM25Index()
+    ids = [f"doc-{i}" for i in range(500)]
+    for round_ in range(5):
+        index.add(ids, [f"franchise clause {i} revision {round_}" for i in range(500)])
+    assert len(index) == 500
+    assert len(index.doc_ids) < 500 / 0.7 + 500
+    assert [doc_id for doc_id, _ in index.search("revision 4", top_k=500)].count("doc-7") == 1
@@ -0,0 +1,53 @@
+from src.services.lexical_index import BM25Index
+from src.services.metadata_index import MetadataIndex, filter_error
+
+
+def build():
+    index = MetadataIndex()
+    index.add(
+        ["a", "b", "c", "d"],
+        [
+            {"brand": "acme", "region": "uae", "doc_type": "fdd"},
+            {"brand": "acme", "region": "ksa", "doc_type": "manual"},
+            {"brand": "globex", "region": "uae", "doc_type": "fdd"},
+            None,
+        ],
+    )
+    return index
+
+
+def test_match_ands_keys_and_ors_list_values():
+    index = build()
+    assert index.match({"brand": "acme"}) == {"a", "b"}
+    assert index.match({"brand": "acme", "region": "uae"}) == {"a"}
+    assert index.match({"region": ["uae", "ksa"], "doc_type": "fdd"}) == {"a", "c"}
+    assert index.match({"brand": "initech"}) == set()
+
+
+def test_updates_and_removals_keep_postings_exact():
+    index = build()
+    index.add(["a"], [{"brand": "globex", "region": "uae"}])
+    assert index.match({"brand": "acme"}) == {"b"}
+    index.remove(["c", "missing"])
+    assert index.match({"brand": "globex"}) == {"a"}
+    assert index.stats()["documents"] == 3
+
+
+def test_to_where():
+    assert MetadataIndex.to_where({"brand": "acme"}) == {"brand": "acme"}
+    assert MetadataIndex.to_where({"brand": "acme", "region": ["uae", "ksa"]}) == {
+        "$and": [{"brand": "acme"}, {"region": {"$in": ["uae", "ksa"]}}]
+    }
+
+
+def test_bm25_search_restricted_to_allowed_ids():
+    bm25 = BM25Index()
+    bm25.add(["a", "b", "c"], ["royalty fee schedule", "royalty fee for acme", "territory rights"])
+    assert [doc_id for doc_id, _ in bm25.search("royalty fee", 5, allowed={"b", "c"})] == ["b"]
+
+
+def test_filter_error_rejects_nested_values():
+    assert filter_error({"brand": "acme", "region": ["uae", "ksa"], "year": 2024, "active": True}) is None
+    assert "brand" in filter_error({"brand": {"$ne": "acme"}})
+    assert "region" in filter_error({"region": [["uae"]]})
+    assert filter_error(["acme"]) == "filters must be a JSON object"
@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import ollama
+import pytest
+
+from src.services import ollama_pool
+from src.services.concurrency import ServiceOverloaded
+from src.services.ollama_pool import CLOSED, OPEN, OllamaPool
+from benchmarks.fake_ollama import FakeOllama
+
+REQUEST = {"model": "test-model", "messages": [{"role": "user", "content": "hi"}], "options": {}, "keep_alive": "5m"}
+
+
+def _stream_text(pool):
+    async def collect():
+        return "".join([chunk["message"]["content"] async for chunk in pool.stream(dict(REQUEST))])
+    return asyncio.run(collect())
+
+
+def test_calls_prefer_the_faster_host():
+    with FakeOllama(delay=0.08) as slow, FakeOllama() as fast:
+        pool = OllamaPool([slow.url, fast.url])
+
+        async def scenario():
+            for _ in range(10):
+                await pool.chat(dict(REQUEST))
+
+        asyncio.run(scenario())
+        assert fast.chats >= 8
+        assert pool.hosts[1].ewma_ms < pool.hosts[0].ewma_ms
+
+
+def test_failing_host_is_ejected_and_recovers_after_cooldown(monkeypatch):
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BREAKER_COOLDOWN_SECONDS", 0.3)
+    with FakeOllama() as broken, FakeOllama(delay=0.02) as healthy:
+        broken.fail = True
+        pool = OllamaPool([broken.url, healthy.url])
+        bad, good = pool.hosts
+
+        async def calls(n):
+            return [(await pool.chat(dict(REQUEST)))["message"]["content"] for _ in range(n)]
+
+        # Every call still succeeds: the broken host's errors are retried on the healthy one
+        assert asyncio.run(calls(6)) == ["hello from fake"] * 6
+        assert bad.state == OPEN and broken.chats == 2
+        assert pool.stats()["retries"] == 2
+
+        broken.fail = False
+        time.sleep(0.35)
+        bad.ewma_ms, good.ewma_ms = 0.0, 50.0  # make the recovered host the preferred one
+        asyncio.run(calls(1))
+        assert bad.state == CLOSED and broken.chats == 3
+
+
+def test_host_without_the_model_is_skipped():
+    with FakeOllama(models=["other:latest"]) as missing, FakeOllama() as serving:
+        pool = OllamaPool([missing.url, serving.url])
+        response = pool.chat_sync(dict(REQUEST))
+        assert response["message"]["content"] == "hello from fake"
+        assert pool.hosts[0].has_model("test-model") is False
+        assert pool.hosts[0].state == CLOSED  # a missing model says nothing about the host's health
+
+        pool.chat_sync(dict(REQUEST))
+        assert missing.chats <= 1
+
+
+def test_stream_fails_over_before_the_first_token():
+    with FakeOllama() as broken, FakeOllama(reply="streamed answer") as healthy:
+        broken.fail = True
+        pool = OllamaPool([broken.url, healthy.url])
+        assert _stream_text(pool) == "streamed answer "
+        assert "".join(c["message"]["content"] for c in pool.stream_sync(dict(REQUEST))) == "streamed answer "
+
+
+def test_all_hosts_failing_raises_and_open_circuits_shed_load(monkeypatch):
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BREAKER_FAILURES", 1)
+    with FakeOllama() as first, FakeOllama() as second:
+        first.fail = second.fail = True
+        pool = OllamaPool([first.url, second.url])
+        with pytest.raises(ollama.ResponseError):
+            pool.chat_sync(dict(REQUEST))
+        assert first.chats == second.chats == 1
+
+        # Both circuits are open now: the pool sheds the call without touching the hosts
+        assert pool.is_saturated()
+        with pytest.raises(ServiceOverloaded):
+            pool.chat_sync(dict(REQUEST))
+        assert first.chats == second.chats == 1
+
+
+def test_interrupted_sync_trial_call_frees_the_half_open_slot(monkeypatch):
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BREAKER_FAILURES", 1)
+    monkeypatch.setattr(ollama_pool, "OLLAMA_BREAKER_COOLDOWN_SECONDS", 0.1)
+    with FakeOllama() as server:
+        server.fail = True
+        pool = OllamaPool([server.url])
+        host = pool.hosts[0]
+        with pytest.raises(ollama.ResponseError):
+            pool.chat_sync(dict(REQUEST))
+        assert host.state == OPEN
+
+        server.fail = False
+        time.sleep(0.15)
+        real_client = host.sync_client()
+
+        class Interrupted:
+            def chat(self, **kwargs):
+                raise KeyboardInterrupt
+
+        monkeypatch.setattr(host, "sync_client", lambda: Interrupted())
+        with pytest.raises(KeyboardInterrupt):
+            pool.chat_sync(dict(REQUEST))
+
+        # The aborted trial must not keep the half-open slot: the next call is the new trial
+        monkeypatch.setattr(host, "sync_client", lambda: real_client)
+        assert pool.chat_sync(dict(REQUEST))["message"]["content"] == "hello from fake"
+        assert host.state == CLOSED
+
+
+def test_client_of_a_previous_event_loop_is_closed():
+    def connected(sock):
+        try:
+            sock.getpeername()
+            return True
+        except OSError:
+            return False
+
+    with FakeOllama() as fake:
+        pool = OllamaPool([fake.url])
+        host = pool.hosts[0]
+        asyncio.run(pool.chat(dict(REQUEST)))
+        first = host._async_client
+        assert first.sockets and all(connected(s) for s in first.sockets)
+        sockets = list(first.sockets)
+
+        asyncio.run(pool.chat(dict(REQUEST)))  # new loop: the stale client's connections are shut down
+        assert host._async_client is not first
+        assert not any(connected(s) for s in sockets)
+
+        current = list(host._async_client.sockets)
+        host.close()  # registry shutdown
+        assert host._async_client is None and not any(connected(s) for s in current)
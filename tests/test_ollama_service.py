@@ -0,0 +1,81 @@
+import asyncio
+
+from src.services.ollama_service import OLLAMA_KEEP_ALIVE, OllamaService, PromptEvalStats, to_messages
+from src.services.single_flight import SingleFlight
+from src.utils.Tracing import start_trace
+
+
+def test_to_messages_wraps_plain_prompts_only():
+    assert to_messages("hi") == [{"role": "user", "content": "hi"}]
+    messages = [{"role": "system", "content": "persona"}, {"role": "user", "content": "hi"}]
+    assert to_messages(messages) == messages
+
+
+def test_chat_request_is_identical_across_calls():
+    service = OllamaService(model="test-model")
+    first = service._chat_request(to_messages("one"))
+    second = service._chat_request(to_messages("two"))
+    assert first["keep_alive"] == second["keep_alive"] == OLLAMA_KEEP_ALIVE
+    assert first["options"] == second["options"]
+    assert service._chat_request([], {"temperature": 0.0})["options"]["temperature"] == 0.0
+
+
+def test_prompt_eval_stats_counts_reused_prefix():
+    stats = PromptEvalStats()
+    messages = [{"role": "system", "content": "persona " * 30}, {"role": "user", "content": "question"}]
+    cold = stats.observe(messages, {"prompt_eval_count": 50, "prompt_eval_duration": 100_000_000})
+    warm = stats.observe(messages, {"prompt_eval_count": 5, "prompt_eval_duration": 10_000_000})
+
+    assert cold["reused_tokens"] == 0
+    assert warm["reused_tokens"] == warm["prompt_tokens"] - 5
+    assert warm["saved_ms"] > 0
+    snapshot = stats.stats()
+    assert snapshot["calls"] == 2
+    assert snapshot["evaluated_tokens"] == 55
+    assert snapshot["prefill_saved_ms"] > 0
+
+
+class SlowPool:
+    """Answers every chat after a short delay, so identical concurrent requests overlap."""
+
+    def __init__(self):
+        self.calls = 0
+        self.done = {"done": True, "message": {"content": ""}, "prompt_eval_count": 30, "eval_count": 5}
+
+    async def chat(self, request):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return dict(self.done, message={"content": "answer"})
+
+    async def stream(self, request):
+        self.calls += 1
+        for piece in ("ans", "wer"):
+            await asyncio.sleep(0.02)
+            yield {"message": {"content": piece}}
+        yield self.done
+
+
+def test_coalesced_requests_book_the_shared_llm_call_in_their_own_trace():
+    service = OllamaService(model="test-model")
+    service.pool, service.single_flight = SlowPool(), SingleFlight()
+
+    async def request(call):
+        trace = start_trace()
+        return await call(), trace.to_dict()
+
+    async def stream():
+        return "".join([piece async for piece in service.astream_answer("same question")])
+
+    async def scenario():
+        answers = await asyncio.gather(*(request(lambda: service.agenerate_answer("same question")) for _ in range(3)))
+        streams = await asyncio.gather(*(request(stream) for _ in range(3)))
+        return answers + streams
+
+    results = asyncio.run(scenario())
+    assert service.pool.calls == 2
+    for answer, trace in results:
+        assert answer == "answer"
+        assert trace["tokens"]["llm_calls"] == 1 and trace["tokens"]["prompt_tokens"] == 30
+    for batch in (results[:3], results[3:]):
+        assert sorted(trace["tokens"]["coalesced_calls"] for _, trace in batch) == [0, 1, 1]
+
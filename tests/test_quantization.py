@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.services.quantization import QuantizedVectorIndex, evaluate_quantization
+
+
+def clustered_vectors(n=600, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((12, dim))
+    return (centers[rng.integers(0, 12, n)] + 0.2 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def test_int8_index_finds_nearest_and_supports_removal():
+    vectors = clustered_vectors()
+    index = QuantizedVectorIndex("int8")
+    index.add([str(i) for i in range(len(vectors))], vectors)
+
+    assert index.search(vectors[10], top_k=1)[0][0] == "10"
+    index.remove(["10"])
+    assert "10" not in [doc_id for doc_id, _ in index.search(vectors[10], top_k=5)]
+    assert index.stats()["bytes_per_vector"] < vectors.shape[1] * 4
+
+
+def test_rescoring_recovers_recall():
+    vectors = clustered_vectors()
+    report = evaluate_quantization(vectors, vectors[:20] + 0.01, top_k=5, modes=("int8", "pq"))
+    assert report["int8"]["recall_rescored"] >= 0.95
+    assert report["pq"]["recall_rescored"] >= report["pq"]["recall"]
+    assert report["pq"]["compression"] > report["int8"]["compression"]
@@ -0,0 +1,19 @@
+from src.services.query_heuristics import is_self_contained, near_identical
+
+
+def test_self_contained_questions():
+    assert is_self_contained("What is the royalty fee for a coffee franchise in Dubai?")
+    assert is_self_contained("How long does a franchise agreement usually last")
+
+
+def test_follow_ups_need_rephrasing():
+    assert not is_self_contained("How much does it cost?")
+    assert not is_self_contained("What about Saudi Arabia?")
+    assert not is_self_contained("and the territory rules for those brands")
+    assert not is_self_contained("Why?")  # too few terms to search with
+
+
+def test_near_identical():
+    assert near_identical("royalty fee for coffee franchise", "What is the royalty fee for a coffee franchise?")
+    assert not near_identical("royalty fee for coffee franchise", "territory rights for a burger franchise")
+    assert near_identical("", "  ")
@@ -0,0 +1,60 @@
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+
+import src.models.RAGModel as rag_module
+from src.models.RAGModel import INDEX_TYPES, RAGModel
+
+DIM = 16
+
+
+class HashEmbedder:
+    """Deterministic random vector per text, so a chunk's own text retrieves it."""
+
+    def encode(self, texts, convert_to_numpy=True):
+        return np.stack([
+            np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM).astype(np.float32) for text in texts
+        ])
+
+
+class FakeRAGModel(RAGModel):
+    embedder = HashEmbedder()
+
+
+@pytest.fixture(autouse=True)
+def small_quantizers(monkeypatch):
+    # Keep the training thresholds (39 vectors per centroid) small enough for a unit test
+    monkeypatch.setattr(rag_module, "RAG_IVF_NLIST", 4)
+    monkeypatch.setattr(rag_module, "PQ_CENTROIDS", 16)
+
+
+def chunks(start, stop):
+    texts = [f"chunk {i}" for i in range(start, stop)]
+    return texts, [f"id-{i}" for i in range(start, stop)]
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_add_search_and_remove_for_every_index_type(tmp_path, index_type):
+    rag = FakeRAGModel(vector_db_path=str(tmp_path / "vector.index"), index_type=index_type)
+
+    # A single chunk on an empty index must not try to train a quantizer
+    assert rag.add_chunks(*chunks(0, 1)) == 1
+    assert rag.retrieve("chunk 0", top_k=1) == ["chunk 0"]
+
+    # Growing past the training threshold retrains into the configured type
+    rag.add_chunks(*chunks(1, 800))
+    base = faiss.downcast_index(rag.index.index)
+    expected = {"flat": faiss.IndexFlat, "ivf": faiss.IndexIVFFlat, "hnsw": faiss.IndexHNSWFlat,
+                "ivfpq": faiss.IndexIVFPQ, "sq8": faiss.IndexScalarQuantizer, "pq": faiss.IndexPQ}[index_type]
+    assert isinstance(base, expected)
+    assert rag.index.ntotal == 800
+    assert "chunk 42" in rag.retrieve("chunk 42", top_k=5, nprobe=4)
+
+    # Removed chunks are never returned; HNSW cannot delete and skips the orphans at search time
+    assert rag.remove_chunks(["id-42", "id-43"]) == 2
+    assert rag.index.ntotal == (800 if index_type == "hnsw" else 798)
+    results = rag.retrieve("chunk 42", top_k=5, nprobe=4)
+    assert len(results) == 5
+    assert "chunk 42" not in results and "chunk 43" not in results
@@ -0,0 +1,28 @@
+from src.services.service_registry import ServiceRegistry
+
+
+def test_get_or_create_builds_once():
+    registry = ServiceRegistry()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    first = registry.get_or_create(("thing",), factory)
+    second = registry.get_or_create(("thing",), factory)
+    assert first is second
+    assert len(calls) == 1
+
+
+def test_shutdown_runs_hooks_newest_first():
+    registry = ServiceRegistry()
+    released = []
+    registry.get_or_create(("a",), lambda: "a", shutdown=released.append)
+    registry.get_or_create(("b",), lambda: "b", shutdown=released.append)
+
+    registry.shutdown()
+    assert released == ["b", "a"]
+
+    # Instances are rebuilt after a shutdown
+    assert registry.get_or_create(("a",), lambda: "a2") == "a2"
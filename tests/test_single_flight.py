@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.single_flight import SingleFlight, request_key
+
+
+def test_request_key_ignores_dict_order_but_not_content():
+    assert request_key({"model": "m", "options": {"a": 1, "b": 2}}) == request_key({"options": {"b": 2, "a": 1}, "model": "m"})
+    assert request_key({"model": "m", "prompt": "x"}) != request_key({"model": "m", "prompt": "y"})
+
+
+def test_concurrent_identical_calls_share_one_run():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("k", work) for _ in range(5)), flight.run("other", work))
+
+    assert asyncio.run(scenario()) == ["answer"] * 6
+    assert len(calls) == 2
+    stats = flight.stats()
+    assert stats["leaders"] == 2 and stats["coalesced"] == 4 and stats["in_flight"] == 0
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(flight.run("k", failing), flight.run("k", failing), return_exceptions=True)
+        return results, await flight.run("k", lambda: asyncio.sleep(0, result="fresh"))
+
+    results, fresh = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert fresh == "fresh"
+
+
+def test_stream_subscribers_receive_the_same_tokens():
+    flight = SingleFlight()
+    started = []
+
+    async def tokens():
+        started.append(1)
+        for token in ["a", "b", "c", "d"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [t async for t in flight.stream("k", tokens)]
+
+    async def scenario():
+        return await asyncio.gather(consume(0), consume(0), consume(0.025))  # the last one joins mid-stream
+
+    assert asyncio.run(scenario()) == [["a", "b", "c", "d"]] * 3
+    assert len(started) == 1
+    assert flight.stats()["stream_coalesced"] == 2
+
+
+def test_stream_is_cancelled_when_every_subscriber_leaves():
+    flight = SingleFlight()
+    closed = []
+
+    async def tokens():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "t"
+        finally:
+            closed.append(1)
+
+    async def scenario():
+        stream = flight.stream("k", tokens)
+        assert await stream.__anext__() == "t"
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return flight.stats()["streams_in_flight"]
+
+    assert asyncio.run(scenario()) == 0
+    assert closed == [1]
+
+
+def test_run_sync_coalesces_threads():
+    flight = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def work():
+        calls.append(1)
+        gate.wait(1)
+        return "answer"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.run_sync, "k", work) for _ in range(4)]
+        time.sleep(0.1)
+        gate.set()
+        assert [f.result() for f in futures] == ["answer"] * 4
+    assert len(calls) == 1
+
+    with pytest.raises(KeyError):
+        flight.run_sync("k", lambda: {}["missing"])
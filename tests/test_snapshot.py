@@ -0,0 +1,62 @@
+import uuid
+
+import chromadb
+import numpy as np
+
+from src.models.RAGModel import RAGModel
+from src.services.lexical_index import BM25Index
+from src.services.snapshot import Snapshot, export_snapshot, import_to_chroma, import_to_faiss
+
+
+def new_collection():
+    return chromadb.EphemeralClient().create_collection(f"snapshot_{uuid.uuid4().hex}", embedding_function=None)
+
+
+def filled_collection(n=1200, dim=8):
+    collection = new_collection()
+    vectors = np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+    collection.add(
+        ids=[str(uuid.UUID(int=i)) for i in range(n)],
+        embeddings=vectors,
+        documents=[f"franchise doc {i}" for i in range(n)],
+        metadatas=[{"brand": f"b{i % 4}"} for i in range(n)],
+    )
+    return collection
+
+
+def test_export_writes_a_memory_mappable_block(tmp_path):
+    manifest = export_snapshot(filled_collection(), str(tmp_path), page_size=500)
+    assert manifest["rows"] == 1200 and manifest["dim"] == 8
+
+    snapshot = Snapshot(str(tmp_path))
+    assert isinstance(snapshot.embeddings, np.memmap)
+    assert snapshot.embeddings.shape == (1200, 8) and snapshot.embeddings.flags["C_CONTIGUOUS"]
+    batches = list(snapshot.batches(500))
+    assert [len(b["ids"]) for b in batches] == [500, 500, 200]
+    assert batches[0]["metadatas"][0] == {"brand": "b0"}
+
+
+def test_chroma_round_trip_keeps_vectors(tmp_path):
+    source = filled_collection()
+    export_snapshot(source, str(tmp_path))
+    target = new_collection()
+    lexical = BM25Index()
+    assert import_to_chroma(Snapshot(str(tmp_path)), target, batch_size=300, lexical_index=lexical) == 1200
+    assert target.count() == 1200 and len(lexical) == 1200
+
+    some_id = str(uuid.UUID(int=42))
+    original = source.get(ids=[some_id], include=["embeddings", "documents", "metadatas"])
+    copied = target.get(ids=[some_id], include=["embeddings", "documents", "metadatas"])
+    assert np.allclose(original["embeddings"], copied["embeddings"])
+    assert copied["documents"] == original["documents"] and copied["metadatas"] == original["metadatas"]
+
+
+def test_faiss_import_is_searchable(tmp_path):
+    export_snapshot(filled_collection(), str(tmp_path))
+    snapshot = Snapshot(str(tmp_path))
+    rag = RAGModel(vector_db_path=str(tmp_path / "vector.index"), index_type="flat")
+    assert import_to_faiss(snapshot, rag, batch_size=700) == 1200
+    assert import_to_faiss(snapshot, rag) == 0  # already indexed
+
+    _, found = rag.index.search(np.ascontiguousarray(snapshot.embeddings[7:8]), 1)
+    assert int(found[0][0]) == int(RAGModel._faiss_ids([rag.chunk_ids[7]])[0])
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from src.services.topic_gate import TopicGate
+
+VOCABULARY = ["fee", "royalty", "cost", "invest", "contract", "renew", "poem", "weather", "cat"]
+TOPICS = {"fees": ["What is the fee?", "How much royalty?"], "agreement": ["Contract term?", "Can I renew the contract?"]}
+
+calls = []
+
+
+def embed(texts):
+    """Counts vocabulary stems, so similarity follows shared words."""
+    calls.append(list(texts))
+    return np.array([[text.lower().count(word) for word in VOCABULARY] + [0.01] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def test_keywords_pass_without_embedding_and_off_topic_is_rejected():
+    gate = TopicGate(embed, keywords=["franchise", "franchise fee"], threshold=0.5, mode="enforce", topics=TOPICS)
+
+    keyword, on_topic, off_topic = gate.check(["Is a FRANCHISE right for me?", "What royalty and fee apply?", "Write a poem about my cat"])
+
+    assert keyword == {"in_scope": True, "score": None, "topic": None, "reason": "keyword"}
+    assert on_topic["in_scope"] and on_topic["topic"] == "fees" and on_topic["score"] >= 0.5
+    assert not off_topic["in_scope"] and off_topic["reason"] == "off_topic"
+    # centroids once (one call per topic), then only the two queries without a keyword
+    assert calls[-1] == ["What royalty and fee apply?", "Write a poem about my cat"]
+    assert len(calls) == len(TOPICS) + 1
+
+    stats = gate.stats()
+    assert (stats["checked"], stats["keyword_matches"], stats["similarity_matches"], stats["rejected"]) == (3, 1, 1, 1)
+    assert stats["rejection_rate"] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_keywords_match_at_word_starts_only():
+    gate = TopicGate(embed, keywords=["fee"], threshold=0.99, mode="enforce", topics=TOPICS)
+    assert gate.check(["What is the fee?"])[0]["reason"] == "keyword"
+    assert not gate.check(["Coffee recommendations for the weekend"])[0]["in_scope"]
+
+
+@pytest.mark.parametrize("query", [
+    "What do franchisees usually earn?",
+    "Which franchises are open in Dubai?",
+    "Is franchising a good way to grow?",
+    "What does a franchisor owe its partners?",
+    "How are royalties calculated?",
+    "Who owns the territories?",
+    "Are franchise fees refundable?",
+    "Can I negotiate my franchise agreements?",
+])
+def test_keywords_match_plurals_and_other_inflections(query):
+    gate = TopicGate(embed, keywords=["franchise", "royalty", "territory", "franchise fee", "franchise agreement"],
+                     threshold=0.99, mode="enforce", topics=TOPICS)
+    assert gate.check([query])[0] == {"in_scope": True, "score": None, "topic": None, "reason": "keyword"}
+    assert calls == []  # never embedded
+
+
+def test_shadow_mode_lets_everything_through_but_counts_would_be_rejections():
+    gate = TopicGate(embed, threshold=0.5, mode="shadow", topics=TOPICS)
+    decision = gate.check(["What is the weather like?"])[0]
+    assert decision["in_scope"] and decision["reason"] == "off_topic"
+    assert gate.stats()["rejected"] == 1
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        TopicGate(embed, mode="strict", topics=TOPICS)
@@ -0,0 +1,47 @@
+import asyncio
+import contextvars
+
+from src.services.executors import BoundedExecutor
+from src.utils.Tracing import current_trace, record_llm_call, span, stage_metrics, start_trace
+
+
+def test_spans_and_llm_calls_land_in_the_request_trace():
+    async def request():
+        trace = start_trace()
+        with span("retrieval", results=0) as attrs:
+            attrs["results"] = 3
+        # tasks spawned by the request inherit its trace
+        await asyncio.gather(asyncio.ensure_future(_generate()), asyncio.ensure_future(_generate()))
+        return trace
+
+    async def _generate():
+        with span("generation"):
+            record_llm_call("m", {"prompt_eval_count": 100, "eval_count": 20,
+                                  "prompt_eval_duration": 50_000_000, "eval_duration": 200_000_000})
+
+    trace = asyncio.run(request())
+    result = trace.to_dict()
+    assert set(result["stages"]) == {"retrieval", "generation"}
+    assert [s["name"] for s in result["spans"]].count("generation") == 2
+    assert result["spans"][0]["results"] == 3
+    assert result["tokens"] == {"llm_calls": 2, "prompt_tokens": 200, "completion_tokens": 40,
+                                "prompt_eval_ms": 100.0, "eval_ms": 400.0, "coalesced_calls": 0}
+    assert "generation" in stage_metrics.stats()["stage_ms"]
+
+
+def test_executor_jobs_record_into_the_submitting_request():
+    executor = BoundedExecutor("trace-test", max_workers=1, max_queue=4)
+
+    def job():
+        with span("embed"):
+            return current_trace()
+
+    def request():
+        trace = start_trace()
+        assert executor.submit(job).result() is trace
+        return trace
+
+    trace = contextvars.copy_context().run(request)
+    assert trace.stages().keys() == {"embed"}
+    assert current_trace() is None
+    executor.shutdown()